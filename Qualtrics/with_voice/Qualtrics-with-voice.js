@@ -10,6 +10,11 @@ Qualtrics.SurveyEngine.addOnload(function () {
 	var interviewID = Qualtrics.SurveyEngine.getEmbeddedData('interview_id');
     var endpoint = Qualtrics.SurveyEngine.getEmbeddedData('interview_endpoint');
 
+	// If true, a recorded answer is transcribed and submitted in a single request
+	// ("transcribe_next" route). If false, the transcription is first placed in the
+	// input field so that respondents can edit it before submitting.
+	var voiceAutoSubmit = true;
+
 	////////////////////////////////
     // Key input and output elements
 	////////////////////////////////
@@ -53,6 +58,12 @@ Qualtrics.SurveyEngine.addOnload(function () {
 				const reader = new FileReader();
 				reader.onloadend = async () => {
 					const audioBase64 = reader.result.split(",")[1]; // Remove the "data:..." prefix
+					if (voiceAutoSubmit) {
+						// Transcribe and generate the next question in one round trip
+						audioChunks = [];
+						submitVoiceMessage(audioBase64);
+						return;
+					}
 					const payload = {route: "transcribe", payload: {audio: audioBase64}};
 					// Send audio to the transcribe API endpoint
 					try {
@@ -147,6 +158,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
             route: "next",
             payload: {
                 user_message: "",
+                request_id: "start",
                 session_id: userID,
                 interview_id: interviewID
             }
@@ -177,6 +189,108 @@ Qualtrics.SurveyEngine.addOnload(function () {
     });
 
 
+	////////////////////////////////////////////////////////////
+    // HELPERS TO SHOW MESSAGES AND INTERVIEWER REPLIES ////////
+	////////////////////////////////////////////////////////////
+    function disableInput(buttonText) {
+        // Make the submit button unclickable until the chatbot replies
+        submitButton.disabled = true;
+        submitButton.style.backgroundColor = '#ccc';
+        submitButton.innerText = buttonText;
+        // Also disable the audio record button.
+        recordButton.disabled = true;
+    }
+
+    function enableInput() {
+        submitButton.disabled = false;
+        submitButton.style.backgroundColor = '#007BFF';
+        submitButton.innerText = "Submit response";
+        // Re-enable audio record button.
+        recordButton.textContent = "Record response";
+        recordButton.disabled = false;
+    }
+
+    function appendUserMessage(userMessage) {
+        // Add user message to the chat area
+        var messageContent = document.createElement('div');
+        messageContent.style.cssText = "display: inline-block; max-width: 80%; border: 1px solid #ddd; border-radius: 5px; padding: 5px; margin-bottom: 10px; background-color: #ddd; word-wrap: break-word; white-space: pre-wrap; box-sizing: border-box; font-size: 18px; text-align: left; line-height: 1.5;";
+        messageContent.innerText = userMessage;
+                    
+        // Add label and message of the user to the chat area and scroll to the bottom
+        chatArea.appendChild(messageContent);
+        chatArea.scrollTop = chatArea.scrollHeight;
+    }
+
+    function showNextQuestion(data) {
+        var next_question = data.message.trim();
+
+        // Check if this is the last message of the interview
+        var endInterviewIndex = next_question.indexOf("---END---");
+        if (endInterviewIndex !== -1) {
+            // End of interview
+            next_question = next_question.replace("---END---", "");
+            next_question = next_question.trim();
+            submitButton.disabled = true;
+            submitButton.innerText = "End of interview";
+            // Also disable the audio record button.
+            recordButton.textContent = "Record response";
+            recordButton.disabled = true;
+        } else {
+            // Interview continues
+            enableInput();
+        }
+        appendChatbotMessage(next_question, chatArea, "response");
+    }
+
+
+	////////////////////////////////////////////////////////////
+    // TRANSCRIBE AND GENERATE THE NEXT QUESTION IN ONE CALL ///
+	////////////////////////////////////////////////////////////
+    function submitVoiceMessage(audioBase64) {
+        disableInput("Waiting for reply...");
+        jQuery.ajax({
+            url: endpoint,
+            timeout: 60000,
+            type: "POST",
+            data: JSON.stringify({
+                route: "transcribe_next",
+                payload: {
+                    audio: audioBase64,
+                    // The same recording sent again after an error keeps its id
+                    request_id: requestIdFor(audioBase64),
+                    session_id: userID,
+                    interview_id: interviewID
+                }
+            }),
+            contentType: "application/json",
+            dataType: "json",
+            success: function (data) {
+                pendingAnswer = null;
+                appendUserMessage(data.transcription);
+                appendChatbotMessage("", chatArea, "waiting");
+                showNextQuestion(data);
+            },
+            error: function (jqXHR, textStatus, errorThrown) {
+                console.error("Error:", errorThrown);
+                alert("Something went wrong with the transcription. Please try again.");
+                enableInput();
+            }
+        });
+    }
+
+
+    // Id of the answer being sent. Submitting the same answer again after an error reuses
+    // it, so that the server returns the question it already generated for it (if any).
+    var pendingAnswer = null;
+    var pendingRequestId = null;
+    function requestIdFor(message) {
+        if (message !== pendingAnswer) {
+            pendingAnswer = message;
+            pendingRequestId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+        return pendingRequestId;
+    }
+
 	////////////////////////////////////////////////////////////
     // GENERATE THE NEXT QUESTION ON SUBMIT BUTTON CLICK ///////
 	////////////////////////////////////////////////////////////
@@ -187,21 +301,8 @@ Qualtrics.SurveyEngine.addOnload(function () {
             // Clear the input field
             inputField.value = "";
 
-            // Make the submit button unclickable until the chatbot replies
-            submitButton.disabled = true;
-            submitButton.style.backgroundColor = '#ccc';
-            submitButton.innerText = "Waiting for reply...";
-            // Also disable the audio record button.
-			recordButton.disabled = true;
-
-            // Add user message to the chat area
-            var messageContent = document.createElement('div');
-            messageContent.style.cssText = "display: inline-block; max-width: 80%; border: 1px solid #ddd; border-radius: 5px; padding: 5px; margin-bottom: 10px; background-color: #ddd; word-wrap: break-word; white-space: pre-wrap; box-sizing: border-box; font-size: 18px; text-align: left; line-height: 1.5;";
-            messageContent.innerText = userMessage;
-                        
-            // Add label and message of the user to the chat area and scroll to the bottom
-            chatArea.appendChild(messageContent);
-            chatArea.scrollTop = chatArea.scrollHeight;
+            disableInput("Waiting for reply...");
+            appendUserMessage(userMessage);
 
             // Add dancing dots
             appendChatbotMessage("", chatArea, "waiting");
@@ -215,6 +316,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
 					route: "next",
 					payload: {
 						user_message: userMessage,
+						request_id: requestIdFor(userMessage),
 						session_id: userID,
 						interview_id: interviewID
 					}
@@ -222,37 +324,15 @@ Qualtrics.SurveyEngine.addOnload(function () {
                 contentType: "application/json",
                 dataType: "json",
                 success: function (data) {
-                    var next_question = data.message.trim();
-
-                    // Check if this is the last message of the interview
-                    var endInterviewIndex = next_question.indexOf("---END---");
-                    if (endInterviewIndex !== -1) {
-                        // End of interview
-                        next_question = next_question.replace("---END---", "");
-                        next_question = next_question.trim();
-                        submitButton.disabled = true;
-                        submitButton.innerText = "End of interview";
-                        // Also disable the audio record button.
-                        recordButton.disabled = true;
-                    } else {
-                        // Interview continues
-                        submitButton.disabled = false;
-                        submitButton.innerText = "Submit response";
-                        submitButton.style.backgroundColor = '#007BFF';
-                        // Re-enable audio record button.
-                        recordButton.disabled = false;
-                    }
-                    appendChatbotMessage(next_question, chatArea, "response");
+                    pendingAnswer = null;
+                    showNextQuestion(data);
                 },
                 // REQUEST UNSUCCESSFUL
                 error: function (jqXHR, textStatus, errorThrown) {
                     console.error("Error:", errorThrown);
                     appendChatbotMessage("There was a technical error. Please try again.", chatArea, "response");
-                    submitButton.disabled = false;
-                    submitButton.style.backgroundColor = '#007BFF';
-                    submitButton.innerText = "Submit response";
-                    // Also disable the audio record button.
-                    recordButton.disabled = false;
+                    inputField.value = userMessage; // Submit again to retry
+                    enableInput();
                 }
             });
         }
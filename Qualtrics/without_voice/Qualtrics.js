@@ -63,6 +63,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
             route: "next",
             payload: {
                 user_message: "",
+                request_id: "start",
                 session_id: userID,
                 interview_id: interviewID
             }
@@ -93,6 +94,18 @@ Qualtrics.SurveyEngine.addOnload(function () {
     });
 
 
+    // Id of the answer being sent. Submitting the same answer again after an error reuses
+    // it, so that the server returns the question it already generated for it (if any).
+    var pendingAnswer = null;
+    var pendingRequestId = null;
+    function requestIdFor(message) {
+        if (message !== pendingAnswer) {
+            pendingAnswer = message;
+            pendingRequestId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+        return pendingRequestId;
+    }
+
 	////////////////////////////////////////////////////////////
     // GENERATE THE NEXT QUESTION ON SUBMIT BUTTON CLICK ///////
 	////////////////////////////////////////////////////////////
@@ -129,6 +142,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
 					route: "next",
 					payload: {
 						user_message: userMessage,
+						request_id: requestIdFor(userMessage),
 						session_id: userID,
 						interview_id: interviewID
 					}
@@ -136,6 +150,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
                 contentType: "application/json",
                 dataType: "json",
                 success: function (data) {
+                    pendingAnswer = null;
                     var next_question = data.message.trim();
                     console.log("Question received from server:", next_question);
 
@@ -159,6 +174,7 @@ Qualtrics.SurveyEngine.addOnload(function () {
                 error: function (jqXHR, textStatus, errorThrown) {
                     console.error("Error:", errorThrown);
                     appendChatbotMessage("There was a technical error. Please try again.", chatArea, "response");
+                    inputField.value = userMessage; // Submit again to retry
                     submitButton.disabled = false;
                     submitButton.style.backgroundColor = '#007BFF';
                     submitButton.innerText = "Submit response";
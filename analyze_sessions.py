@@ -0,0 +1,310 @@
+"""
+Latency, fallback and timing report of exported interview sessions.
+
+Loads an export of `aws_retrieve.py` (CSV file or Parquet directory) or of the
+`/retrieve` endpoint (JSON list of rows) into a pandas DataFrame and computes, with
+column-wise operations only:
+
+- LLM latency (`open_ai_time`) percentiles per interview step, and per stage of a turn
+  (`stage_ms`) when timings were recorded;
+- fallback rates per step: how often the question is the `fallback_phrase` of the step
+  (needs the interview parameters, see `--parameters`);
+- distributions of respondents' think time and of session duration;
+- tokens and cost of the LLM per interview (`usage`), and the share of the cost spent
+  on hedges and extra candidates, when usage was recorded.
+
+    python analyze_sessions.py chats.csv --html report.html
+    python analyze_sessions.py exports/ --parameters app/parameters.py --output report.json
+
+The step of a question is the one that generated it. Every message stores the pointer
+to the *next* step at the time it was added, so this is the `question_name` of the
+message before the question (the respondent's answer). Opening questions (order 1)
+are fixed texts and are not included in latencies and fallback rates.
+"""
+
+from argparse import ArgumentParser
+import ast
+from html import escape
+import importlib.util
+import json
+import os
+import sys
+
+import pandas as pd
+
+# Columns of the export used by the report
+COLUMNS = [
+    "session_id",
+    "interview_id",
+    "order",
+    "time",
+    "type",
+    "content",
+    "question_name",
+    "open_ai_time",
+    "stage_ms",
+    "usage",
+]
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+# Phrase used by `core.auxiliary.apply_fallback_if_needed` if a step sets none
+DEFAULT_FALLBACK_PHRASE = "Default fallback response"
+
+
+def load_rows(path: str) -> pd.DataFrame:
+    """Read the report's columns of an export (CSV, Parquet file/directory or JSON)."""
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, partitioning="hive")
+        columns = [c for c in COLUMNS if c in dataset.schema.names]
+        df = dataset.to_table(columns=columns).to_pandas()
+    elif path.endswith((".json", ".jsonl")):
+        df = pd.read_json(path, lines=path.endswith(".jsonl"), dtype=False)
+        df = df[[c for c in COLUMNS if c in df.columns]]
+    else:
+        df = pd.read_csv(path, usecols=lambda c: c in COLUMNS, low_memory=False)
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    return df
+
+
+def _to_seconds(values: pd.Series) -> pd.Series:
+    """Message times as Unix seconds; older sessions stored them as text."""
+    seconds = pd.to_numeric(values, errors="coerce")
+    text = seconds.isna() & values.notna()
+    if text.any():
+        parsed = pd.to_datetime(values[text], errors="coerce", utc=True)
+        seconds[text] = (parsed - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+    return seconds
+
+
+def prepare(df: pd.DataFrame, interview_id: str = None) -> pd.DataFrame:
+    """Sort the messages of each session and derive `step`, `latency_s` and `delta_s`."""
+    df = df.copy()
+    df["interview_id"] = df["interview_id"].fillna(interview_id or "unknown")
+    df["order"] = pd.to_numeric(df["order"], errors="coerce")
+    df["time"] = _to_seconds(df["time"])
+    df["latency_s"] = pd.to_numeric(df["open_ai_time"], errors="coerce")
+    df = df.sort_values(["session_id", "order"], kind="stable", ignore_index=True)
+
+    previous = df.groupby("session_id", sort=False)[["question_name", "time", "type"]]
+    previous = previous.shift(1)
+    df["step"] = previous["question_name"]
+    df["delta_s"] = df["time"] - previous["time"]
+    df["after_question"] = previous["type"] == "question"
+    df["generated"] = (df["type"] == "question") & (df["order"] > 1)
+    return df
+
+
+def _distribution(values: pd.Series) -> dict:
+    """Count, mean and percentiles of a series (NaN dropped)."""
+    values = values.dropna()
+    if values.empty:
+        return {"count": 0}
+    quantiles = values.quantile(PERCENTILES)
+    summary = {"count": int(values.size), "mean": float(values.mean())}
+    summary.update({f"p{int(q * 100)}": float(v) for q, v in quantiles.items()})
+    summary["max"] = float(values.max())
+    return summary
+
+
+def _by_group(values: pd.Series, keys: list) -> pd.DataFrame:
+    """Count, mean and percentiles of `values` per group of `keys`."""
+    grouped = values.groupby(keys)
+    table = grouped.quantile(PERCENTILES).unstack()
+    table.columns = [f"p{int(q * 100)}" for q in table.columns]
+    table.insert(0, "mean", grouped.mean())
+    table.insert(0, "count", grouped.count())
+    return table
+
+
+def step_latency(df: pd.DataFrame) -> pd.DataFrame:
+    """LLM latency (seconds) percentiles of the generated questions per step."""
+    questions = df[df["generated"] & df["latency_s"].notna()]
+    return _by_group(
+        questions["latency_s"], [questions["interview_id"], questions["step"]]
+    )
+
+
+def stage_latency(df: pd.DataFrame) -> pd.DataFrame:
+    """Percentiles (ms) of each stage of the turns that recorded stage timings."""
+    stages = df.loc[df["generated"] & df["stage_ms"].notna(), "stage_ms"]
+    if stages.empty:
+        return pd.DataFrame()
+    wide = pd.DataFrame.from_records([_mapping(s) for s in stages])
+    long = wide.melt(var_name="stage", value_name="ms").dropna()
+    return _by_group(pd.to_numeric(long["ms"]), [long["stage"]])
+
+
+def usage_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Tokens and cost (USD) of the generated questions per interview (see core.usage)."""
+    if "usage" not in df.columns:
+        return pd.DataFrame()
+    questions = df[df["generated"] & df["usage"].notna()]
+    if questions.empty:
+        return pd.DataFrame()
+    usage = pd.DataFrame.from_records(
+        [_mapping(u) for u in questions["usage"]], index=questions.index
+    )
+    usage["interview_id"] = questions["interview_id"]
+    grouped = usage.groupby("interview_id")
+    table = grouped[
+        ["input_tokens", "cached_tokens", "output_tokens", "cost_usd", "extra_cost_usd"]
+    ].sum()
+    table.insert(0, "questions", grouped.size())
+    total_cost = table["cost_usd"] + table["extra_cost_usd"]
+    table["extra_cost_share"] = table["extra_cost_usd"] / total_cost
+    table["hedged_share"] = grouped["hedged"].mean()
+    table["hedge_win_share"] = grouped["hedge_won"].sum() / grouped["hedged"].sum()
+    return table
+
+
+def _mapping(value) -> dict:
+    """A dict column (stage_ms, usage): JSON, or Python literals in CSV exports."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+
+def fallback_phrases(parameters: dict) -> pd.DataFrame:
+    """(interview_id, step, phrase) of every step with a `fallback_regex`."""
+    records = [
+        {
+            "interview_id": interview_id,
+            "step": step["question_name"],
+            "phrase": step.get("fallback_phrase", DEFAULT_FALLBACK_PHRASE).strip(),
+        }
+        for interview_id, interview in parameters.items()
+        for step in interview.get("interview_plan", [])
+        if step.get("fallback_regex")
+    ]
+    return pd.DataFrame(records, columns=["interview_id", "step", "phrase"])
+
+
+def fallback_rates(df: pd.DataFrame, parameters: dict) -> pd.DataFrame:
+    """Share of generated questions per step that are the step's fallback phrase."""
+    phrases = fallback_phrases(parameters)
+    questions = df.loc[df["generated"], ["interview_id", "step", "content"]]
+    questions = questions.merge(phrases, on=["interview_id", "step"], how="inner")
+    questions["fallback"] = questions["content"].str.strip() == questions["phrase"]
+    grouped = questions.groupby(["interview_id", "step"])["fallback"]
+    table = pd.DataFrame({"questions": grouped.size(), "fallbacks": grouped.sum()})
+    table["rate"] = table["fallbacks"] / table["questions"]
+    return table
+
+
+def think_time(df: pd.DataFrame) -> dict:
+    """Seconds between a question and the respondent's answer."""
+    answers = df[(df["type"] == "answer") & df["after_question"]]
+    return _distribution(answers.loc[answers["delta_s"] >= 0, "delta_s"])
+
+
+def session_stats(df: pd.DataFrame) -> dict:
+    """Distributions of session duration (seconds) and of messages per session."""
+    grouped = df.groupby("session_id")["time"]
+    return {
+        "duration_s": _distribution(grouped.max() - grouped.min()),
+        "messages_per_session": _distribution(grouped.size().astype(float)),
+    }
+
+
+def build_report(df: pd.DataFrame, parameters: dict = None) -> dict:
+    """Report of prepared rows (see `prepare`) as tables and distributions."""
+    return {
+        "sessions": int(df["session_id"].nunique()),
+        "messages": int(len(df)),
+        "step_latency_s": step_latency(df),
+        "stage_latency_ms": stage_latency(df),
+        "usage": usage_summary(df),
+        "fallback_rates": fallback_rates(df, parameters) if parameters else None,
+        "think_time_s": think_time(df),
+        **session_stats(df),
+    }
+
+
+def _records(table: pd.DataFrame) -> list:
+    return json.loads(table.reset_index().to_json(orient="records"))
+
+
+def to_json(report: dict) -> dict:
+    """The report with its tables as lists of records."""
+    return {
+        key: _records(value) if isinstance(value, pd.DataFrame) else value
+        for key, value in report.items()
+    }
+
+
+def to_html(report: dict) -> str:
+    """The report as a standalone HTML page."""
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+        "<title>Interview sessions report</title><style>",
+        "body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;"
+        "margin-bottom:2em}td,th{border:1px solid #ccc;padding:4px 8px;"
+        "text-align:right}</style></head><body>",
+        "<h1>Interview sessions report</h1>",
+        f"<p>{report['sessions']} sessions, {report['messages']} messages</p>",
+    ]
+    for key, value in report.items():
+        if isinstance(value, pd.DataFrame):
+            table = value
+        elif isinstance(value, dict):
+            table = pd.DataFrame([value])
+        else:
+            continue
+        parts.append(f"<h2>{escape(key)}</h2>")
+        parts.append(
+            table.to_html(float_format=lambda x: f"{x:.3f}")
+            if not table.empty
+            else "<p>No data</p>"
+        )
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def load_parameters(path: str) -> dict:
+    """INTERVIEW_PARAMETERS of a parameters module (e.g. app/parameters.py) or JSON file."""
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    spec = importlib.util.spec_from_file_location("parameters", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INTERVIEW_PARAMETERS
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Latency and fallback report of sessions")
+    parser.add_argument("path", help="CSV file, Parquet directory or JSON rows")
+    parser.add_argument(
+        "--parameters",
+        type=str,
+        default=None,
+        help="Interview parameters for fallback rates (e.g. app/parameters.py)",
+    )
+    parser.add_argument(
+        "--interview_id",
+        type=str,
+        default=None,
+        help="Interview of rows exported without an interview_id",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Save as JSON")
+    parser.add_argument("--html", type=str, default=None, help="Save as HTML")
+    args = parser.parse_args()
+
+    parameters = load_parameters(args.parameters) if args.parameters else None
+    report = build_report(prepare(load_rows(args.path), args.interview_id), parameters)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(to_json(report), f, indent=2)
+    if args.html:
+        with open(args.html, "w") as f:
+            f.write(to_html(report))
+    if not (args.output or args.html):
+        json.dump(to_json(report), sys.stdout, indent=2)
+        print()
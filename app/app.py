@@ -1,18 +1,38 @@
 """This Flask application provides several endpoints to manage and interact with interview sessions. Each endpoint serves a specific purpose, such as starting an interview session, continuing with the next question, transcribing an audio message from interviewees, loading, deleting, or retrieving stored interviews sessions. Below is a detailed documentation for each endpoint."""
 
+import json
 from flask import (
 	Flask, 
+	Response,
 	request,
 	jsonify, 
 	render_template, 
-	make_response
+	make_response,
+	stream_with_context,
+	url_for
 )
-from core import decorators, logic
+from core import compression, decorators, logic
+from core.agent import connect_to_llm
+from core.metrics import REGISTRY, StageTimer
+from database.dynamo import connect_to_database
+from core.registry import default_registry
 
 app = Flask(__name__)
+db = connect_to_database()
+agent = connect_to_llm()
+INTERVIEW_PARAMETERS = default_registry()  # reloaded when app/parameters.py changes
 app.error_handler_spec[None] = decorators.wrap_flask_errors()
 app.add_url_rule('/healthcheck', 'healthcheck', lambda: ('', 200))
 
+def compressed_json(obj) -> Response:
+	"""JSON response, streamed and compressed if large and accepted by the client (see core.compression)."""
+	encoding, chunks = compression.stream_json(obj, request.headers.get("Accept-Encoding"))
+	response = Response(stream_with_context(chunks), mimetype="application/json")
+	response.headers["Vary"] = "Accept-Encoding"
+	if encoding:
+		response.headers["Content-Encoding"] = encoding
+	return response
+
 @app.route('/', methods=['GET'])
 def index():
 	"""For verifying that the app is running. Not needed in practice."""
@@ -24,9 +44,10 @@ def landing(interview_id:str, session_id:str):
 	"""Endpoint: /<interview_id>/<session_id> (GET)
 	----------------------------------
 	Description:
-		This endpoint serves as the landing (start) page for a given interview session. It initializes the interview session and renders the chat page with the session data. To start an interview, simply navigate to the following URL:
+		This endpoint serves as the landing (start) page for a given interview session. It begins the interview session (or resumes it, e.g. after a reload) and renders the chat page with the first question, or the transcript so far, already in the HTML, so the respondent needs no further request before answering. To start an interview, simply navigate to the following URL:
 		http://http://127.0.0.1:8000/<interview_id>/<session_id>
 		and replace the placeholders with the interview ID and session ID. Note that the interview_id must be a valid key in the INTERVIEW_PARAMETERS dictionary in app/parameters.py.
+		The script and stylesheet of the page are served from app/static with ETags, so browsers revalidate them with a conditional request (304 Not Modified) instead of downloading them again.
 
 	Input Arguments:
 		- interview_id (str): The unique identifier for the interview parameters to be used (from app/parameters.py).
@@ -43,8 +64,22 @@ def landing(interview_id:str, session_id:str):
 			curl http://127.0.0.1:8000/INTERVIEW_ID/SESSION_ID
 			```
 	"""
-	response = logic.begin_interview_session(session_id, interview_id)
-	return render_template('chat.html', data=response)
+	timer = StageTimer()
+	bootstrap = logic.start_or_resume_session(
+		session_id=session_id,
+		interview_id=interview_id,
+		db=db,
+		agent=agent,
+		interview_parameters=INTERVIEW_PARAMETERS,
+		timer=timer,
+	)
+	bootstrap["urls"] = {"next": url_for('next'), "transcribe": url_for('transcribe')}
+	REGISTRY.observe_stages(timer, route="landing")
+	response = make_response(render_template('chat.html', bootstrap=bootstrap))
+	# The page holds the state of the session: never serve it from a cache
+	response.headers["Cache-Control"] = "no-store"
+	response.headers["Server-Timing"] = timer.server_timing()
+	return response
 
 @app.route('/next', methods=['POST'])
 @decorators.handle_500
@@ -56,6 +91,7 @@ def next():
 
 	Input Arguments:
 		- JSON payload containing the session_id (str), interview_id (str) and user_message (str).
+		- Optionally a request_id (str) that identifies the answer: repeated requests with the same request_id (retries, double clicks) do not generate another question but return the response of the first one.
 
 	Example Query:
 	Using Python's requests package:
@@ -63,7 +99,8 @@ def next():
 		payload = {
 			"session_id": "67890",
 			"interview_id": "STOCK_MARKET",
-			"user_message": "I don't like risky investments"
+			"user_message": "I don't like risky investments",
+			"request_id": "3f2b9c1e"
 		}
 		response = requests.post('http://127.0.0.1:8000/next', json=payload)
 		```
@@ -73,8 +110,29 @@ def next():
 		```
 	"""
 	payload = request.get_json(force=True)
-	response = logic.next_question(**payload)
-	return jsonify(response)
+	timer = StageTimer()
+	response = logic.next_question_once(
+		session_id=payload["session_id"],
+		interview_id=payload["interview_id"],
+		user_message=payload.get("user_message"),
+		request_id=payload.get("request_id"),
+		db=db,
+		agent=agent,
+		interview_parameters=INTERVIEW_PARAMETERS,
+		timer=timer,
+	)
+	REGISTRY.observe_stages(timer, route="next")
+	response = jsonify(response)
+	response.headers["Server-Timing"] = timer.server_timing()
+	# The running summary is updated once the response is sent (see core.summary)
+	response.call_on_close(lambda: logic.schedule_summary(
+		session_id=payload["session_id"],
+		interview_id=payload["interview_id"],
+		db=db,
+		agent=agent,
+		interview_parameters=INTERVIEW_PARAMETERS,
+	))
+	return response
 
 @app.route('/transcribe', methods=['POST'])
 @decorators.handle_500
@@ -102,9 +160,67 @@ def transcribe():
 		```
 	"""
 	payload = request.get_json(force=True)
-	response = logic.transcribe(**payload)
+	response = logic.transcribe(payload["audio"], agent=agent)
 	return jsonify(response)
 
+@app.route('/transcribe_next', methods=['POST'])
+@decorators.handle_500
+def transcribe_next():
+	"""Endpoint: /transcribe_next (POST)
+	----------------------------------
+	Description:
+		This endpoint combines /transcribe and /next for spoken answers. It transcribes the audio message of the interviewee and processes the transcription as the user message, returning both the transcription and the next interview question in a single round trip.
+		If "stream" is set to true, the response is streamed as newline-delimited JSON: the first line holds the transcription as soon as it is available, the second line holds the next question.
+
+	Input Arguments:
+		JSON payload containing the session_id (str), interview_id (str), audio (str) and optionally stream (bool) and request_id (str), as for /next.
+
+	Example Query:
+		Using Python's requests package:
+		```
+		payload = {
+			"session_id": "67890",
+			"interview_id": "STOCK_MARKET",
+			"audio": "base64_encoded_audio_string"
+		}
+		response = requests.post('http://127.0.0.1:8000/transcribe_next', json=payload)
+		```
+
+	Using the command line with curl:
+		```
+		curl -X POST -H "Content-Type: application/json" -d '{"session_id": "67890", "interview_id": "STOCK_MARKET", "audio": "base64_encoded_audio_string", "stream": true}' http://127.0.0.1:8000/transcribe_next
+		```
+	"""
+	payload = request.get_json(force=True)
+	kwargs = dict(
+		audio=payload["audio"],
+		session_id=payload["session_id"],
+		interview_id=payload["interview_id"],
+		request_id=payload.get("request_id"),
+		db=db,
+		agent=agent,
+		interview_parameters=INTERVIEW_PARAMETERS,
+	)
+	if not payload.get("stream"):
+		timer = StageTimer()
+		response = jsonify(logic.transcribe_and_next(**kwargs, timer=timer))
+		REGISTRY.observe_stages(timer, route="transcribe_next")
+		response.headers["Server-Timing"] = timer.server_timing()
+	else:
+		def generate():
+			try:
+				for part in logic.iter_transcribe_and_next(**kwargs):
+					yield json.dumps(part) + "\n"
+			except Exception as e:
+				# Headers are already sent, so report the failure in-band
+				yield json.dumps({"error": type(e).__name__, "message": str(e)}) + "\n"
+		response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+	# The running summary is updated once the response is sent (see core.summary)
+	response.call_on_close(lambda: logic.schedule_summary(
+		**{k: v for k, v in kwargs.items() if k not in ("audio", "request_id")}
+	))
+	return response
+
 @app.route('/load/<session_id>', methods=['GET'])
 @decorators.handle_500
 def load(session_id:str):
@@ -127,8 +243,8 @@ def load(session_id:str):
 			curl http://127.0.0.1:8000/load/67890
 			```
 	"""
-	session = logic.load_interview_session(session_id)
-	return jsonify(session)
+	session = logic.load_interview_session(session_id, db=db)
+	return compressed_json(session)
 
 @app.route('/delete/<session_id>', methods=['GET'])
 @decorators.handle_500
@@ -152,7 +268,7 @@ def delete(session_id:str):
 			curl http://127.0.0.1:8000/delete/67890
 			```
 	"""
-	logic.delete_interview_session(session_id)
+	logic.delete_interview_session(session_id, db=db)
 	return make_response(f"Successfully deleted session '{session_id}'.")
 
 @app.route('/retrieve', methods=['GET'])
@@ -162,6 +278,7 @@ def retrieve():
 	-------------------------
 	Description:
 		This endpoint retrieves all stored interview sessions from the database and returns them.
+		Like /load, large responses are streamed and compressed with gzip (or brotli, if installed) when the request accepts it ("Accept-Encoding"); browsers, curl --compressed and the requests package decompress them transparently. Responses smaller than COMPRESS_MIN_BYTES (default 1024 bytes) are not compressed.
 
 	Input Arguments:
 		None
@@ -177,8 +294,24 @@ def retrieve():
 			curl http://127.0.0.1:8000/retrieve
 			```
 	"""
-	response = logic.retrieve_sessions()
-	return jsonify(response)
+	response = logic.retrieve_sessions(db=db)
+	return compressed_json(response)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+	"""Endpoint: /metrics (GET)
+	----------------------------------
+	Description:
+		Latency histograms of every stage of an interview turn (session load, prompt build, each hedged LLM attempt, fallback check, database writes) and of whole requests, in the Prometheus text format. Every uWSGI worker keeps its own histograms.
+		The stages of a single /next request are also returned in its `Server-Timing` response header and stored on the turn record as `stage_ms`.
+
+	Example Query:
+		Using the command line with curl:
+			```
+			curl http://127.0.0.1:8000/metrics
+			```
+	"""
+	return Response(REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -1,28 +1,102 @@
+from __future__ import annotations
+
 import asyncio
 from core.auxiliary import (
     fill_prompt_with_interview_v002,
     get_step_by_question_name,
-    call_openai_responses,
     apply_fallback_if_needed,
+    candidate_count,
+    is_valid_answer,
 )
 from core.error_handling import check_data_is_not_empty
-from core.asynchronous_call import openai_call, CallPlan, call_openai_responses_hedged
+from core.asynchronous_call import (
+    call_openai_moderation,
+    call_openai_responses_first_valid,
+    call_openai_responses_hedged,
+    generate_unless_flagged,
+)
+from core.usage import TurnUsage, budget_step, observe_usage, over_budget
 from io import BytesIO
 from base64 import b64decode
-from openai import OpenAI, AsyncOpenAI
+from typing import TYPE_CHECKING
 import logging
+import os
+import threading
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Replies to answers flagged by moderation, unless the interview sets its own
+DEFAULT_FLAGGED_PHRASE = (
+    "Let's keep our conversation respectful. Could you please answer the question?"
+)
+DEFAULT_TERMINATION_PHRASE = "Thank you for your time. This interview has ended."
+
+
+def connect_to_llm() -> LLMAgent:
+    """Instantiate the LLM agent with the configured backend client."""
+    if os.getenv("LLM_BACKEND") == "OFFLINE":
+        # For offline benchmarks and load tests, no request leaves the machine
+        from core.offline import FakeAsyncOpenAI
+
+        return LLMAgent(
+            openai_client=FakeAsyncOpenAI(
+                latency=os.getenv(
+                    "OFFLINE_LLM_LATENCY", "lognormal:median=0.8,sigma=0.4"
+                )
+            )
+        )
+    from openai import AsyncOpenAI
+    from parameters import OPENAI_API_KEY
+
+    # OPENAI_BASE_URL points the client elsewhere, e.g. at benchmarks/mock_llm_server.py
+    return LLMAgent(
+        openai_client=AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=45,
+            max_retries=3,
+        )
+    )
 
 
 class LLMAgent(object):
     """Class to manage LLM-based agents."""
 
-    def __init__(self, openai_client: OpenAI):
+    def __init__(self, openai_client: AsyncOpenAI):
         self.client = openai_client
+        self._loop = None  # event loop of all calls of the client, see `run`
+        self._loop_lock = threading.Lock()
 
     def load_parameters(self, parameters: dict):
         """Load interview guidelines for prompt construction."""
         self.parameters = parameters
 
+    def run(self, coroutine):
+        """
+        Run a coroutine on the agent's event loop and return its result.
+
+        The loop runs in a daemon thread, started on first use, for as long as the
+        agent. The connection pool of the async client is bound to the loop that
+        opened its connections, so running every call (and the warm-up ping) on this
+        one loop lets all requests reuse them.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop()).result()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="llm-agent", daemon=True
+                ).start()
+        return self._loop
+
+    async def ping(self, model: str = "gpt-4o-mini") -> str:
+        """Token-free metadata call that opens (and warms) the connection to the API."""
+        response = await self.client.models.retrieve(model)
+        return response.id
+
     async def transcribe(self, audio) -> str:
         """Transcribe audio file."""
         logging.info("Starting transcription...")
@@ -54,43 +128,150 @@ class LLMAgent(object):
         try:
             asyncio.get_running_loop()
         except RuntimeError:
-            return asyncio.run(self.execute_query_v002_async(interview_manager))
+            return self.run(self.execute_query_v002_async(interview_manager))
         else:
             return self.execute_query_v002_async(interview_manager)
 
     async def execute_query_v002_async(self, interview_manager) -> str:
         """
         Async entry point with hedged OpenAI call.
+
+        The token usage and cost of the turn are recorded on the interview manager
+        (see core.usage). Sessions over their `session_budget_usd` use the cheaper
+        `budget_plan` of the interview.
+
+        The respondent's answer is classified by the moderation endpoint concurrently
+        with the generation (unless the interview sets `moderation: False`). A flagged
+        answer cancels the generation and is counted (`flagged_messages`); the reply
+        is the `flagged_phrase`, and the interview ends with the `termination_phrase`
+        once `max_flags_allowed` answers were flagged.
         """
         current_question = interview_manager.current_state["question_name"]
+        parameters = interview_manager.parameters
 
         step = get_step_by_question_name(
-            parameters=interview_manager.parameters,
+            parameters=parameters,
             question_name=current_question,
         )
         check_data_is_not_empty(data=step, name="Data for current question step")
-
-        prompt = fill_prompt_with_interview_v002(
-            step=step,
-            global_prompt=interview_manager.parameters["global_mi_system_prompt"],
-            history=interview_manager.history,
-            history_indices=step.get("history_indices"),
-            include_global_prompt=step.get("include_global_prompt", True),
+        budget_plan = over_budget(
+            parameters, interview_manager.current_state.get("usage_total")
         )
+        if budget_plan:
+            logging.info("Session over its budget; using the budget plan")
+            step = budget_step(step, parameters)
+
+        timer = interview_manager.timer
+        with timer.stage("prompt_build"):
+            prompt = fill_prompt_with_interview_v002(
+                step=step,
+                global_prompt=parameters["global_mi_system_prompt"],
+                history=interview_manager.history,
+                history_indices=step.get("history_indices"),
+                include_global_prompt=step.get("include_global_prompt", True),
+                summary=interview_manager.current_state.get("summary", ""),
+            )
+
+        usage = TurnUsage()
+
+        async def generate():
+            candidates = candidate_count(step)
+            budget_s = step.get("candidate_budget_s", 8.0)
+            if candidates > 1:
+                # Several answers in parallel; the first that passes the step's check wins
+                try:
+                    text, full_response, plan, elapsed = (
+                        await call_openai_responses_first_valid(
+                            client=self.client,
+                            prompt=prompt,
+                            is_valid=lambda text: is_valid_answer(text, step),
+                            candidates=candidates,
+                            model=step.get("model", "gpt-5.2-2025-12-11"),
+                            budget_s=budget_s,
+                            max_output_tokens=step.get("max_output_tokens", 200),
+                            reasoning_effort=step.get("reasoning_effort", "none"),
+                            per_request_timeout_s=step.get(
+                                "per_request_timeout_s", 12.0
+                            ),
+                            timer=timer,
+                            usage=usage,
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    if "fallback_phrase" not in step:
+                        raise
+                    logging.warning("No candidate answer within the latency budget")
+                    text, full_response, elapsed = (
+                        step["fallback_phrase"],
+                        None,
+                        budget_s,
+                    )
+            else:
+                text, full_response, plan, elapsed = await call_openai_responses_hedged(
+                    client=self.client,
+                    prompt=prompt,
+                    primary_model=step.get("model", "gpt-5.2-2025-12-11"),
+                    fallback_model=step.get("fallback_model", "gpt-4o-mini"),
+                    hedge_delay_s=step.get("hedge_delay_s", 2.0),
+                    max_output_tokens=step.get("max_output_tokens", 200),
+                    reasoning_effort=step.get("reasoning_effort", "none"),
+                    per_request_timeout_s=step.get("per_request_timeout_s", 12.0),
+                    timer=timer,
+                    usage=usage,
+                    hedge=step.get("hedge", True),
+                )
+
+            return text, full_response, elapsed
+
+        message = _last_answer(interview_manager)
+        if message and parameters.get("moderation", True):
+            # The answer is checked while the question is generated
+            flagged, categories, generated = await generate_unless_flagged(
+                generate(),
+                call_openai_moderation(
+                    self.client,
+                    message,
+                    model=parameters.get("moderation_model", "omni-moderation-latest"),
+                    timeout_s=parameters.get("moderation_timeout_s", 5.0),
+                    timer=timer,
+                ),
+            )
+        else:
+            flagged, categories, generated = False, [], await generate()
 
-        text, full_response, plan, elapsed = await call_openai_responses_hedged(
-            client=self.client,
+        if flagged:
+            text, full_response, elapsed = None, None, 0.0
+        else:
+            text, full_response, elapsed = generated
+
+        interview_manager.set_open_ai_time(elapsed)
+        record = usage.to_record(
+            winner=full_response,
             prompt=prompt,
-            primary_model=step.get("model", "gpt-5.2-2025-12-11"),
-            fallback_model=step.get("fallback_model", "gpt-4o-mini"),
-            hedge_delay_s=step.get("hedge_delay_s", 2.0),
-            max_output_tokens=step.get("max_output_tokens", 200),
-            reasoning_effort=step.get("reasoning_effort", "none"),
-            per_request_timeout_s=step.get("per_request_timeout_s", 12.0),
+            prices=parameters.get("model_prices"),
+            budget_plan=budget_plan,
         )
+        interview_manager.set_usage(record)
+        observe_usage(record, interview_manager.current_state.get("interview_id"))
 
-        interview_manager.set_open_ai_time(elapsed)
+        if flagged:
+            logging.warning(f"Answer flagged by moderation: {categories}")
+            interview_manager.flag_risk(message)
+            if interview_manager.flagged_too_often():
+                return parameters.get("termination_phrase", DEFAULT_TERMINATION_PHRASE)
+            return step.get("flagged_phrase") or parameters.get(
+                "flagged_phrase", DEFAULT_FLAGGED_PHRASE
+            )
 
-        answer = apply_fallback_if_needed(text=text, step=step)
+        with timer.stage("fallback_check"):
+            answer = apply_fallback_if_needed(text=text, step=step)
 
         return answer
+
+
+def _last_answer(interview_manager) -> str:
+    """The respondent's answer that the question being generated follows, if any."""
+    history = interview_manager.history
+    if history and history[-1].type == "answer":
+        return history[-1].content
+    return ""
@@ -1,11 +1,26 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple, Iterable
-from openai import AsyncOpenAI
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Iterable,
+    TYPE_CHECKING,
+)
 import asyncio
 import time
 import logging
-from .auxiliary import fill_prompt_with_interview_v002, get_step_by_question_name
-from .error_handling import check_data_is_not_empty, _ensure_response_not_empty
+from .error_handling import _ensure_response_not_empty
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from .metrics import StageTimer
+    from .usage import TurnUsage
 
 
 @dataclass(frozen=True)
@@ -27,10 +42,16 @@ async def call_openai_responses_hedged(
     max_output_tokens: int = 400,
     reasoning_effort: str = "none",
     per_request_timeout_s: float = 12.0,
+    timer: Optional[StageTimer] = None,
+    usage: Optional[TurnUsage] = None,
+    hedge: bool = True,
 ) -> Tuple[str, Any, CallPlan, float]:
     """
-    Run primary immediately and fallback after hedge_delay_s.
+    Run primary immediately and fallback after hedge_delay_s (unless `hedge` is False).
     Return the first result. (race_first handles cancellations.)
+    If a timer is given, every attempt that was sent is recorded as a stage
+    (`llm_primary` / `llm_hedge`), including attempts that were cancelled; so is it
+    in `usage`, for token and cost accounting.
     """
     plans = [
         CallPlan(
@@ -49,7 +70,13 @@ async def call_openai_responses_hedged(
         ),
     ]
 
-    tasks = [asyncio.create_task(openai_call(client, prompt, plan)) for plan in plans]
+    if not hedge:
+        plans = plans[:1]
+
+    tasks = [
+        asyncio.create_task(openai_call(client, prompt, plan, timer=timer, usage=usage))
+        for plan in plans
+    ]
 
     text, resp, plan, elapsed = await race_first(tasks)
 
@@ -60,8 +87,58 @@ async def call_openai_responses_hedged(
     return text, resp, plan, elapsed
 
 
+async def call_openai_responses_first_valid(
+    client: AsyncOpenAI,
+    *,
+    prompt: str,
+    is_valid: Callable[[str], bool],
+    candidates: int = 3,
+    model: str = "gpt-5-nano-2025-08-07",
+    budget_s: float = 8.0,
+    max_output_tokens: int = 400,
+    reasoning_effort: str = "none",
+    per_request_timeout_s: float = 12.0,
+    timer: Optional[StageTimer] = None,
+    usage: Optional[TurnUsage] = None,
+) -> Tuple[str, Any, CallPlan, float]:
+    """
+    Request `candidates` answers concurrently and return the first that passes
+    `is_valid`, cancelling the others.
+    If no candidate is valid, the first invalid one is returned (so that the step's
+    fallback applies). Candidates still running after `budget_s` are cancelled; if
+    none finished by then, asyncio.TimeoutError is raised.
+    Every attempt is recorded as an `llm_candidate` stage if a timer is given, and
+    in `usage` if given.
+    """
+    plan = CallPlan(
+        0.0, model, max_output_tokens, reasoning_effort, per_request_timeout_s
+    )
+    tasks = [
+        asyncio.create_task(
+            openai_call(
+                client, prompt, plan, timer=timer, stage="llm_candidate", usage=usage
+            )
+        )
+        for _ in range(candidates)
+    ]
+    text, resp, plan, elapsed = await race_first(
+        tasks, accept=lambda result: is_valid(result[0]), timeout_s=budget_s
+    )
+
+    _ensure_response_not_empty(
+        text=text, context="OpenAI call", metadata={"model": plan.model}
+    )
+
+    return text, resp, plan, elapsed
+
+
 async def openai_call(
-    client: AsyncOpenAI, prompt: str, plan: CallPlan
+    client: AsyncOpenAI,
+    prompt: str,
+    plan: CallPlan,
+    timer: Optional[StageTimer] = None,
+    stage: Optional[str] = None,
+    usage: Optional[TurnUsage] = None,
 ) -> Tuple[str, Any, CallPlan, float]:
     """
     Perform one OpenAI call with optional start delay and a per-request timeout.
@@ -71,6 +148,9 @@ async def openai_call(
         await asyncio.sleep(plan.delay_s)
 
     start = time.perf_counter()
+    resp = None
+    if stage is None:
+        stage = "llm_primary" if plan.delay_s <= 0 else "llm_hedge"
 
     kwargs = {
         "model": plan.model,
@@ -91,36 +171,109 @@ async def openai_call(
         raise asyncio.TimeoutError(
             f"{plan.model} timed out after {plan.per_request_timeout_s}s"
         ) from exc
+    finally:
+        seconds = time.perf_counter() - start
+        if timer is not None:
+            timer.record(stage, seconds)
+        if usage is not None:
+            usage.record(plan.model, stage, seconds, resp)
 
     text = (getattr(resp, "output_text", None) or "").strip()
     elapsed = time.perf_counter() - start
     return text, resp, plan, elapsed
 
 
-async def race_first(tasks: List["asyncio.Task"]) -> Tuple[str, Any, CallPlan, float]:
+async def call_openai_moderation(
+    client: AsyncOpenAI,
+    text: str,
+    *,
+    model: str = "omni-moderation-latest",
+    timeout_s: float = 5.0,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[bool, List[str]]:
+    """
+    Classify `text` with the moderation endpoint.
+    Returns (flagged, names of the flagged categories). Recorded as the `moderation`
+    stage if a timer is given.
+    """
+    start = time.perf_counter()
+    try:
+        resp = await asyncio.wait_for(
+            client.moderations.create(model=model, input=text), timeout=timeout_s
+        )
+    finally:
+        if timer is not None:
+            timer.record("moderation", time.perf_counter() - start)
+
+    result = resp.results[0]
+    categories = getattr(result, "categories", None)
+    if hasattr(categories, "model_dump"):
+        categories = categories.model_dump()
+    elif categories is not None and not isinstance(categories, dict):
+        categories = vars(categories)
+    return bool(result.flagged), sorted(k for k, v in (categories or {}).items() if v)
+
+
+async def generate_unless_flagged(
+    generation: Awaitable, moderation: Awaitable[Tuple[bool, List[str]]]
+) -> Tuple[bool, List[str], Any]:
+    """
+    Run a generation concurrently with the moderation of the message it answers.
+    Returns (flagged, categories, result of the generation). If the message is
+    flagged, the generation is cancelled (or its result discarded) and the result is
+    None. A failed moderation is logged and counts as not flagged, so that an outage
+    of the moderation endpoint does not stop interviews.
+    """
+    generating = asyncio.ensure_future(generation)
+    try:
+        try:
+            flagged, categories = await moderation
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning("Moderation failed, answer not checked: %r", e)
+            flagged, categories = False, []
+        if flagged:
+            await _cancel([generating])
+            return True, categories, None
+        return False, categories, await generating
+    finally:
+        if not generating.done():
+            await _cancel([generating])
+
+
+async def race_first(
+    tasks: List["asyncio.Task"],
+    accept: Optional[Callable[[Tuple], bool]] = None,
+    timeout_s: Optional[float] = None,
+) -> Tuple[str, Any, CallPlan, float]:
     """
     Wait for the first task that completes successfully.
     Immediately cancel all remaining tasks when a success occurs.
     If a finished task raised, keep waiting for another to succeed.
     If all tasks fail, re-raise the first error.
+
+    With `accept`, only results it accepts count as successes; if no result is
+    accepted, the first rejected one is returned. With `timeout_s`, the remaining
+    tasks are cancelled after that many seconds (asyncio.TimeoutError if no task
+    finished by then).
     """
     pending = set(tasks)
     first_error: BaseException | None = None
+    first_rejected = None
+    deadline = None if timeout_s is None else time.perf_counter() + timeout_s
 
     while pending:
-        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = await asyncio.wait(
+            pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+        )
 
         for finished in done:
             try:
                 result = await finished  # (text, resp, plan, elapsed)
-
-                # On success: cancel remaining tasks ASAP
-                for t in pending:
-                    t.cancel()
-                await asyncio.gather(*pending, return_exceptions=True)
-
-                return result
-
             except asyncio.CancelledError:
                 # Ignore; continue to look for a successful finisher
                 continue
@@ -129,8 +282,32 @@ async def race_first(tasks: List["asyncio.Task"]) -> Tuple[str, Any, CallPlan, f
                 if first_error is None:
                     first_error = e
                 logging.warning("A hedged call failed: %r", e)
+                continue
+
+            if accept is not None and not accept(result):
+                logging.info("Rejected a candidate answer: %r", result[0][:200])
+                if first_rejected is None:
+                    first_rejected = result
+                continue
 
+            # On success: cancel remaining tasks ASAP
+            await _cancel(pending)
+            return result
+
+    if pending:
+        logging.warning("Latency budget of %ss exhausted", timeout_s)
+        await _cancel(pending)
+    if first_rejected is not None:
+        return first_rejected
+    if pending:
+        raise asyncio.TimeoutError(f"No answer within {timeout_s}s")
     # If we’re here, every task failed or was cancelled
     if first_error is not None:
         raise first_error
     raise RuntimeError("Hedge race ended with no tasks (unexpected).")
+
+
+async def _cancel(tasks: Iterable["asyncio.Task"]):
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,27 +1,19 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from __future__ import annotations
+
 import re
 import time
 import logging
-from typing import List, Dict, TypedDict, Iterable, Any, Optional
+from typing import List, Dict, Iterable, Any, Optional, Tuple, TYPE_CHECKING
 from decimal import Decimal
-from datetime import datetime
 import json
-from typing import Any, Dict, Tuple
-from openai import (
-    APIStatusError,
-    APIConnectionError,
-    AuthenticationError,
-    OpenAI,
-    AsyncOpenAI,
-)
-from dataclasses import dataclass
 from core.error_handling import (
     handle_openai_error,
     check_data_is_not_empty,
     _assert_is_str,
 )
-import asyncio
-from pydantic import validate_arguments
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 Message = Dict[str, str]
 
@@ -95,10 +87,12 @@ def fill_prompt_with_interview_v002(
     history: List[Message],
     history_indices: List[int] = None,
     include_global_prompt: bool = True,
+    summary: str = "",
 ) -> str:
     """
     Construct a prompt for OpenAI chat API:
     - Optionally start with the global/system prompt.
+    - Insert the running summary of the interview, if any (see core.summary).
     - Insert interview history messages (user + assistant turns).
     - Append the current step's instructions as a system message.
     """
@@ -114,6 +108,8 @@ def fill_prompt_with_interview_v002(
     prompt_parts = []
     if include_global_prompt:
         prompt_parts.append(global_prompt)
+    if summary:
+        prompt_parts.append(f"Summary of the Interview so far:\n{summary}")
     prompt_parts.append(f"Interview History:\n{history_for_prompt}")
     prompt_parts.append(f"Instructions for next question:\n{step['system']}\n")
 
@@ -128,7 +124,13 @@ def get_step_by_question_name(
     """
     Given a *single interview* parameters dict (the one that contains 'interview_plan'),
     return the step dict whose 'question_name' matches. Raises KeyError if not found.
+    Uses the index of steps of parameters compiled by core.registry, if present.
     """
+    steps = parameters.get("_steps")
+    if steps is not None:
+        if question_name in steps:
+            return steps[question_name]
+        raise KeyError(f"question_name '{question_name}' not found")
     plan = parameters["interview_plan"]
     for step in plan:
         if step.get("question_name") == question_name:
@@ -177,11 +179,30 @@ def _preview(val: Any, limit: int = 600) -> str:
         return f"<{type(val).__name__}>"
 
 
-@validate_arguments
+def is_valid_answer(text: str, step: dict) -> bool:
+    """Whether an answer is not empty and does not match the step's `fallback_regex`."""
+    regex_pattern: str | None = step.get("fallback_regex")
+    return bool(text) and not (regex_pattern and re.search(regex_pattern, text))
+
+
+def candidate_count(step: dict) -> int:
+    """
+    Number of candidate answers to request for a step: `candidates` (default 1), capped
+    so that at most `candidate_token_budget` output tokens can be spent on them.
+    """
+    candidates = int(step.get("candidates", 1))
+    budget = step.get("candidate_token_budget")
+    if budget:
+        per_candidate = step.get("max_output_tokens", 200)
+        candidates = min(candidates, max(1, int(budget) // per_candidate))
+    return max(1, candidates)
+
+
 def apply_fallback_if_needed(text: str, step: dict) -> str:
     """
     Apply fallback replacement if regex matches.
     """
+    _assert_is_str(text, "text")
     regex_pattern: str | None = step.get("fallback_regex")
     fallback_phrase: str = step.get("fallback_phrase", "Default fallback response")
 
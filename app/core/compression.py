@@ -0,0 +1,146 @@
+"""
+Content-negotiated compression of JSON responses.
+
+Exports of sessions (`/retrieve`, `/load/<session_id>`) are large and highly
+repetitive, so they shrink by an order of magnitude with gzip or brotli. Bodies below
+`COMPRESS_MIN_BYTES` (e.g. the replies of `/next`) are sent as they are, since
+compressing them saves less time than it costs.
+
+brotli (`br`) is offered if the `brotli` package is installed; gzip always is.
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Iterator, Optional, Tuple
+
+# Smallest body (bytes of JSON) that is compressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Size of the chunks in which streamed bodies are compressed
+CHUNK_BYTES = 64 * 1024
+# Preference among encodings that the client accepts equally
+PREFERENCE = ("br", "gzip")
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Best encoding of an `Accept-Encoding` header ("br" or "gzip"), or None for an
+    uncompressed body. Encodings with q=0 are refused; `*` accepts any.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name] = q
+
+    available = [e for e in PREFERENCE if e != "br" or _brotli() is not None]
+    candidates = [(accepted.get(e, accepted.get("*", 0.0)), e) for e in available]
+    candidates = [(q, e) for q, e in candidates if q > 0]
+    if not candidates:
+        return None
+    # Highest q wins; on ties the order of PREFERENCE
+    return max(candidates, key=lambda c: (c[0], -PREFERENCE.index(c[1])))[1]
+
+
+class _Compressor(object):
+    """Incremental compressor of one body."""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self.compressor = _brotli().Compressor(mode=_brotli().MODE_TEXT)
+            self.compress, self.flush = self.compressor.process, self.compressor.finish
+        elif encoding == "gzip":
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container
+            self.compress, self.flush = self.compressor.compress, self.compressor.flush
+        else:
+            raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body."""
+    compressor = _Compressor(encoding)
+    return compressor.compress(body) + compressor.flush()
+
+
+def iter_compress(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a body given as chunks, yielding compressed chunks as they fill up."""
+    compressor = _Compressor(encoding)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _json_parts(obj: Any) -> Iterator[bytes]:
+    """JSON of `obj` in the small parts produced by the encoder, as UTF-8."""
+    for part in json.JSONEncoder(default=str).iterencode(obj):
+        yield part.encode("utf-8")
+
+
+def _chunks(parts: Iterator[bytes]) -> Iterator[bytes]:
+    """`parts` joined into chunks of about CHUNK_BYTES."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_json(obj: Any) -> Iterator[bytes]:
+    """JSON of `obj` in chunks of about CHUNK_BYTES, without building the whole string."""
+    return _chunks(_json_parts(obj))
+
+
+def stream_json(
+    obj: Any, accept_encoding: Optional[str], min_bytes: int = COMPRESS_MIN_BYTES
+) -> Tuple[Optional[str], Iterator[bytes]]:
+    """
+    Return (Content-Encoding or None, chunks of the body) of `obj` as JSON, compressed
+    if the client accepts it and the body reaches `min_bytes` (of UTF-8). The decision
+    is taken as soon as the encoder produced `min_bytes`; the rest is streamed.
+    """
+    parts = _json_parts(obj)
+    head, size = [], 0
+    for part in parts:
+        head.append(part)
+        size += len(part)
+        if size >= min_bytes:
+            break
+    encoding = choose_encoding(accept_encoding) if size >= min_bytes else None
+
+    def body() -> Iterator[bytes]:
+        yield b"".join(head)
+        yield from _chunks(parts)
+
+    if encoding is None:
+        return None, body()
+    return encoding, iter_compress(body(), encoding)
+
+
+def encode_json(
+    obj: Any, accept_encoding: Optional[str], min_bytes: int = COMPRESS_MIN_BYTES
+) -> Tuple[Optional[str], bytes]:
+    """Like `stream_json`, but return the whole body at once."""
+    encoding, chunks = stream_json(obj, accept_encoding, min_bytes)
+    return encoding, b"".join(chunks)
@@ -1,6 +1,5 @@
 import logging
 from typing import Any, Dict, List, Mapping
-from openai import APIStatusError, AuthenticationError, APIConnectionError
 
 
 def check_data_is_not_empty(data: Any, name: str = "data") -> None:
@@ -14,6 +13,9 @@ def handle_openai_error(e: Exception) -> None:
     Unified error handler for OpenAI exceptions.
     Logs details using the standard logging module, then re-raises.
     """
+    # Imported lazily so that importing this module does not load the OpenAI SDK
+    from openai import APIStatusError, AuthenticationError, APIConnectionError
+
     if isinstance(e, APIStatusError):
         try:
             details = e.response.json()
@@ -1,15 +1,38 @@
+from __future__ import annotations
+
 import logging
 import os
-from parameters import INTERVIEW_PARAMETERS, OPENAI_API_KEY
 from core.manager import InterviewManager
 from core.agent import LLMAgent
-from database.dynamo import DynamoDB
-from typing import Union
-from database.file import FileWriter
+from core.metrics import StageTimer
+from core.registry import plans_for_session
+from core.session import from_document, has_ended, to_rows
+from core.singleflight import SingleFlight
+from core.summary import (
+    SummaryJobs,
+    summary_enabled,
+    summary_pending,
+    update_summary,
+    wait_for_summary,
+)
+from typing import Union, TYPE_CHECKING
 import threading
-import asyncio
-from typing import Optional, Mapping, Any, Protocol, Callable, Dict, runtime_checkable
-from pydantic import validate_arguments
+import time
+from typing import Mapping, Any, Dict
+from database.errors import TurnConflictError
+
+if TYPE_CHECKING:
+    from database.dynamo import DynamoDB
+    from database.file import FileWriter
+
+# Duplicates of a /next request share one run; results are kept for late retries
+NEXT_FLIGHTS = SingleFlight(ttl_s=float(os.getenv("NEXT_RESULT_TTL_S", "30")))
+# Running summaries updated in the background after turns (see core.summary)
+SUMMARY_JOBS = SummaryJobs()
+# Longest wait (seconds after it began) of a request for the reply of a turn of its
+# session that another request, possibly in another process, is generating
+REPLY_WAIT_S = float(os.getenv("NEXT_REPLY_WAIT_S", "30"))
+REPLY_POLL_S = 0.25
 
 
 # ------------ Main Interview Logic Function -------------#
@@ -20,22 +43,42 @@ def next_question(
     agent: LLMAgent,
     interview_parameters: dict,
     user_message: str | None,
+    request_id: str | None = None,
+    timer: StageTimer | None = None,
 ) -> dict:
     """
     Process user message and generate response by the AI-interviewer.
 
+    The request and, once the turn is stored, its reply are recorded in the session
+    state. A request whose `request_id` the session already handled, or that arrives
+    while another request is generating a turn of the session, returns that reply
+    instead of adding a turn (see `stored_reply`); this holds across processes.
+
     Args:
         session_id: (str) unique interview session ID
         user_message: (str or None) interviewee response
         interview_id: (str) containing interview guidelines index
+        request_id: (str) optional ID of the answer, the same for its retries
+        timer: (StageTimer) optional collector of per-stage timings of this turn
     Returns:
         response: (dict) containing `message` from interviewer
     """
 
     # Setup
-    interview_manager = InterviewManager(db=db, session_id=session_id)
-    params = interview_parameters[interview_id]
+    timer = timer or StageTimer()
+    interview_manager = InterviewManager(db=db, session_id=session_id, timer=timer)
+    history = interview_manager.load_session()
+    # Stored sessions continue with the version of the plan they began with
+    params = plans_for_session(interview_parameters, interview_id, history)
     agent.parameters = params
+    # A duplicate of a handled request, or a turn being generated elsewhere
+    reply = stored_reply(session_id, db, history, request_id, timer=timer)
+    if reply is not None:
+        return reply
+    # The summary of the previous turn, if it is still being written
+    if summary_enabled(params) and summary_pending(history):
+        with timer.stage("summary_wait"):
+            history = wait_for_summary(session_id, db, history, SUMMARY_JOBS)
 
     # Check if we need to begin a new session
     maybe_payload = maybe_begin_session(
@@ -47,36 +90,239 @@ def next_question(
         parameters=params,
         begin_interview_session=begin_interview_session,
         warm_target=_warm_openai,  # your existing warmup function
+        history=history,
+        request_id=request_id,
     )
     if maybe_payload is not None:
         return maybe_payload
 
     else:
-        interview_manager.resume_session(parameters=params)
+        interview_manager.resume_session(parameters=params, history=history)
+        # Sessions started before interview_id was recorded
+        interview_manager.current_state.setdefault("interview_id", interview_id)
+
+    if user_message is None:
+        # A repeated start of a stored session (e.g. the page was reloaded) is not an
+        # answer: the last question is asked again
+        questions = [t for t in interview_manager.history if t.type == "question"]
+        message = questions[-1].content if questions else ""
+        return _reply(session_id, message, interview_manager.current_state)
+
+    try:
+        return _answer_and_ask(
+            session_id, interview_manager, agent, user_message, request_id
+        )
+    except TurnConflictError:
+        # Another request answered the same question first (e.g. a duplicate that
+        # reached another process); its turn is kept and its reply returned
+        stored = interview_manager.load_session()
+        reply = stored_reply(session_id, db, stored, timer=timer, latest=True)
+        if reply is None:
+            raise
+        return reply
+
 
-    interview_manager.add_chat_to_session(
-        message=user_message, type="answer"
-    )  # TODO Here, type annotations are not super clear yet. The reason is that the flow structure is not so nice
+def _answer_and_ask(
+    session_id: str,
+    interview_manager: InterviewManager,
+    agent: LLMAgent,
+    user_message: str | None,
+    request_id: str | None = None,
+) -> dict:
+    """
+    Store the answer of a resumed session, generate the next question and store it.
+
+    A retry of a request whose question was not stored (see `stored_reply`) reuses
+    the answer that request stored. If generating the question fails, the request is
+    recorded as failed, so that requests waiting for its reply do not wait longer.
+    """
+    last = interview_manager.current_state.get("last_request") or {}
+    history = interview_manager.history
+    retried = (
+        request_id is not None
+        and last.get("request_id") == request_id
+        and last.get("message") is None
+        and bool(history)
+        and history[-1].type == "answer"
+    )
+    interview_manager.begin_request(request_id)
+    if retried:
+        logging.info(f"Retrying request '{request_id}' of session '{session_id}'")
+        interview_manager.update_session()
+    else:
+        interview_manager.add_chat_to_session(
+            message=user_message, type="answer"
+        )  # TODO Here, type annotations are not super clear yet. The reason is that the flow structure is not so nice
 
-    next_question = agent.execute_query_v002_auto(interview_manager=interview_manager)
+    try:
+        next_question = agent.execute_query_v002_auto(
+            interview_manager=interview_manager
+        )
+    except Exception:
+        interview_manager.fail_request()
+        try:
+            interview_manager.update_session()
+        except Exception as e:
+            logging.warning(f"Could not record the failed request: {e!r}")
+        raise
 
     interview_manager.add_chat_to_session(message=next_question, type="question")
-    interview_manager.update_parameters_after_question(
-        question_name=interview_manager.current_state["question_name"]
+    interview_manager.set_stage_timings(interview_manager.timer.as_ms())
+    # Written with the last write of the turn, which completes it
+    interview_manager.complete_request(next_question)
+
+    # A flagged answer (see LLMAgent.execute_query_v002_async) does not advance the
+    # plan: the same step is asked again, unless the interview was terminated
+    if interview_manager.flagged:
+        interview_manager.update_session()
+    else:
+        interview_manager.update_parameters_after_question(
+            question_name=interview_manager.current_state["question_name"]
+        )
+
+    # If this was the last question (or the interview was terminated), end it
+    return _reply(session_id, next_question, interview_manager.current_state)
+
+
+def _reply(session_id: str, message: str, state: dict) -> dict:
+    """Response of a turn; the message is marked if the interview has ended."""
+    if has_ended(state):
+        message = f"{message}---END---"
+    return {"session_id": session_id, "message": message}
+
+
+def stored_reply(
+    session_id: str,
+    db: Union[DynamoDB, FileWriter],
+    session: Any,
+    request_id: str | None = None,
+    timer: StageTimer | None = None,
+    latest: bool = False,
+) -> dict | None:
+    """
+    Reply that a request returns instead of adding a turn to a stored session, from
+    the request recorded in its state (see InterviewManager.begin_request):
+
+    - the reply of the same `request_id`, if the session already handled it (with
+      `latest`, the reply of the last request, whichever it was);
+    - the reply of a turn that another request is still generating, waited for
+      until REPLY_WAIT_S seconds after that request began, or until it failed.
+
+    Returns None if the request should add its own turn (or, for a retry of a failed
+    request, generate the question of the answer it stored).
+    """
+    timer = timer or StageTimer()
+    state, _ = from_document(session)
+    last = state.get("last_request")
+    if not last:
+        return None
+    if last.get("message") is not None:
+        if latest or (request_id and last.get("request_id") == request_id):
+            return _reply(session_id, last["message"], state)
+        return None
+
+    with timer.stage("reply_wait"):
+        while last.get("message") is None:
+            if last.get("failed") or (
+                time.time() >= last.get("started_at", 0) / 1000 + REPLY_WAIT_S
+            ):
+                return None  # the request failed (or is too slow)
+            time.sleep(REPLY_POLL_S)
+            state, _ = from_document(db.load_remote_session(session_id))
+            last = state.get("last_request") or {}
+    logging.info(f"Returning the reply of a request of session '{session_id}'")
+    return _reply(session_id, last["message"], state)
+
+
+def next_question_once(
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+    user_message: str | None,
+    request_id: str | None = None,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    `next_question`, run at most once per (session_id, request_id).
+
+    Duplicate requests (client retries, double clicks) that arrive while the first one
+    is running wait for its response instead of generating their own; retries within
+    NEXT_RESULT_TTL_S seconds after it completed get the same response back. Without
+    a `request_id`, only concurrent requests with the same `user_message` are
+    coalesced, as the same answer may legitimately be given to the next question.
+    """
+    timer = timer or StageTimer()
+    if request_id:
+        key, cache = (session_id, "request", str(request_id)), True
+    else:
+        key, cache = (session_id, "message", user_message or ""), False
+
+    start = time.perf_counter()
+    response, shared = NEXT_FLIGHTS.do(
+        key,
+        lambda: next_question(
+            session_id=session_id,
+            interview_id=interview_id,
+            db=db,
+            agent=agent,
+            interview_parameters=interview_parameters,
+            user_message=user_message,
+            request_id=request_id,
+            timer=timer,
+        ),
+        cache=cache,
     )
+    if shared:
+        timer.record("singleflight_wait", time.perf_counter() - start)
+    return dict(response)
 
-    # If this was the last question, end the interview
-    if interview_manager.current_state["question_name"] == "last_question":
-        final_question = f"{next_question}---END---"
-        return {"session_id": session_id, "message": final_question}
 
-    return {"session_id": session_id, "message": next_question}
+def schedule_summary(
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+):
+    """
+    Fold the latest turn into the session's running summary in a background thread,
+    for interviews with `summary` set (see core.summary). Call once the response of
+    the turn has been sent.
+    """
+    if not summary_enabled(interview_parameters.get(interview_id)):
+        return
+    SUMMARY_JOBS.submit(
+        session_id,
+        summarise_session,
+        session_id=session_id,
+        interview_id=interview_id,
+        db=db,
+        agent=agent,
+        interview_parameters=interview_parameters,
+    )
+
+
+def summarise_session(
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+) -> dict:
+    """Fold the turns added since the last summary into the session's summary."""
+    history = db.load_remote_session(session_id)
+    params = plans_for_session(interview_parameters, interview_id, history)
+    updated = summary_enabled(params) and update_summary(
+        session_id, db, agent, params, history
+    )
+    return {"session_id": session_id, "updated": bool(updated)}
 
 
 # ------------ Helper Functions -------------#
 
 
-@validate_arguments
 def maybe_begin_session(
     session_id: str,
     interview_id: str,
@@ -86,15 +332,19 @@ def maybe_begin_session(
     parameters: Mapping[str, Any],
     begin_interview_session: Any,
     warm_target: Any,
+    history: list | None = None,
+    request_id: str | None = None,
 ) -> Dict[str, str] | None:
     """
     If no prior session exists, warm the agent asynchronously and start the interview.
-    Otherwise, return None.
+    Otherwise, return None. Pass an already loaded `history` to avoid reading it twice.
 
     Returns:
         dict with {"session_id": ..., "message": ...} when a new session begins, else None.
     """
-    has_history = bool(db.load_remote_session(session_id))
+    if history is None:
+        history = db.load_remote_session(session_id)
+    has_history = bool(history)
     if has_history:
         return None
 
@@ -109,6 +359,7 @@ def maybe_begin_session(
         interview_id=interview_id,
         interview_manager=interview_manager,
         parameters=parameters,
+        request_id=request_id,
     )
 
 
@@ -117,40 +368,189 @@ def begin_interview_session(
     interview_id: str,
     interview_manager: InterviewManager,
     parameters: dict,
+    request_id: str | None = None,
 ) -> dict:
     """Return response with starting question of new interview session."""
-    interview_manager.begin_session(parameters=parameters)
+    interview_manager.begin_session(parameters=parameters, interview_id=interview_id)
     message = parameters["first_question"]
+    interview_manager.begin_request(request_id)
+    interview_manager.complete_request(message)
     interview_manager.add_chat_to_session(message, type="question")
     return {"session_id": session_id, "interview_id": interview_id, "message": message}
 
 
+def start_or_resume_session(
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    Begin a new interview session, or resume a stored one, for the landing page.
+
+    A new session is begun with its first question (see `begin_interview_session`);
+    for a stored session, e.g. when the respondent reloads the page, the transcript so
+    far is returned. Sessions keep the interview they were begun with.
+
+    Returns:
+        bootstrap: (dict) with `session_id`, `interview_id`, the `messages` so far
+            ({"type": ..., "content": ...}) and whether the interview has `ended`
+    """
+    timer = timer or StageTimer()
+    interview_manager = InterviewManager(db=db, session_id=session_id, timer=timer)
+    history = interview_manager.load_session()
+    params = plans_for_session(interview_parameters, interview_id, history)
+    payload = maybe_begin_session(
+        session_id=session_id,
+        interview_id=interview_id,
+        db=db,
+        agent=agent,
+        interview_manager=interview_manager,
+        parameters=params,
+        begin_interview_session=begin_interview_session,
+        warm_target=_warm_openai,
+        history=history,
+    )
+    if payload is None:
+        interview_manager.resume_session(parameters=params, history=history)
+    state = interview_manager.current_state
+    return {
+        "session_id": session_id,
+        "interview_id": state.get("interview_id") or interview_id,
+        "messages": [
+            {"type": turn.type, "content": turn.content}
+            for turn in interview_manager.history
+        ],
+        "ended": has_ended(state),
+    }
+
+
 def transcribe(audio: str, agent: LLMAgent) -> dict:
     """Return audio file transcription using OpenAI Whisper API"""
     logging.critical(f"Audio is: {type(audio)}...")
-    transcription = asyncio.run(agent.transcribe(audio))
+    transcription = agent.run(agent.transcribe(audio))
 
     return {"transcription": transcription}
 
 
+def iter_transcribe_and_next(
+    audio: str,
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+    request_id: str | None = None,
+    timer: StageTimer | None = None,
+):
+    """
+    Transcribe a spoken answer and continue the interview in one request.
+
+    Yields the transcription as soon as it is available, followed by the
+    response of `next_question_once` for that transcription (and `request_id`).
+
+    Yields:
+        {"session_id": ..., "transcription": ...}
+        {"session_id": ..., "message": ...}
+    """
+    timer = timer or StageTimer()
+    with timer.stage("transcribe"):
+        transcription = transcribe(audio, agent=agent)["transcription"]
+    if not transcription:
+        raise ValueError("Transcription failed: no text returned for audio.")
+    yield {"session_id": session_id, "transcription": transcription}
+
+    yield next_question_once(
+        session_id=session_id,
+        interview_id=interview_id,
+        db=db,
+        agent=agent,
+        interview_parameters=interview_parameters,
+        user_message=transcription,
+        request_id=request_id,
+        timer=timer,
+    )
+
+
+def transcribe_and_next(
+    audio: str,
+    session_id: str,
+    interview_id: str,
+    db: Union[DynamoDB, FileWriter],
+    agent: LLMAgent,
+    interview_parameters: dict,
+    request_id: str | None = None,
+    timer: StageTimer | None = None,
+) -> dict:
+    """
+    Return the transcription of a spoken answer together with the next question,
+    saving the client a separate `transcribe` round trip.
+
+    Returns:
+        response: (dict) containing `transcription` and `message` from interviewer
+    """
+    response = {}
+    for part in iter_transcribe_and_next(
+        audio=audio,
+        session_id=session_id,
+        interview_id=interview_id,
+        db=db,
+        agent=agent,
+        interview_parameters=interview_parameters,
+        request_id=request_id,
+        timer=timer,
+    ):
+        response.update(part)
+    return response
+
+
+def load_interview_session(session_id: str, db: Union[DynamoDB, FileWriter]) -> list:
+    """Return interview session history (one row per message)."""
+    return to_rows(db.load_remote_session(session_id))
+
+
+def delete_interview_session(session_id: str, db: Union[DynamoDB, FileWriter]):
+    """Delete existing interview saved to database."""
+    db.delete_remote_session(session_id)
+
+
+def retrieve_sessions(db: Union[DynamoDB, FileWriter], sessions: list = None) -> list:
+    """Return the messages (one row each) of specified or all existing sessions."""
+    return db.retrieve_sessions(sessions)
+
+
+def warm_up(db: Union[DynamoDB, FileWriter], agent: LLMAgent, model: str) -> dict:
+    """
+    Warm database and LLM connections without creating sessions or generating text.
+
+    Performs a cheap metadata call against each backend (DescribeTable for DynamoDB,
+    a model lookup for OpenAI), which opens and keeps the TLS connections alive. The
+    OpenAI call runs on the agent's event loop (see LLMAgent.run), whose connections
+    later requests reuse.
+
+    Returns:
+        timings: (dict) milliseconds per call, plus errors by backend if any failed
+    """
+    timings, errors = {}, {}
+    for name, call in (
+        ("db", db.ping),
+        ("llm", lambda: agent.run(agent.ping(model))),
+    ):
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            logging.warning("Warm-up call '%s' failed: %r", name, e)
+            errors[name] = f"{type(e).__name__}: {e}"
+        timings[f"{name}_ping_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return {"timings_ms": timings, "errors": errors}
+
+
 def _warm_openai(agent: LLMAgent) -> None:
-    """Warm the OpenAI client to hide cold-start latency."""
+    """Warm the OpenAI client to hide cold-start latency (token-free)."""
     try:
-        manager = InterviewManager(db=None, session_id="warmup")
-        manager.begin_session(
-            parameters={
-                "global_mi_system_prompt": "",
-                "interview_plan": [
-                    {
-                        "question_name": "warmup",
-                        "system": "Reply with a short acknowledgment.",
-                        "model": "gpt-5-nano-2025-08-07",
-                        "max_output_tokens": 20,
-                    }
-                ],
-                "first_ai_question_name": "warmup",
-            }
-        )
-        agent.execute_query_v002_auto(manager)
+        agent.run(agent.ping())
     except Exception:
         pass
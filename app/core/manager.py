@@ -1,12 +1,27 @@
-from datetime import datetime
+from __future__ import annotations
+
 import logging
-from typing import Any, Dict, Callable, Optional, Union
-from database.dynamo import DynamoDB
-from database.file import FileWriter
+import random
+from typing import Any, Dict, Callable, Optional, Union, TYPE_CHECKING
 import time
-from decimal import Decimal
 
 from core.auxiliary import get_step_by_question_name
+from core.metrics import REGISTRY, StageTimer
+from core.session import Turn, from_document, to_document, version_of
+from core.usage import add_to_total
+from database.errors import SessionConflictError, TurnConflictError
+
+if TYPE_CHECKING:
+    from database.dynamo import DynamoDB
+    from database.file import FileWriter
+
+# Attempts of a session write that conflicts with concurrent writes, and base delay
+# (seconds, doubled per attempt) before reloading the session and retrying
+WRITE_ATTEMPTS = 5
+WRITE_BACKOFF_S = 0.02
+# State variables that add up over the session (counters, and the sums of
+# `usage_total`): a rebased write adds its changes to the stored values
+ADDITIVE_STATE = ("flagged_messages", "usage_total")
 
 
 class InterviewManager(object):
@@ -14,42 +29,62 @@ class InterviewManager(object):
     Class to manage the conversation history for an interview
     between the user and the AI-interviewer.
 
+    The history is a list of `Turn`s; the session-level state (counters, summary,
+    pointer to the next question, ...) is kept once in `current_state`.
+
     Args:
         client: database manager
         session_id: (str) unique interview session key
+        timer: (StageTimer) optional collector of per-stage timings for this turn
     """
 
-    def __init__(self, db: Union[DynamoDB, FileWriter], session_id: str):
+    def __init__(
+        self,
+        db: Union[DynamoDB, FileWriter],
+        session_id: str,
+        timer: Optional[StageTimer] = None,
+    ):
 
         self.db = db
         self.session_id = session_id
+        self.timer = timer or StageTimer()
+        self.version = 0  # version of the stored session this object is based on
+        self._stored_turns = 0  # number of turns in that stored session
+        self._base_state = {}  # state of that stored session
+        self.usage = None  # usage record of the question being generated
+        self.flagged = False  # whether the answer of this turn was flagged
+
+    def load_session(self):
+        """Load the stored session (empty if not started)."""
+        with self.timer.stage("session_load"):
+            return self.db.load_remote_session(self.session_id)
 
-    def begin_session(self, parameters: dict):
+    def begin_session(self, parameters: dict, interview_id: Optional[str] = None):
         """Set starting interview session variables."""
-        self.history = []  # List of 'states', i.e. messages
+        self.history = []  # List of Turns, i.e. messages
         self.current_state = {
-            "order": 0,  # index of message
             "session_id": self.session_id,  # always store session_id
+            "interview_id": interview_id,  # key of the interview parameters
             "topic_idx": 1,  # topic index
             "question_idx": 1,  # within-topic question index
             "finish_idx": 1,  # closing question index
             "flagged_messages": 0,  # count of flagged messages
             "terminated": False,  # whether termination signal been sent
             "summary": "",  # running summary
-            "type": "question",  # question or answer
-            "content": None,  # content
             "open_ai_time": 0,  # time taken for last AI response
             "question_name": parameters.get(
                 "first_ai_question_name"
             ),  # name of the last question asked
+            "plan_version": parameters.get("plan_version"),  # see core.registry
         }
         self.parameters = parameters
+        self._set_base({})
 
-    def resume_session(self, parameters: dict):
-        """Load remote history into this Interview object."""
-        self.history = self.db.load_remote_session(self.session_id)
-        # last known state
-        self.current_state = self.history[-1].copy()
+    def resume_session(self, parameters: dict, history: Optional[Any] = None):
+        """Load the stored session (unless already loaded) into this Interview object."""
+        stored = history if history is not None else self.load_session()
+        self.current_state, self.history = from_document(stored)
+        self._set_base(stored)
         # NOTE: better to persist parameters in DB and load them;
         # if not, passing them in here is acceptable for now
         self.parameters = parameters
@@ -59,13 +94,130 @@ class InterviewManager(object):
             parameters=self.parameters, question_name=question_name
         )
 
-        self.current_state["question_name"] = current_step.get("next_question", None)
+        next_question = current_step.get("next_question", None)
+        self.current_state["question_name"] = next_question
+        if self.history:
+            self.history[-1].question_name = next_question
         self.update_session()
 
     def update_session(self):
         """Update current state in remote database"""
-        self.history[-1] = self.current_state
-        self.db.update_remote_session(self.session_id, self.history)
+        self._write()
+
+    def _write(self):
+        """
+        Write the session (state and all turns) to the remote database.
+
+        Writes are versioned (see core.session.to_document). If another request
+        updated the session since it was read, the conflict is counted, the stored
+        session is reloaded after a short random backoff, the changes of this request
+        are rebased onto it (see `_rebase`) and the write is retried. If both requests
+        added turns, TurnConflictError is raised once the counters of this request
+        are written.
+        """
+        discarded = None
+        for attempt in range(WRITE_ATTEMPTS):
+            document = to_document(self.current_state, self.history, self.version + 1)
+            try:
+                with self.timer.stage("db_write"):
+                    self.db.update_remote_session(self.session_id, document)
+            except SessionConflictError:
+                REGISTRY.inc("session_write_conflicts_total")
+                logging.warning(
+                    f"Write conflict on session '{self.session_id}' "
+                    f"(attempt {attempt + 1} of {WRITE_ATTEMPTS})"
+                )
+                if attempt + 1 == WRITE_ATTEMPTS:
+                    raise
+                time.sleep(random.uniform(0, WRITE_BACKOFF_S * 2**attempt))
+                try:
+                    self._rebase(self.load_session())
+                except TurnConflictError as e:
+                    REGISTRY.inc("session_turn_conflicts_total")
+                    discarded = e
+                    if self.current_state == self._base_state:
+                        raise  # no counters to add
+            else:
+                self._set_base(document)
+                if discarded is not None:
+                    raise discarded
+                return
+
+    def _set_base(self, stored):
+        """Remember the stored session that the next write is based on."""
+        self.version = version_of(stored)
+        self._stored_turns = len(self.history)
+        self._base_state = dict(self.current_state) if stored else {}
+
+    def _rebase(self, stored):
+        """
+        Apply the changes of this request on top of the session stored by another one.
+
+        State variables changed since the last read or write overwrite the stored
+        ones, except for those of ADDITIVE_STATE, whose changes are added to them.
+        Turns added since then are appended after the stored turns if the other
+        request only changed the state. If it added turns as well, both answered the
+        same question: the turns of this request are discarded, only its counters
+        are kept, and TurnConflictError is raised. If both requests began the same
+        session, the stored one is kept.
+        """
+        state, turns = from_document(stored)
+        if not self._base_state and turns:
+            self.current_state, self.history = state, turns
+            self._set_base(stored)
+            return
+
+        new_turns = self.history[self._stored_turns :]
+        conflict = bool(new_turns) and len(turns) != self._stored_turns
+        changed = {
+            key: value
+            for key, value in self.current_state.items()
+            if (key not in self._base_state or self._base_state[key] != value)
+            and (key in ADDITIVE_STATE or not conflict)
+        }
+        base_state = self._base_state
+        self.current_state, self.history = state, turns
+        self._set_base(stored)
+        for key, value in changed.items():
+            if key in ADDITIVE_STATE:
+                value = _add_change(state.get(key), value, base_state.get(key))
+            self.current_state[key] = value
+        if conflict:
+            logging.warning(
+                f"Session '{self.session_id}' has new turns of another request; "
+                f"discarding the {len(new_turns)} turns of this one"
+            )
+            raise TurnConflictError(self.session_id, self.version + 1)
+        order = turns[-1].order if turns else 0
+        for turn in new_turns:
+            order += 1
+            turn.order = order
+        self.history.extend(new_turns)
+
+    def begin_request(self, request_id: Optional[str] = None):
+        """
+        Record the request that adds the next turn; its reply is recorded with the
+        last write of the turn (see `complete_request` and core.logic.stored_reply).
+        """
+        self.current_state["last_request"] = {
+            "request_id": request_id,
+            "started_at": int(time.time() * 1000),
+            "message": None,
+        }
+
+    def complete_request(self, message: str):
+        """Record the reply of the request of this turn (written with the next write)."""
+        self.current_state["last_request"] = {
+            **self.current_state.get("last_request", {}),
+            "message": message,
+        }
+
+    def fail_request(self):
+        """Record that the request of this turn failed (written with the next write)."""
+        self.current_state["last_request"] = {
+            **self.current_state.get("last_request", {}),
+            "failed": True,
+        }
 
     def get_history(self):
         """Return interview session history."""
@@ -75,6 +227,7 @@ class InterviewManager(object):
         """Flag possible security risk."""
         logging.warning(f"Flagging message '{message}' for possible risk...")
         self.current_state["flagged_messages"] += 1
+        self.flagged = True
 
     def flagged_too_often(self) -> bool:
         """Check if the conversation has been flagged too often."""
@@ -87,17 +240,22 @@ class InterviewManager(object):
 
     def add_chat_to_session(self, message: str, type: str):
         """Add to chat transcript to remote database"""
-        order = (self.history[-1]["order"] if self.history else 0) + 1
-        turn = {
-            **self.current_state,
-            "order": order,
-            "time": int(time.time()),
-            "content": (message or "").strip(),
-            "type": type,
-        }
+        order = (self.history[-1].order if self.history else 0) + 1
+        turn = Turn(
+            order=order,
+            time=int(time.time()),
+            type=type,
+            content=(message or "").strip(),
+            question_name=self.current_state.get("question_name"),
+            open_ai_time=(
+                self.current_state.get("open_ai_time") if type == "question" else None
+            ),
+            usage=self.usage if type == "question" else None,
+        )
+        if type == "question":
+            self.usage = None
         self.history.append(turn)
-        self.current_state = turn
-        self.db.update_remote_session(self.session_id, self.history)
+        self._write()
 
     def terminate(self, reason: str = "end_of_interview"):
         """Record termination of interview."""
@@ -161,5 +319,30 @@ class InterviewManager(object):
                 "current_state missing or not a dict; skipping set_open_ai_time"
             )
             return False
-        self.current_state["open_ai_time"] = Decimal(str(seconds))
+        self.current_state["open_ai_time"] = seconds
         return True
+
+    def set_usage(self, record: Dict[str, Any]):
+        """
+        Keep the usage record of the question being generated (stored on it when it
+        is added) and add it to the session's `usage_total`.
+        """
+        self.usage = record
+        self.current_state["usage_total"] = add_to_total(
+            self.current_state.get("usage_total"), record
+        )
+
+    def set_stage_timings(self, timings: Dict[str, int]):
+        """Store the per-stage timings (milliseconds) of this turn on its last message."""
+        self.history[-1].stage_ms = timings
+
+
+def _add_change(stored, current, base):
+    """`stored` with the change from `base` to `current` added (numbers or dicts of them)."""
+    if isinstance(current, dict):
+        stored, base = dict(stored or {}), base or {}
+        for key, value in current.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stored[key] = stored.get(key, 0) + value - base.get(key, 0)
+        return stored
+    return (stored or 0) + (current or 0) - (base or 0)
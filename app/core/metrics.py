@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+
+class StageTimer(object):
+    """
+    Collect the durations of the named stages of one request (e.g. one interview turn).
+
+    Stages may repeat (e.g. several database writes per turn); they are kept in the
+    order they were recorded.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """Record a stage that was timed elsewhere."""
+        self.stages.append((name, seconds))
+
+    def total(self) -> float:
+        """Seconds since the timer was created."""
+        return time.perf_counter() - self.started
+
+    def as_ms(self) -> Dict[str, int]:
+        """
+        Return {stage: milliseconds}. Repeated stages get a numbered suffix,
+        e.g. `db_write`, `db_write_2`, ...
+        """
+        out, seen = {}, {}
+        for name, seconds in self.stages:
+            seen[name] = seen.get(name, 0) + 1
+            key = name if seen[name] == 1 else f"{name}_{seen[name]}"
+            out[key] = int(round(seconds * 1000))
+        return out
+
+    def server_timing(self) -> str:
+        """Render the stages (and the total) as a `Server-Timing` header value."""
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages]
+        metrics.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+class Histogram(object):
+    """Cumulative latency histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry(object):
+    """
+    Process-wide store of latency histograms and counters, rendered in the Prometheus
+    text format.
+
+    Note that every process keeps its own registry: with several uWSGI workers, each
+    scrape of /metrics reflects the worker that happened to serve it.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+
+    def observe(self, name: str, value: float, **labels):
+        """Add `value` (seconds) to the histogram `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add `value` to the counter `name` with the given labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe_stages(self, timer: StageTimer, route: str):
+        """Add every stage of `timer`, and its total, to the stage histograms."""
+        for name, seconds in timer.stages:
+            self.observe(
+                "interview_stage_duration_seconds", seconds, route=route, stage=name
+            )
+        self.observe("interview_request_duration_seconds", timer.total(), route=route)
+        logging.info("Stage timings for '%s': %s", route, timer.as_ms())
+
+    def render_prometheus(self) -> str:
+        """Return all histograms and counters in the Prometheus text exposition format."""
+        with self._lock:
+            items = sorted(
+                (name, labels, list(h.counts), h.sum, h.count)
+                for (name, labels), h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+        lines, typed = [], set()
+        for name, labels, counts, total, count in items:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+# Shared registry of this process
+REGISTRY = MetricsRegistry()
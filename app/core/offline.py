@@ -0,0 +1,179 @@
+"""
+Offline stand-ins for the OpenAI API, used by the benchmarks and load tests.
+
+`FakeAsyncOpenAI` implements the subset of `openai.AsyncOpenAI` used by this
+application (Responses API, moderations, audio transcriptions, model lookups) with
+programmable latency, so the interview logic can be exercised without network
+access or token costs.
+"""
+
+import asyncio
+import math
+import random
+import re
+from types import SimpleNamespace
+from typing import Dict, Optional, Union
+
+from core.usage import estimate_tokens
+
+
+class LatencyModel(object):
+    """
+    Random latency (seconds) drawn from one of the following distributions:
+
+        constant:seconds=0.05
+        uniform:low=0.2,high=0.8
+        lognormal:median=0.8,sigma=0.4
+        bimodal:fast=0.6,slow=4,p_slow=0.05,sigma=0.3
+
+    `bimodal` mixes two lognormal modes, e.g. to reproduce occasional slow requests.
+    """
+
+    DEFAULTS = {
+        "constant": {"seconds": 0.0},
+        "uniform": {"low": 0.0, "high": 1.0},
+        "lognormal": {"median": 1.0, "sigma": 0.4},
+        "bimodal": {"fast": 0.6, "slow": 4.0, "p_slow": 0.05, "sigma": 0.3},
+    }
+
+    def __init__(self, kind: str = "constant", **params: float):
+        if kind not in self.DEFAULTS:
+            raise ValueError(
+                f"Unknown latency distribution '{kind}', use one of {list(self.DEFAULTS)}"
+            )
+        unknown = set(params) - set(self.DEFAULTS[kind])
+        if unknown:
+            raise ValueError(f"Unknown parameters {sorted(unknown)} for '{kind}'")
+        self.kind = kind
+        self.params = {**self.DEFAULTS[kind], **params}
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """Parse a specification such as `lognormal:median=0.8,sigma=0.4`."""
+        kind, _, args = spec.partition(":")
+        params = {}
+        for pair in filter(None, args.split(",")):
+            key, _, value = pair.partition("=")
+            params[key.strip()] = float(value)
+        return cls(kind.strip(), **params)
+
+    def sample(self, rng: random.Random = random) -> float:
+        p = self.params
+        if self.kind == "constant":
+            return p["seconds"]
+        if self.kind == "uniform":
+            return rng.uniform(p["low"], p["high"])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p["median"]), p["sigma"])
+        median = p["slow"] if rng.random() < p["p_slow"] else p["fast"]
+        return rng.lognormvariate(math.log(median), p["sigma"])
+
+    def __repr__(self) -> str:
+        args = ",".join(f"{k}={v:g}" for k, v in self.params.items())
+        return f"{self.kind}:{args}"
+
+
+class _Responses(object):
+    def __init__(self, fake: "FakeAsyncOpenAI"):
+        self.fake = fake
+
+    async def create(
+        self, *, model: str, input: str, max_output_tokens: int = 400, **_
+    ):
+        await self.fake._wait(model)
+        text = self.fake.reply
+        output_tokens = min(estimate_tokens(text), max_output_tokens)
+        return SimpleNamespace(
+            id=f"resp_offline_{self.fake._next_id()}",
+            model=model,
+            output_text=text,
+            usage=SimpleNamespace(
+                input_tokens=estimate_tokens(input),
+                output_tokens=output_tokens,
+                total_tokens=estimate_tokens(input) + output_tokens,
+                input_tokens_details=SimpleNamespace(cached_tokens=0),
+            ),
+        )
+
+
+class _Moderations(object):
+    def __init__(self, fake: "FakeAsyncOpenAI"):
+        self.fake = fake
+
+    async def create(self, *, model: str, input: str, **_):
+        await self.fake._wait(model)
+        flagged = bool(
+            self.fake.flag_pattern and re.search(self.fake.flag_pattern, input)
+        )
+        return SimpleNamespace(
+            id=f"modr_offline_{self.fake._next_id()}",
+            model=model,
+            results=[
+                SimpleNamespace(
+                    flagged=flagged,
+                    categories=SimpleNamespace(harassment=flagged, violence=False),
+                )
+            ],
+        )
+
+
+class _Transcriptions(object):
+    def __init__(self, fake: "FakeAsyncOpenAI"):
+        self.fake = fake
+
+    async def create(self, *, model: str, file, **_):
+        await self.fake._wait(model)
+        return SimpleNamespace(text=self.fake.transcription)
+
+
+class _Models(object):
+    def __init__(self, fake: "FakeAsyncOpenAI"):
+        self.fake = fake
+
+    async def retrieve(self, model: str):
+        return SimpleNamespace(id=model, object="model", owned_by="offline")
+
+
+class FakeAsyncOpenAI(object):
+    """
+    Drop-in replacement for `openai.AsyncOpenAI` that answers locally.
+
+    Args:
+        latency: (LatencyModel, spec str, or {model: LatencyModel}) latency per call;
+            use the key "*" for models without an entry
+        reply: (str) text returned by every Responses API call
+        transcription: (str) text returned by every transcription
+        flag_pattern: (str) regex of the inputs that moderation flags
+        seed: (int) seed for reproducible latency samples
+    """
+
+    def __init__(
+        self,
+        latency: Union[LatencyModel, str, Dict[str, LatencyModel], None] = None,
+        reply: str = "Thank you for sharing. Could you tell me a bit more about that?",
+        transcription: str = "I try to put some money aside every month.",
+        flag_pattern: Optional[str] = r"\[flag\]",
+        seed: Optional[int] = None,
+    ):
+        if isinstance(latency, str):
+            latency = LatencyModel.parse(latency)
+        if not isinstance(latency, dict):
+            latency = {"*": latency or LatencyModel()}
+        self.latency = latency
+        self.reply = reply
+        self.transcription = transcription
+        self.flag_pattern = flag_pattern
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.responses = _Responses(self)
+        self.moderations = _Moderations(self)
+        self.audio = SimpleNamespace(transcriptions=_Transcriptions(self))
+        self.models = _Models(self)
+
+    def _next_id(self) -> int:
+        self.calls += 1
+        return self.calls
+
+    async def _wait(self, model: str):
+        latency = self.latency.get(model) or self.latency.get("*") or LatencyModel()
+        await asyncio.sleep(latency.sample(self.rng))
@@ -0,0 +1,358 @@
+"""
+Hot-reloadable registry of the interview parameters (plans).
+
+The plans are read from a parameters module (`.py` defining INTERVIEW_PARAMETERS, by
+default `app/parameters.py`) or a JSON file, on disk or in S3 (`PARAMETERS_PATH`,
+e.g. `s3://bucket/parameters.json`). Every version (identified by a hash of the file)
+is compiled once: validated, with an index of the steps of every plan. The source is
+checked for changes at most every `PARAMETERS_POLL_S` seconds, with a `stat` for
+files and a `HeadObject` (ETag) for S3, and a new version replaces the current one
+atomically; requests in flight keep the version they started with. A version that
+fails to load or validate is logged and ignored.
+
+Sessions record the `plan_version` they began with, and continue with it. The last
+`PARAMETERS_VERSIONS` versions loaded by the process are kept in memory. Every version
+loaded is also saved under its hash (`PARAMETERS_VERSIONS_PATH`, a directory or an S3
+prefix; by default `versions/` next to an S3 source and `parameter_versions/` next to
+a file), from where other processes, and this one after a restart, load a version
+they do not hold. A session whose version cannot be loaded continues with the current
+one, which is logged as an error.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+# Seconds between checks of the source for a new version
+POLL_S = float(os.getenv("PARAMETERS_POLL_S", "5"))
+# Number of compiled versions kept in memory
+MAX_VERSIONS = int(os.getenv("PARAMETERS_VERSIONS", "8"))
+# Directory or S3 prefix of the saved versions (default: next to the source)
+VERSIONS_PATH = os.getenv("PARAMETERS_VERSIONS_PATH")
+
+
+class FileSource(object):
+    """Parameters file on disk; changes are detected by modification time and size."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def fingerprint(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class S3Source(object):
+    """Parameters object in S3; changes are detected by its ETag."""
+
+    def __init__(self, url: str):
+        import boto3
+
+        self.bucket, _, self.key = url[len("s3://") :].partition("/")
+        self.name = os.path.basename(self.key)
+        self.client = boto3.client("s3")
+
+    def fingerprint(self):
+        return self.client.head_object(Bucket=self.bucket, Key=self.key)["ETag"]
+
+    def read(self) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+        return response["Body"].read()
+
+
+class VersionStore(object):
+    """
+    Saved versions of the parameters: INTERVIEW_PARAMETERS of every version as JSON
+    (`<version>.json`, without the other contents of a parameters module, such as the
+    API key), in a directory or under an S3 prefix.
+
+    Args:
+        root: (str) directory, or `s3://bucket/prefix`
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip("/")
+        self.s3 = None
+        if self.root.startswith("s3://"):
+            import boto3
+
+            self.bucket, _, self.prefix = self.root[len("s3://") :].partition("/")
+            self.s3 = boto3.client("s3")
+
+    def save(self, version: str, raw: dict):
+        """Save a version (once: a version never changes)."""
+        data = json.dumps(raw).encode("utf-8")
+        if self.s3 is not None:
+            self.s3.put_object(Bucket=self.bucket, Key=self._key(version), Body=data)
+            return
+        path = os.path.join(self.root, f"{version}.json")
+        if os.path.isfile(path):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        # Written to a temporary file first, so that readers never see half a file
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, version: str) -> Optional[dict]:
+        """INTERVIEW_PARAMETERS of a saved version, or None if it was never saved."""
+        if self.s3 is not None:
+            try:
+                response = self.s3.get_object(
+                    Bucket=self.bucket, Key=self._key(version)
+                )
+            except self.s3.exceptions.NoSuchKey:
+                return None
+            return json.loads(response["Body"].read())
+        path = os.path.join(self.root, f"{version}.json")
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return json.load(f)
+
+    def _key(self, version: str) -> str:
+        return f"{self.prefix}/{version}.json" if self.prefix else f"{version}.json"
+
+
+def default_store(source: str) -> VersionStore:
+    """Store of PARAMETERS_VERSIONS_PATH, or else next to the parameters `source`."""
+    if VERSIONS_PATH:
+        return VersionStore(VERSIONS_PATH)
+    if source.startswith("s3://"):
+        return VersionStore(f"{source.rsplit('/', 1)[0]}/versions")
+    directory = os.path.dirname(os.path.abspath(source))
+    return VersionStore(os.path.join(directory, "parameter_versions"))
+
+
+def parse_parameters(data: bytes, name: str) -> dict:
+    """INTERVIEW_PARAMETERS of the contents of a JSON file or a parameters module."""
+    if name.endswith(".json"):
+        return json.loads(data)
+    namespace = {"__name__": "parameters", "__file__": name}
+    exec(compile(data, name, "exec"), namespace)
+    return namespace["INTERVIEW_PARAMETERS"]
+
+
+def compile_plans(raw: dict, version: str) -> Dict[str, dict]:
+    """
+    Validate the parameters of every interview and return copies with their
+    `plan_version` and an index of their steps by `question_name` (`_steps`, see
+    core.auxiliary.get_step_by_question_name). Raises ValueError if invalid.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("INTERVIEW_PARAMETERS must be a dict")
+    plans = {}
+    for interview_id, parameters in raw.items():
+        plan = parameters.get("interview_plan")
+        if not isinstance(plan, list):
+            raise ValueError(f"Interview '{interview_id}' has no interview_plan list")
+        steps = {}
+        for step in plan:
+            if step.get("fallback_regex"):
+                try:
+                    re.compile(step["fallback_regex"])
+                except re.error as e:
+                    raise ValueError(
+                        f"Invalid fallback_regex of '{interview_id}/"
+                        f"{step.get('question_name')}': {e}"
+                    ) from e
+            steps[step.get("question_name")] = step
+        pointers = [parameters.get("first_ai_question_name")]
+        pointers += [step.get("next_question") for step in plan]
+        for pointer in pointers:
+            if pointer is not None and pointer not in steps:
+                logging.warning(f"Interview '{interview_id}' has no step '{pointer}'")
+        plans[interview_id] = {**parameters, "plan_version": version, "_steps": steps}
+    return plans
+
+
+class ParameterRegistry(Mapping):
+    """
+    Interview parameters by interview_id, reloaded when their source changes.
+
+    Can be used wherever the INTERVIEW_PARAMETERS dict was used: `registry[id]` returns
+    the compiled parameters of the current version.
+
+    Args:
+        source: (str) path of a parameters module or JSON file, or an s3:// URL
+        poll_s: (float) seconds between checks of the source for changes
+        max_versions: (int) number of compiled versions kept in memory
+        store: (VersionStore) saved versions, by default `default_store(source)`
+    """
+
+    def __init__(
+        self,
+        source: str,
+        poll_s: float = POLL_S,
+        max_versions: int = MAX_VERSIONS,
+        store: Optional[VersionStore] = None,
+    ):
+        self.source = (
+            S3Source(source) if source.startswith("s3://") else FileSource(source)
+        )
+        self.store = store or default_store(source)
+        self.poll_s = poll_s
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()  # guards _versions
+        self._versions = OrderedDict()  # version -> compiled plans, least recent first
+        self._fingerprint = None
+        self._next_check = 0.0
+        self.version = None
+        self._plans = {}
+        # The first version must load; later ones are only logged if they fail
+        self._reload(self.source.fingerprint())
+
+    @property
+    def plans(self) -> Dict[str, dict]:
+        """Compiled parameters of the current version (checked for changes first)."""
+        if time.monotonic() >= self._next_check:
+            self.check()
+        return self._plans
+
+    def check(self):
+        """Load a new version if the source changed. Other threads are not blocked."""
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is checking; use the current version meanwhile
+        try:
+            self._next_check = time.monotonic() + self.poll_s
+            fingerprint = self.source.fingerprint()
+            if fingerprint != self._fingerprint:
+                self._reload(fingerprint)
+        except Exception as e:
+            logging.error(f"Keeping parameters version {self.version}: {e!r}")
+        finally:
+            self._lock.release()
+
+    def _reload(self, fingerprint):
+        data = self.source.read()
+        version = hashlib.sha256(data).hexdigest()[:12]
+        plans = self._cached(version)
+        if plans is None:
+            raw = parse_parameters(data, self.source.name)
+            plans = self._cache(version, compile_plans(raw, version))
+            logging.info(f"Loaded interview parameters version {version}")
+            try:
+                self.store.save(version, raw)
+            except Exception as e:
+                logging.error(
+                    f"Parameters version {version} was not saved to "
+                    f"'{self.store.root}' (set PARAMETERS_VERSIONS_PATH); other "
+                    f"processes cannot continue its sessions: {e!r}"
+                )
+        # Single assignments: readers see either the old or the new version
+        self._fingerprint = fingerprint
+        self._plans = plans
+        self.version = version
+
+    def for_version(self, interview_id: str, version: Optional[str]) -> dict:
+        """
+        Parameters of an interview in `version`: held in memory, or else loaded from
+        the saved versions. Falls back to the current version (logged as an error) if
+        `version` cannot be loaded or has no such interview.
+        """
+        if not version or version == self.version:
+            return self[interview_id]
+        plans = self._cached(version)
+        if plans is None:
+            plans = self._load_saved(version)
+        if plans is None or interview_id not in plans:
+            logging.error(
+                f"Parameters version {version} of interview '{interview_id}' is not "
+                f"available; the session continues with version {self.version}"
+            )
+            return self[interview_id]
+        return plans[interview_id]
+
+    def _load_saved(self, version: str) -> Optional[Dict[str, dict]]:
+        try:
+            raw = self.store.load(version)
+            if raw is None:
+                return None
+            plans = compile_plans(raw, version)
+        except Exception as e:
+            logging.error(f"Saved parameters version {version} failed to load: {e!r}")
+            return None
+        logging.info(f"Loaded saved interview parameters version {version}")
+        # Kept as a recent version; the current version is not changed
+        return self._cache(version, plans, current=False)
+
+    def _cached(self, version: str) -> Optional[Dict[str, dict]]:
+        with self._cache_lock:
+            plans = self._versions.get(version)
+            if plans is not None:
+                self._versions.move_to_end(version)
+            return plans
+
+    def _cache(
+        self, version: str, plans: Dict[str, dict], current: bool = True
+    ) -> Dict[str, dict]:
+        with self._cache_lock:
+            self._versions[version] = plans
+            if not current:
+                # Evicted before the current version, which must stay cached
+                self._versions.move_to_end(self.version, last=True)
+            while len(self._versions) > self.max_versions:
+                self._versions.popitem(last=False)
+        return plans
+
+    def __getitem__(self, interview_id: str) -> dict:
+        return self.plans[interview_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.plans)
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+
+def default_source() -> str:
+    """PARAMETERS_PATH, or else the file of the `parameters` module (app/parameters.py)."""
+    path = os.getenv("PARAMETERS_PATH")
+    if path:
+        return path
+    spec = importlib.util.find_spec("parameters")
+    if spec is None or not spec.origin:
+        raise ModuleNotFoundError("No parameters module; set PARAMETERS_PATH")
+    return spec.origin
+
+
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_registry() -> ParameterRegistry:
+    """Registry of the process, of `default_source()` (created on first use)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        with _DEFAULT_LOCK:
+            if _DEFAULT is None:
+                _DEFAULT = ParameterRegistry(default_source())
+    return _DEFAULT
+
+
+def plans_for_session(interview_parameters: Any, interview_id: str, session) -> dict:
+    """
+    Parameters of an interview for a stored session: the version the session began
+    with, if `interview_parameters` is a registry (see ParameterRegistry.for_version).
+    """
+    for_version = getattr(interview_parameters, "for_version", None)
+    if for_version is None:
+        return interview_parameters[interview_id]
+    state = session.get("state", {}) if isinstance(session, dict) else {}
+    return for_version(interview_id, state.get("plan_version"))
@@ -0,0 +1,169 @@
+"""
+Storage model of an interview session.
+
+A session is stored as one document
+
+    {"format": 2, "state": {...}, "turns": [{...}, {...}, ...]}
+
+where `state` holds the session-level variables (counters, summary, termination flag,
+pointer to the next question, ...) once, and every turn only holds its own fields
+(see `Turn`). Before format 2, sessions were stored as a list of messages that each
+repeated the complete state; such legacy sessions are still read, and are written
+back in the compact format on the next update.
+
+`to_rows` converts either format into the "long" rows of one message each that
+`retrieve_sessions` and the exports have always returned.
+
+This module has no dependencies, so that scripts outside of `app/` can import it.
+"""
+
+SESSION_FORMAT = 2
+
+# Fields that belong to a single message rather than to the session
+TURN_FIELDS = (
+    "order",
+    "time",
+    "type",
+    "content",
+    "question_name",
+    "open_ai_time",
+    "stage_ms",
+    "usage",
+)
+
+
+class Turn(object):
+    """
+    One message of an interview (a question of the interviewer or an answer).
+
+    Args:
+        order: (int) 1-based index of the message within the session
+        time: (int) Unix time at which the message was added
+        type: (str) "question" or "answer"
+        content: (str) text of the message
+        question_name: (str) pointer to the next step of the interview plan when the
+            message was stored
+        open_ai_time: (float) seconds taken by the LLM to generate a question
+        stage_ms: (dict) per-stage timings of the turn that generated a question
+        usage: (dict) tokens, model and cost of the LLM calls that generated a
+            question (see core.usage)
+    """
+
+    __slots__ = TURN_FIELDS
+
+    def __init__(
+        self,
+        order: int,
+        time: int,
+        type: str,
+        content: str,
+        question_name: str = None,
+        open_ai_time: float = None,
+        stage_ms: dict = None,
+        usage: dict = None,
+    ):
+        self.order = order
+        self.time = time
+        self.type = type
+        self.content = content
+        self.question_name = question_name
+        self.open_ai_time = open_ai_time
+        self.stage_ms = stage_ms
+        self.usage = usage
+
+    def get(self, key: str, default=None):
+        """Dict-style access, so turns can be used where messages used to be dicts."""
+        if key not in TURN_FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        if key not in TURN_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Turn) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Turn({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        """Stored representation (unset fields are left out)."""
+        out = {}
+        for key in TURN_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        return out
+
+    @classmethod
+    def from_dict(cls, message: dict) -> "Turn":
+        return cls(**{key: message.get(key) for key in TURN_FIELDS})
+
+
+def to_document(state: dict, turns: list, version: int = None) -> dict:
+    """
+    Return the stored document of a session. `version` (1 for the first write, then
+    increasing by one per write) lets the databases reject writes based on a stale
+    copy of the session.
+    """
+    document = {
+        "format": SESSION_FORMAT,
+        "state": dict(state),
+        "turns": [turn.to_dict() for turn in turns],
+    }
+    if version is not None:
+        document["version"] = version
+    return document
+
+
+def is_document(session) -> bool:
+    return isinstance(session, dict) and "turns" in session
+
+
+def version_of(session) -> int:
+    """Version of a stored session (0 if it does not exist or was never versioned)."""
+    if is_document(session):
+        return int(session.get("version") or 0)
+    return 0
+
+
+def from_document(session) -> tuple:
+    """
+    Return (state, turns) of a stored session in either format, or ({}, []) for a
+    session that does not exist.
+    """
+    if is_document(session):
+        return dict(session["state"]), [Turn.from_dict(t) for t in session["turns"]]
+    if not session:
+        return {}, []
+    # Legacy list of messages: the last message carries the latest state
+    state = {
+        key: value
+        for key, value in session[-1].items()
+        if key not in TURN_FIELDS or key == "question_name"
+    }
+    return state, [Turn.from_dict(message) for message in session]
+
+
+def has_ended(state: dict) -> bool:
+    """Whether the interview of a session state ended (last question or terminated)."""
+    return (
+        bool(state.get("terminated")) or state.get("question_name") == "last_question"
+    )
+
+
+def to_rows(session) -> list:
+    """
+    Return the "long" rows (one dict per message, with the session-level state
+    repeated) of a stored session in either format.
+
+    Rows of compact sessions repeat the latest session state; rows of legacy
+    sessions are returned as they were stored.
+    """
+    if not is_document(session):
+        return [dict(message) for message in session or []]
+    state = session["state"]
+    return [{**state, "open_ai_time": 0, **turn} for turn in session["turns"]]
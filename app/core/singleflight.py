@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+
+class _Call(object):
+    """A call in flight, awaited by the duplicates of the request that started it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls with the same key into one.
+
+    The first call of a key runs the function; calls with the same key that arrive while
+    it runs wait for it and get its result (or its exception). Results of calls made
+    with `cache=True` are kept for `ttl_s` seconds, so that late retries get the same
+    result back instead of running the function again. Exceptions are never kept.
+
+    Like the metrics registry, this is process-local: with several uWSGI workers or
+    Lambda containers, only duplicates reaching the same process are coalesced here.
+    Duplicates of /next reaching other processes are caught through the request
+    recorded in the session (see core.logic.stored_reply).
+    """
+
+    def __init__(self, ttl_s: float = 30.0, max_results: int = 10_000):
+        self.ttl_s = ttl_s
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self._results = OrderedDict()  # key -> (expiry, result), oldest first
+
+    def do(
+        self, key: Hashable, fn: Callable[[], Any], cache: bool = True
+    ) -> Tuple[Any, bool]:
+        """
+        Return (result of `fn`, whether it was shared with another call of `key`).
+        """
+        with self._lock:
+            self._expire()
+            if key in self._results:
+                return self._results[key][1], True
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            logging.info("Waiting for the call already in flight for %r", key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if cache and call.error is None and self.ttl_s > 0:
+                    self._results[key] = (time.monotonic() + self.ttl_s, call.result)
+                    while len(self._results) > self.max_results:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result, False
+
+    def _expire(self):
+        """Drop expired results (entries are ordered by expiry). Call under the lock."""
+        now = time.monotonic()
+        while self._results:
+            key, (expiry, _) = next(iter(self._results.items()))
+            if expiry > now:
+                break
+            del self._results[key]
@@ -0,0 +1,203 @@
+"""
+Running summary of an interview, generated off the critical path of `/next`.
+
+Interviews with `summary: True` keep a summary of the conversation in the session
+state (`summary`), which the prompt of every question includes (see
+core.auxiliary.fill_prompt_with_interview_v002). After a turn's response has been
+returned, a background job folds the turns added since the last summary (up to the
+order `summary_order`) into it with a cheap model (`summary_model`, by default
+gpt-4o-mini). In Flask, the job runs in a thread pool of the process; on Lambda, the
+function invokes itself asynchronously (route `summarise`).
+
+A turn whose stored session has turns that are not in the summary yet waits at most
+SUMMARY_WAIT_S seconds for the job of the previous turn, and otherwise uses the
+previous summary (see `wait_for_summary`); this holds whether the job runs in the
+same process or, on Lambda, in another container. Once the model replied, the job
+reloads the session and writes only the summary, `summary_order` and its token usage
+(added to `usage_total`), with the versioned writes of InterviewManager: turns and
+usage written in the meantime are kept (see InterviewManager._rebase).
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from core.asynchronous_call import CallPlan, openai_call
+from core.manager import InterviewManager
+from core.session import from_document
+from core.usage import TurnUsage, add_to_total, observe_usage
+
+# Longest wait of a turn for the summary job of the previous turn
+SUMMARY_WAIT_S = float(os.getenv("SUMMARY_WAIT_S", "0.5"))
+# Interval (seconds) at which a waiting turn reads the session, for jobs of other
+# processes
+SUMMARY_POLL_S = 0.1
+# Summary jobs running at the same time in a process
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+
+DEFAULT_SUMMARY_PROMPT = (
+    "You keep notes of a qualitative research interview. Update the summary below "
+    "with the new part of the conversation. Keep every fact the interviewee stated "
+    "about themselves, their views and their reasons, in their own terms, and drop "
+    "what the interviewer said unless it is needed to understand an answer. Answer "
+    "with the updated summary only, in at most 200 words."
+)
+
+
+def summary_prompt(previous: str, turns: list, instructions: str) -> str:
+    """Prompt that folds `turns` (Turns) into the `previous` summary."""
+    lines = [
+        f"{'Interviewer' if t.type == 'question' else 'Interviewee'}: \"{t.content}\""
+        for t in turns
+    ]
+    return "\n\n".join(
+        [
+            instructions,
+            f"Summary so far:\n{previous or '(none yet)'}",
+            "New part of the conversation:\n" + "\n".join(lines),
+        ]
+    )
+
+
+def update_summary(
+    session_id: str, db: Any, agent: Any, parameters: dict, history: Any = None
+) -> bool:
+    """
+    Fold the turns added since the last summary into the stored summary of a session.
+    Returns whether the summary was updated. If the model fails, or another job
+    summarised these turns meanwhile, the stored summary is kept; the usage of the
+    call is added to `usage_total` all the same.
+    """
+    manager = InterviewManager(db=db, session_id=session_id)
+    stored = history if history is not None else manager.load_session()
+    if not stored:
+        return False
+    state, history = from_document(stored)
+    turns = [t for t in history if (t.order or 0) > state.get("summary_order", 0)]
+    if not turns:
+        return False
+
+    prompt = summary_prompt(
+        state.get("summary", ""),
+        turns,
+        parameters.get("summary_prompt", DEFAULT_SUMMARY_PROMPT),
+    )
+    plan = CallPlan(
+        0.0,
+        parameters.get("summary_model", "gpt-4o-mini"),
+        parameters.get("summary_max_output_tokens", 400),
+        "none",
+        parameters.get("summary_timeout_s", 20.0),
+    )
+    usage = TurnUsage()
+    try:
+        text, response, _, _ = agent.run(
+            openai_call(agent.client, prompt, plan, stage="summary", usage=usage)
+        )
+    except Exception as e:
+        logging.warning(
+            f"Summary of session '{session_id}' failed; kept the last: {e!r}"
+        )
+        text, response = "", None
+    record = usage.to_record(
+        winner=response, prompt=prompt, prices=parameters.get("model_prices")
+    )
+    observe_usage(record, state.get("interview_id"))
+
+    # The next turn may have been written during the call: apply the changes of this
+    # job to the session as stored now
+    manager.resume_session(parameters=parameters)
+    state = manager.current_state
+    state["usage_total"] = add_to_total(
+        state.get("usage_total"), record, count="summaries"
+    )
+    updated = bool(text) and state.get("summary_order", 0) < turns[-1].order
+    if updated:
+        manager.update_summary(text)
+        state["summary_order"] = turns[-1].order
+    manager.update_session()
+    return updated
+
+
+def summary_pending(session: Any) -> bool:
+    """Whether a stored session has turns that are not in its summary yet."""
+    state, turns = from_document(session)
+    return bool(turns) and state.get("summary_order", 0) < (turns[-1].order or 0)
+
+
+def wait_for_summary(
+    session_id: str,
+    db: Any,
+    session: Any,
+    jobs: Optional["SummaryJobs"] = None,
+    timeout_s: float = SUMMARY_WAIT_S,
+) -> Any:
+    """
+    The stored session once the summary job of its last turn is done, or the latest
+    read of it after `timeout_s` seconds. A job of this process (in `jobs`) is waited
+    for; one of another process (e.g. the asynchronous invocations of the Lambda
+    function) by reading the session every SUMMARY_POLL_S seconds.
+    """
+    if jobs is not None and jobs.is_running(session_id):
+        if not jobs.wait(session_id, timeout_s):
+            return session
+        return db.load_remote_session(session_id)
+
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() + SUMMARY_POLL_S <= deadline:
+        time.sleep(SUMMARY_POLL_S)
+        session = db.load_remote_session(session_id)
+        if not summary_pending(session):
+            break
+    return session
+
+
+class SummaryJobs(object):
+    """
+    Background summary jobs of this process, at most one tracked per session.
+
+    Args:
+        workers: (int) number of jobs that run at the same time
+    """
+
+    def __init__(self, workers: int = SUMMARY_WORKERS):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="summary")
+        self.lock = threading.Lock()
+        self.running = {}  # session_id -> Future of its latest job
+
+    def submit(self, key: str, job: Callable, *args, **kwargs):
+        """Run `job(*args, **kwargs)` in the background for the session `key`."""
+        future = self.executor.submit(job, *args, **kwargs)
+        with self.lock:
+            self.running[key] = future
+
+        def done(finished):
+            if finished.exception() is not None:
+                logging.error("Summary job failed", exc_info=finished.exception())
+            with self.lock:
+                if self.running.get(key) is finished:
+                    del self.running[key]
+
+        future.add_done_callback(done)
+        return future
+
+    def is_running(self, session_id: str) -> bool:
+        """Whether a job of the session is running in this process."""
+        with self.lock:
+            return session_id in self.running
+
+    def wait(self, session_id: str, timeout_s: float = SUMMARY_WAIT_S) -> bool:
+        """Wait for the job of a session, if any; returns False if it is still running."""
+        with self.lock:
+            future: Optional[Any] = self.running.get(session_id)
+        if future is None:
+            return True
+        done, _ = wait([future], timeout=timeout_s)
+        return bool(done)
+
+
+def summary_enabled(parameters: Dict[str, Any]) -> bool:
+    return bool(parameters and parameters.get("summary"))
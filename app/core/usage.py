@@ -0,0 +1,207 @@
+"""
+Token usage and cost of the LLM calls of interview turns.
+
+Every attempt of a turn (primary, hedge, candidates) is collected in a `TurnUsage`
+and summarised as one usage record, stored on the question it produced:
+
+    {"model": ..., "input_tokens": ..., "cached_tokens": ..., "output_tokens": ...,
+     "cost_usd": ..., "attempts": 2, "hedged": True, "hedge_won": False,
+     "extra_cost_usd": ..., "budget_plan": False}
+
+`cost_usd` is the cost of the answer that was used; `extra_cost_usd` that of the other
+attempts, i.e. what hedging and candidates cost on top. Attempts that completed are
+priced from their reported usage. Cancelled attempts report none, so they are
+estimated: the same input tokens as the prompt, and output tokens in proportion to how
+long they ran compared with the answer that was used (the API bills tokens generated
+before a request is cancelled).
+
+Records are summed per session into the state field `usage_total`, and per interview
+into the counters of the metrics registry.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from core.metrics import REGISTRY
+
+# USD per million tokens: (input, cached input, output). Dated snapshots are priced
+# as the longest model name they start with; `model_prices` of the interview
+# parameters override or extend this table.
+MODEL_PRICES = {
+    "gpt-5.2": (1.75, 0.175, 14.0),
+    "gpt-5": (1.25, 0.125, 10.0),
+    "gpt-5-mini": (0.25, 0.025, 2.0),
+    "gpt-5-nano": (0.05, 0.005, 0.4),
+    "gpt-4.1-mini": (0.4, 0.1, 1.6),
+    "gpt-4o": (2.5, 1.25, 10.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+}
+
+# Step settings used once a session has exceeded `session_budget_usd` (see
+# `budget_step`); `budget_plan` of the interview parameters overrides them
+DEFAULT_BUDGET_PLAN = {"model": "gpt-4o-mini", "hedge": False, "candidates": 1}
+
+# Fields of a usage record summed into the session's `usage_total`
+TOTAL_FIELDS = (
+    "input_tokens",
+    "cached_tokens",
+    "output_tokens",
+    "cost_usd",
+    "extra_cost_usd",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def price_of(model: str, prices: Optional[dict] = None) -> Optional[tuple]:
+    """(input, cached input, output) USD per million tokens of `model`, if known."""
+    table = {**MODEL_PRICES, **(prices or {})}
+    matches = [name for name in table if model and model.startswith(name)]
+    if not matches:
+        return None
+    return tuple(table[max(matches, key=len)])
+
+
+def cost_usd(
+    model: str,
+    input_tokens: int,
+    cached_tokens: int,
+    output_tokens: int,
+    prices: Optional[dict] = None,
+) -> float:
+    """Cost of one call (0 for models without a price, with a warning)."""
+    price = price_of(model, prices)
+    if price is None:
+        logging.warning(f"No price for model '{model}'; its cost is counted as 0")
+        return 0.0
+    per_input, per_cached, per_output = price
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (
+        uncached * per_input + cached_tokens * per_cached + output_tokens * per_output
+    ) / 1e6
+
+
+def _tokens(response: Any) -> tuple:
+    """(input, cached input, output) tokens reported by a Responses API response."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "input_tokens_details", None)
+    return (
+        getattr(usage, "input_tokens", 0) or 0,
+        getattr(details, "cached_tokens", 0) or 0,
+        getattr(usage, "output_tokens", 0) or 0,
+    )
+
+
+class TurnUsage(object):
+    """Collector of the LLM attempts of one turn (see `core.asynchronous_call`)."""
+
+    def __init__(self):
+        self.attempts = []  # (model, stage, seconds, response or None if cancelled)
+
+    def record(self, model: str, stage: str, seconds: float, response: Any = None):
+        """Record an attempt that was sent; `response` is None if it did not complete."""
+        self.attempts.append((model, stage, seconds, response))
+
+    def to_record(
+        self,
+        winner: Any = None,
+        prompt: str = "",
+        prices: Optional[dict] = None,
+        budget_plan: bool = False,
+    ) -> Dict[str, Any]:
+        """Usage record of the turn; `winner` is the response whose answer was used."""
+        won = None
+        if winner is not None:
+            won = next((a for a in self.attempts if a[3] is winner), None)
+        if won is None:
+            model, seconds, tokens = None, 0.0, (estimate_tokens(prompt), 0, 0)
+        else:
+            model, _, seconds, _ = won
+            tokens = _tokens(winner)
+
+        extra = 0.0
+        for attempt in self.attempts:
+            if attempt is won:
+                continue
+            other_model, _, other_seconds, response = attempt
+            if response is not None:
+                other_tokens = _tokens(response)
+            else:
+                share = min(1.0, other_seconds / seconds) if seconds > 0 else 0.0
+                other_tokens = (tokens[0], 0, int(tokens[2] * share))
+            extra += cost_usd(other_model, *other_tokens, prices=prices)
+
+        stages = [attempt[1] for attempt in self.attempts]
+        return {
+            "model": model,
+            "input_tokens": tokens[0],
+            "cached_tokens": tokens[1],
+            "output_tokens": tokens[2],
+            "cost_usd": cost_usd(model, *tokens, prices=prices) if model else 0.0,
+            "attempts": len(self.attempts),
+            "hedged": "llm_hedge" in stages,
+            "hedge_won": won is not None and won[1] == "llm_hedge",
+            "extra_cost_usd": extra,
+            "budget_plan": budget_plan,
+        }
+
+
+def add_to_total(
+    total: Optional[dict], record: Dict[str, Any], count: str = "turns"
+) -> Dict[str, Any]:
+    """
+    Session totals (`usage_total`) with a usage record added. The record is counted
+    under `count`: "turns" for the questions of the interview, "summaries" for the
+    calls of the running summary (see core.summary), which are not turns.
+    """
+    total = dict(total or {})
+    total[count] = total.get(count, 0) + 1
+    for field in TOTAL_FIELDS:
+        total[field] = total.get(field, 0) + record[field]
+    total["hedges"] = total.get("hedges", 0) + int(record["hedged"])
+    total["hedge_wins"] = total.get("hedge_wins", 0) + int(record["hedge_won"])
+    return total
+
+
+def over_budget(parameters: dict, total: Optional[dict]) -> bool:
+    """Whether a session has spent its `session_budget_usd` (if the interview sets one)."""
+    budget = parameters.get("session_budget_usd")
+    if not budget or not total:
+        return False
+    return total.get("cost_usd", 0) + total.get("extra_cost_usd", 0) >= budget
+
+
+def budget_step(step: dict, parameters: dict) -> dict:
+    """A step with the cheaper settings of the interview's budget plan."""
+    return {**step, **DEFAULT_BUDGET_PLAN, **parameters.get("budget_plan", {})}
+
+
+def observe_usage(record: Dict[str, Any], interview_id: Optional[str]):
+    """Add a turn's usage record to the per-interview counters of the registry."""
+    interview_id = interview_id or "unknown"
+    for kind in ("input", "cached", "output"):
+        REGISTRY.inc(
+            "llm_tokens_total",
+            record[f"{kind}_tokens"],
+            interview_id=interview_id,
+            model=record["model"] or "none",
+            kind=kind,
+        )
+    REGISTRY.inc(
+        "llm_cost_usd_total",
+        record["cost_usd"],
+        interview_id=interview_id,
+        kind="answer",
+    )
+    REGISTRY.inc(
+        "llm_cost_usd_total",
+        record["extra_cost_usd"],
+        interview_id=interview_id,
+        kind="extra",
+    )
+    if record["hedged"]:
+        outcome = "won" if record["hedge_won"] else "lost"
+        REGISTRY.inc("llm_hedges_total", interview_id=interview_id, outcome=outcome)
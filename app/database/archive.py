@@ -0,0 +1,105 @@
+"""
+Cold archive of interview sessions.
+
+Sessions that ended some time ago are moved out of the sessions table by
+`aws_archive.py` into gzip-compressed JSON-lines files, one line per session
+({"session_id": ..., "session": ...}), partitioned by the UTC date of their last write:
+
+    <ARCHIVE_PATH>/date=<YYYY-MM-DD>/sessions-<epoch ms>.jsonl.gz
+
+`ARCHIVE_PATH` is a local directory or an S3 prefix (`s3://bucket/prefix`). The table
+keeps a small pointer item per archived session (its `archive` key, without the
+session), through which DynamoDB.load_remote_session reads it back.
+
+This module has no dependencies besides boto3 (for S3), so that scripts outside of
+`app/` can import it.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Decompressed archive files kept in memory, for reads of several of their sessions
+CACHED_FILES = 4
+
+
+class SessionArchive(object):
+    """
+    Archive files under a local directory or an S3 prefix.
+
+    Args:
+        root: (str) directory, or `s3://bucket/prefix`
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip("/")
+        self.s3 = None
+        if self.root.startswith("s3://"):
+            from boto3 import client
+
+            self.bucket, _, self.prefix = self.root[len("s3://") :].partition("/")
+            self.s3 = client("s3")
+        self._files = OrderedDict()  # key -> {session_id: session}
+        self._lock = threading.Lock()
+
+    def write(self, day: str, sessions: Iterable[Tuple[str, object]]) -> str:
+        """
+        Write (session_id, session) pairs to a new archive file of `day`
+        ("YYYY-MM-DD") and return its key, relative to the root.
+        """
+        key = f"date={day}/sessions-{int(time.time() * 1000)}.jsonl.gz"
+        lines = "".join(
+            json.dumps({"session_id": session_id, "session": session}) + "\n"
+            for session_id, session in sessions
+        )
+        body = gzip.compress(lines.encode("utf-8"))
+        if self.s3 is not None:
+            self.s3.put_object(Bucket=self.bucket, Key=self._s3_key(key), Body=body)
+        else:
+            path = os.path.join(self.root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first, so that readers never see half a file
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(body)
+            os.replace(f"{path}.tmp", path)
+        return key
+
+    def read(self, key: str) -> Iterator[Tuple[str, object]]:
+        """Yield the (session_id, session) pairs of an archive file."""
+        if self.s3 is not None:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self._s3_key(key))
+            body = response["Body"].read()
+        else:
+            with open(os.path.join(self.root, key), "rb") as f:
+                body = f.read()
+        for line in gzip.decompress(body).decode("utf-8").splitlines():
+            if line:
+                record = json.loads(line)
+                yield record["session_id"], record["session"]
+
+    def load(self, key: str, session_id: str) -> Optional[object]:
+        """Return one archived session (None if the file does not contain it)."""
+        with self._lock:
+            sessions = self._files.get(key)
+            if sessions is not None:
+                self._files.move_to_end(key)
+        if sessions is None:
+            sessions = dict(self.read(key))
+            with self._lock:
+                self._files[key] = sessions
+                while len(self._files) > CACHED_FILES:
+                    self._files.popitem(last=False)
+        return sessions.get(session_id)
+
+    def _s3_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+
+def connect_to_archive() -> Optional[SessionArchive]:
+    """Archive at ARCHIVE_PATH, or None if it is not set."""
+    root = os.getenv("ARCHIVE_PATH")
+    return SessionArchive(root) if root else None
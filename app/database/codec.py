@@ -0,0 +1,102 @@
+"""
+Conversion between DynamoDB attribute values and native Python values.
+
+boto3 returns every number as `Decimal` and rejects `float` on writes. Sessions read
+from DynamoDB are decoded here in one pass, with each field converted to the type
+given by `FIELD_TYPES`. Sessions are encoded (float -> Decimal) right before they
+are written. Sessions stored as compressed binaries (see database.encoding) are
+decoded from their JSON, which needs no conversion.
+
+This module has no dependencies, so that scripts outside of `app/` can import it.
+"""
+
+from decimal import Decimal
+
+from .encoding import decode_payload, is_encoded
+
+# Type of the numeric fields of a session (state, turns and legacy messages)
+FIELD_TYPES = {
+    "format": int,
+    "version": int,
+    "order": int,
+    "time": int,
+    "topic_idx": int,
+    "question_idx": int,
+    "finish_idx": int,
+    "flagged_messages": int,
+    "open_ai_time": float,
+}
+
+
+def _number(value: Decimal):
+    """Fallback for numeric fields without a schema entry."""
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+class PageDecoder(object):
+    """
+    Decoder for one page of items. Converted numbers are memoised per field: most of
+    them (counters, indices, orders) repeat across the messages of a page, and a
+    lookup is several times cheaper than converting a Decimal.
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def number(self, key: str, value: Decimal):
+        cached = self.cache.get((key, value))
+        if cached is None:
+            cached = self.cache[(key, value)] = FIELD_TYPES.get(key, _number)(value)
+        return cached
+
+    def message(self, message: dict) -> dict:
+        """Return a copy of a message (or any map) with native numbers."""
+        out = dict(message)
+        for key, value in message.items():
+            kind = type(value)
+            if kind is Decimal:
+                out[key] = self.number(key, value)
+            elif kind is dict:
+                out[key] = self.message(value)
+            elif kind is list:
+                out[key] = [self.message(v) if type(v) is dict else v for v in value]
+        return out
+
+    def session(self, session):
+        """Decode a stored session: a document (see core.session) or a legacy list."""
+        if is_encoded(session):
+            return decode_payload(session)
+        if isinstance(session, list):
+            return [self.message(message) for message in session]
+        return self.message(session)
+
+
+def decode_session(session):
+    """Decode a single stored session."""
+    return PageDecoder().session(session)
+
+
+def decode_items(items: list) -> list:
+    """Decode a page of table items ({"session_id", "session", ...}) in one pass."""
+    decoder = PageDecoder()
+    return [
+        {**item, "session": decoder.session(item["session"])}
+        for item in items
+        if "session" in item
+    ]
+
+
+def _encode_value(value):
+    kind = type(value)
+    if kind is float:
+        return Decimal(repr(value))
+    if kind is dict:
+        return {k: _encode_value(v) for k, v in value.items()}
+    if kind is list:
+        return [_encode_value(v) for v in value]
+    return value
+
+
+def encode_session(session):
+    """Return a copy of a session that boto3 can write (floats become Decimals)."""
+    return _encode_value(session)
@@ -1,7 +1,13 @@
-from boto3 import resource
-from decimal import Decimal
+from datetime import datetime, timezone
 import logging
 import os
+import time
+
+from core.session import to_rows, version_of
+from database.archive import connect_to_archive
+from database.codec import decode_items, decode_session, encode_session
+from database.encoding import encode_payload, session_encoding
+from database.errors import SessionConflictError
 
 
 def connect_to_database():  # TODO This is a terrible implementation! We should aim to change it!
@@ -11,38 +17,130 @@ def connect_to_database():  # TODO This is a terrible implementation! We should
         from database.dynamo import DynamoDB
 
         return DynamoDB(os.environ["DYNAMO_TABLE"])
+    if os.getenv("DATABASE") == "MEMORY":
+        # For offline benchmarks and load tests, nothing is persisted
+        from database.memory import InMemoryDB
+
+        return InMemoryDB()
     from database.file import FileWriter
 
     return FileWriter()
 
 
+# Index of sessions by time of their last write, see aws_setup.sh
+UPDATED_INDEX = "updated-index"
+# Days after its last write that DynamoDB deletes a session (TTL attribute
+# `expires_at`, see aws_setup.sh). Off by default (0): sessions are research data and
+# only expire if a study opts in, after archiving ended sessions with aws_archive.py.
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "0"))
+
+
+def updated_day(updated_at: int) -> str:
+    """UTC date ("YYYY-MM-DD") of a write time in epoch milliseconds."""
+    return datetime.fromtimestamp(updated_at / 1000, tz=timezone.utc).strftime(
+        "%Y-%m-%d"
+    )
+
+
 class DynamoDB(object):
 
     def __init__(self, table_name: str):
         """
         Initialize the Dynamo database table.
         """
+        # Imported lazily: boto3 is only needed once a table is actually used
+        from boto3 import resource
+
         self.table = resource("dynamodb").Table(table_name)
+        # Archive of ended sessions (ARCHIVE_PATH), see database.archive
+        self.archive = connect_to_archive()
+        # Encoding of written sessions (SESSION_ENCODING), see database.encoding
+        self.encoding = session_encoding()
+
+    def ping(self):
+        """Cheap metadata call (DescribeTable) to open and verify the connection."""
+        # Not `table.table_status`: the resource caches it after the first load, so
+        # later calls would not reach DynamoDB
+        response = self.table.meta.client.describe_table(TableName=self.table.name)
+        return response["Table"]["TableStatus"]
 
-    def load_remote_session(self, session_id: str) -> list:
-        """Retrieve the interview session data from the database."""
+    def load_remote_session(self, session_id: str):
+        """
+        Retrieve the interview session data (see core.session) from the database, or
+        from the archive for a session that was archived (see aws_archive.py).
+        """
         result = self.table.get_item(Key={"session_id": session_id})
-        if result.get("Item"):
-            return result["Item"]["session"]
-        return {}
+        item = result.get("Item")
+        if not item:
+            return {}
+        if "session" not in item:
+            return self._load_archived(item) or {}
+        return decode_session(item["session"])
+
+    def _load_archived(self, pointer: dict):
+        """Session of a pointer item ({"session_id", "archive", ...}) in the archive."""
+        if self.archive is None:
+            logging.warning(
+                f"Session '{pointer['session_id']}' is archived, but ARCHIVE_PATH is not set"
+            )
+            return None
+        return self.archive.load(pointer["archive"], pointer["session_id"])
 
     def delete_remote_session(self, session_id: str):
         """Delete session data from the database."""
         self.table.delete_item(Key={"session_id": session_id})
 
-    def update_remote_session(self, session_id: str, session: list):
-        """Update or insert session data in the database."""
-        self.table.put_item(Item={"session_id": session_id, "session": session})
+    def update_remote_session(self, session_id: str, session: dict):
+        """
+        Update or insert session data in the database.
+        The time of the write is recorded as `updated_at` (epoch ms) and `updated_day`
+        (UTC date), the keys of the index used by incremental exports (aws_retrieve.py),
+        and, if SESSION_TTL_DAYS is set, the session expires that many days later
+        (`expires_at`, epoch seconds).
+
+        With SESSION_ENCODING set, the session is stored as a compressed binary (see
+        database.encoding); sessions are decoded from either form on reads.
+
+        Versioned sessions (see core.session.to_document) are written only if the
+        stored version is the one before, so that concurrent requests cannot overwrite
+        each other's turns; otherwise SessionConflictError is raised.
+        """
+        updated_at = int(time.time() * 1000)
+        item = {
+            "session_id": session_id,
+            "session": (
+                encode_session(session)
+                if self.encoding == "json"
+                else encode_payload(session, self.encoding)
+            ),
+            "updated_at": updated_at,
+            "updated_day": updated_day(updated_at),
+        }
+        if SESSION_TTL_DAYS > 0:
+            item["expires_at"] = updated_at // 1000 + int(SESSION_TTL_DAYS * 86400)
+        version = version_of(session)
+        if not version:
+            self.table.put_item(Item=item)
+            return
+
+        item["version"] = version
+        if version == 1:  # New session, or one stored before versioning
+            condition = {"ConditionExpression": "attribute_not_exists(version)"}
+        else:
+            condition = {
+                "ConditionExpression": "version = :expected",
+                "ExpressionAttributeValues": {":expected": version - 1},
+            }
+        try:
+            self.table.put_item(Item=item, **condition)
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise SessionConflictError(session_id, version)
 
     def retrieve_sessions(self, sessions: list = None) -> list:
         """
         Retrieve chat history (list of dicts) for specified sessions
         or *all* sessions if no sessions specified in optional argument.
+        Archived sessions are read from the archive, one archive file at a time.
 
         Returns
             all_interview_chats: (list) of "long" form data, e.g.
@@ -53,6 +151,7 @@ class DynamoDB(object):
                 ]
         """
         all_interview_chats = []
+        archived = {}  # archive key -> ids of its sessions
         last_eval = None
         while True:
             # Handle multiple chunks with contiguous scan
@@ -61,27 +160,27 @@ class DynamoDB(object):
                 if last_eval
                 else self.table.scan()
             )
-            for item in resp.get("Items", []):
-                # Skip keys not specified
-                if sessions and not item["session_id"] in sessions:
-                    continue
-                # Get JSON serializable data
-                session_messages = [
-                    dict(
-                        map(
-                            lambda x: (
-                                (x[0], int(x[1])) if isinstance(x[1], Decimal) else x
-                            ),
-                            message.items(),
-                        )
-                    )
-                    for message in item["session"]
-                ]
+            items = resp.get("Items", [])
+            # Skip keys not specified
+            if sessions:
+                items = [item for item in items if item["session_id"] in sessions]
+            for item in items:
+                if "session" not in item and "archive" in item:
+                    archived.setdefault(item["archive"], []).append(item["session_id"])
+            # Get JSON serializable data, one page at a time
+            for item in decode_items(items):
                 # Add all messages in current interview session
-                all_interview_chats.extend(session_messages)
+                all_interview_chats.extend(to_rows(item["session"]))
 
             if not resp.get("LastEvaluatedKey"):
                 break
             last_eval = resp["LastEvaluatedKey"]
 
+        for key, session_ids in archived.items():
+            if self.archive is None:
+                logging.warning(f"{len(session_ids)} sessions are archived in '{key}'")
+                continue
+            for session_id in session_ids:
+                all_interview_chats.extend(to_rows(self.archive.load(key, session_id)))
+
         return all_interview_chats
@@ -0,0 +1,98 @@
+"""
+Optional compressed encoding of stored sessions.
+
+With `SESSION_ENCODING=zlib` (or `zstd`, which requires the `zstandard` package),
+sessions are stored as one binary value instead of a DynamoDB map or a JSON file:
+
+    b"MIS" | format version (1 byte) | codec (1 byte) | compressed compact JSON
+
+A long session then costs a fraction of the write capacity on every rewrite and stays
+far below the 400 KB item limit. Reads recognise the header and decode transparently,
+so tables and directories can hold both encodings; unset (`json`), sessions are
+stored as before. See storage_report.py for the savings on existing sessions.
+
+This module has no required dependencies, so that scripts outside of `app/` can
+import it.
+"""
+
+import json
+import os
+import zlib
+from decimal import Decimal
+
+MAGIC = b"MIS"
+FORMAT_VERSION = 1
+# Codec byte of the header
+CODECS = {"zlib": 1, "zstd": 2}
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def session_encoding() -> str:
+    """Encoding of written sessions: "json" (default), "zlib" or "zstd"."""
+    encoding = os.getenv("SESSION_ENCODING", "json").lower()
+    if encoding != "json" and encoding not in CODECS:
+        raise ValueError(f"Unsupported SESSION_ENCODING '{encoding}'")
+    return encoding
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "SESSION_ENCODING=zstd requires zstandard: `pip install zstandard`"
+        ) from e
+    return zstandard
+
+
+def _number(obj):
+    """JSON fallback for Decimal values (sessions read from DynamoDB maps)."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def compact_json(session) -> bytes:
+    return json.dumps(session, separators=(",", ":"), default=_number).encode("utf-8")
+
+
+def encode_payload(session, encoding: str) -> bytes:
+    """Binary value (header and compressed JSON) of a session."""
+    data = compact_json(session)
+    if encoding == "zlib":
+        body = zlib.compress(data, ZLIB_LEVEL)
+    elif encoding == "zstd":
+        body = _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        raise ValueError(f"Unsupported encoding '{encoding}'")
+    return MAGIC + bytes((FORMAT_VERSION, CODECS[encoding])) + body
+
+
+def _bytes(value):
+    """Bytes of a binary value (boto3 returns DynamoDB binaries as `Binary`)."""
+    value = getattr(value, "value", value)
+    return bytes(value) if isinstance(value, (bytes, bytearray, memoryview)) else None
+
+
+def is_encoded(value) -> bool:
+    data = _bytes(value)
+    return data is not None and data[: len(MAGIC)] == MAGIC
+
+
+def decode_payload(value):
+    """Session of a binary value written by `encode_payload`."""
+    data = _bytes(value)
+    if data is None or data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not an encoded session")
+    version, codec = data[len(MAGIC)], data[len(MAGIC) + 1]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported session format version {version}")
+    body = data[len(MAGIC) + 2 :]
+    if codec == CODECS["zlib"]:
+        data = zlib.decompress(body)
+    elif codec == CODECS["zstd"]:
+        data = _zstd().ZstdDecompressor().decompress(body)
+    else:
+        raise ValueError(f"Unsupported session codec {codec}")
+    return json.loads(data)
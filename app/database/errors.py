@@ -0,0 +1,20 @@
+class SessionConflictError(Exception):
+    """
+    A session write was rejected because the stored session changed since it was read:
+    its version is not the one the write was based on (see core.session.to_document).
+    """
+
+    def __init__(self, session_id: str, version: int):
+        super().__init__(
+            f"Session '{session_id}' was updated concurrently (write of version {version})"
+        )
+        self.session_id = session_id
+        self.version = version
+
+
+class TurnConflictError(SessionConflictError):
+    """
+    A session write that adds turns was rejected because another request added turns
+    to the same version of the session: both answered the same question, and the
+    turns of this request were discarded (see InterviewManager._rebase).
+    """
@@ -1,14 +1,27 @@
 import logging
 import os
 import json
+import threading
+from decimal import Decimal
+from core.session import is_document, to_rows, version_of
+from database.encoding import decode_payload, encode_payload, is_encoded, session_encoding
+from database.errors import SessionConflictError
 
 # By default, will save interview data to app/data
 DATA_DIR = os.getenv("DATA_DIR", "./app/data")
+# Serialises the version check and write of sessions within this process
+_WRITE_LOCK = threading.Lock()
 
 class FileWriter(object):
     def __init__(self) :
         if not os.path.isdir(DATA_DIR): os.makedirs(DATA_DIR)
         logging.info(f"Will write interviews to '{DATA_DIR}'.")
+        # Encoding of written sessions (SESSION_ENCODING), see database.encoding
+        self.encoding = session_encoding()
+
+    def ping(self):
+        """ Verify that the data directory is reachable. """
+        return os.path.isdir(DATA_DIR)
 
     def load_remote_session(self, session_id:str) -> dict:
         """ Retrieve the interview session data from the 'database'. """
@@ -16,22 +29,41 @@ class FileWriter(object):
         if not os.path.isfile(filepath):
             logging.warning(f"Can't load session '{session_id}': not started!")
             return {}
-        with open(filepath, 'r') as f:
-            session = json.load(f) 
-        return session
+        return _load(filepath)
 
     def delete_remote_session(self, session_id:str):
         """ Delete session data from the 'database'. """
         os.remove(os.path.join(DATA_DIR, f"{session_id}.json"))
         logging.info(f"Session '{session_id}' deleted!")
 
-    def update_remote_session(self, session_id:str, session:list):
-        """ Update or insert session data in the 'database'. """
-        assert 'session_id' in session[-1] and session[-1]['session_id'] == session_id
-        with open(os.path.join(DATA_DIR, f"{session_id}.json"), 'w') as f:
-            json.dump(session, f)
+    def update_remote_session(self, session_id:str, session:dict):
+        """ 
+        Update or insert session data in the 'database'. Versioned sessions are only
+        written over the version before (see DynamoDB.update_remote_session); the check
+        holds within one process. With SESSION_ENCODING set, the file holds the
+        compressed binary of the session instead of its JSON (see database.encoding).
+        """
+        state = session['state'] if is_document(session) else session[-1]
+        assert state.get('session_id') == session_id
+        filepath = os.path.join(DATA_DIR, f"{session_id}.json")
+        version = version_of(session)
+        with _WRITE_LOCK:
+            if version and version_of(self._read(filepath)) != version - 1:
+                raise SessionConflictError(session_id, version)
+            # Written to a temporary file first, so that readers never see half a session
+            if self.encoding == 'json':
+                with open(f"{filepath}.tmp", 'w') as f:
+                    json.dump(session, f, default=_decimal_to_number)
+            else:
+                with open(f"{filepath}.tmp", 'wb') as f:
+                    f.write(encode_payload(session, self.encoding))
+            os.replace(f"{filepath}.tmp", filepath)
         logging.info(f"Session '{session_id}' updated!")
 
+    def _read(self, filepath:str):
+        if not os.path.isfile(filepath): return {}
+        return _load(filepath)
+
     def retrieve_sessions(self, sessions:list=None) -> list:
         """ 
         Retrieve chat history (list of dicts) for specified sessions
@@ -48,12 +80,24 @@ class FileWriter(object):
         chats = []
         for session_file in os.listdir(DATA_DIR):
             if not session_file.endswith('.json'): continue
-            if sessions and not os.splitext(session_file)[0] in sessions: continue
-            filepath = os.path.join(DATA_DIR, session_file)
-            with open(filepath, 'r') as f:
-                session = json.load(f) 
+            if sessions and not os.path.splitext(session_file)[0] in sessions: continue
+            session = _load(os.path.join(DATA_DIR, session_file))
             # Add all messages in current interview session
-            chats.extend(session)
+            chats.extend(to_rows(session))
 
         logging.info(f"Retrieved {len(chats)} messages!")
         return chats
+
+
+def _load(filepath:str):
+    """ Session of a file, stored as JSON or as a compressed binary. """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    return decode_payload(data) if is_encoded(data) else json.loads(data)
+
+
+def _decimal_to_number(obj):
+    """ JSON fallback for Decimal values (e.g. timings set by the interview manager). """
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,65 @@
+import logging
+import threading
+
+from core.session import is_document, to_rows, version_of
+from database.errors import SessionConflictError
+
+
+class InMemoryDB(object):
+    """
+    Process-local 'database' keeping sessions in a dict.
+    Used for offline benchmarks and load tests (DATABASE=MEMORY); nothing is persisted.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def ping(self):
+        """Nothing to connect to."""
+        return True
+
+    def load_remote_session(self, session_id: str):
+        """Retrieve a copy of the interview session data."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return {}
+        return _copy(session)
+
+    def delete_remote_session(self, session_id: str):
+        """Delete session data."""
+        self.sessions.pop(session_id, None)
+        logging.info(f"Session '{session_id}' deleted!")
+
+    def update_remote_session(self, session_id: str, session: dict):
+        """
+        Update or insert session data (stored as a copy). Versioned sessions are
+        only written over the version before (see DynamoDB.update_remote_session).
+        """
+        # Documents are built afresh for every write (see core.session.to_document)
+        stored = session if is_document(session) else _copy(session)
+        version = version_of(session)
+        with self.lock:
+            if version and version_of(self.sessions.get(session_id)) != version - 1:
+                raise SessionConflictError(session_id, version)
+            self.sessions[session_id] = stored
+
+    def retrieve_sessions(self, sessions: list = None) -> list:
+        """Return the "long" form messages of specified or all sessions."""
+        chats = []
+        for session_id, session in self.sessions.items():
+            if sessions and session_id not in sessions:
+                continue
+            chats.extend(to_rows(session))
+        return chats
+
+
+def _copy(session):
+    """Copy of a stored session, deep enough that callers cannot alter the store."""
+    if is_document(session):
+        return {
+            **session,
+            "state": dict(session["state"]),
+            "turns": [dict(turn) for turn in session["turns"]],
+        }
+    return [dict(message) for message in session]
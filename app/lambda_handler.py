@@ -2,12 +2,17 @@
 You can delete this file if you are deploying the AI interviewer application on your own dedicated server."""
 
 import json
-from core.logic import next_question, transcribe
-from core.manager import InterviewManager
-from core.agent import LLMAgent
-from database.dynamo import DynamoDB, connect_to_database
-from parameters import INTERVIEW_PARAMETERS, OPENAI_API_KEY
-from openai import OpenAI, AsyncOpenAI
+import logging
+import os
+import time
+from base64 import b64decode, b64encode
+from core.compression import encode_json
+from core.metrics import REGISTRY, StageTimer
+
+# Only lightweight modules are imported at module load. The OpenAI SDK, boto3 and the
+# interview logic are imported on first use by the route that needs them, so that
+# cold starts (and routes such as `retrieve`) do not pay for unused dependencies.
+# Measure the effect of changes here with `python benchmarks/cold_start.py`.
 
 
 # ------------ Global Variables Initiated on Cold Start -------------#
@@ -16,17 +21,78 @@ CORS_HEADERS = {
     "Access-Control-Allow-Headers": "*",
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "OPTIONS,POST",
+    "Access-Control-Expose-Headers": "Server-Timing",
+    "Timing-Allow-Origin": "*",
     "Content-Type": "application/json",
 }
 
 
-def _resp(status: int, body: dict) -> dict:
-    return {"statusCode": status, "headers": CORS_HEADERS, "body": json.dumps(body)}
+def _resp(
+    status: int, body: dict, headers: dict = None, accept_encoding: str = None
+) -> dict:
+    """
+    API Gateway response. Bodies of at least COMPRESS_MIN_BYTES are compressed with an
+    encoding the client accepts (see core.compression) and returned base64-encoded,
+    which API Gateway decodes into binary (see BinaryMediaTypes in template.yaml).
+    """
+    encoding, data = encode_json(body, accept_encoding)
+    if encoding is None:
+        return {
+            "statusCode": status,
+            "headers": {**CORS_HEADERS, **(headers or {})},
+            "body": data.decode("utf-8"),
+        }
+    return {
+        "statusCode": status,
+        "headers": {
+            **CORS_HEADERS,
+            **(headers or {}),
+            "Content-Encoding": encoding,
+            "Vary": "Accept-Encoding",
+        },
+        "body": b64encode(data).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+
+_db = None
+_agent = None
+_lambda_client = None
+_container_started = time.time()
+_invocations = 0
+
+
+def get_db():
+    """Return the database connection, creating it on first use."""
+    global _db
+    if _db is None:
+        from database.dynamo import connect_to_database
 
+        _db = connect_to_database()
+    return _db
 
-db = connect_to_database()
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=45, max_retries=3)
-agent = LLMAgent(openai_client=openai_client)
+
+def get_agent():
+    """Return the LLM agent, creating the OpenAI client on first use."""
+    global _agent
+    if _agent is None:
+        from core.agent import connect_to_llm
+
+        _agent = connect_to_llm()
+    return _agent
+
+
+def get_interview_parameters():
+    """Return the registry of interview parameters (loaded on first use)."""
+    from core.registry import default_registry
+
+    return default_registry()
+
+
+# Provisioned concurrency / SnapStart: construct clients during the init phase instead
+if os.getenv("LAMBDA_EAGER_INIT"):
+    get_db()
+    get_agent()
 
 
 # ------------ Lambda Handler -------------#
@@ -45,7 +111,7 @@ def handler(event, context):
 
         https://u94z55rxvt.execute-api.eu-north-1.amazonaws.com/Prod/
 
-    The lambda function has three main routes (next, transcribe, and retrieve) that can be accessed via POST requests.
+    The lambda function has five main routes (next, transcribe, transcribe_next, retrieve, and warm) that can be accessed via POST requests.
 
     We describe each route below, including how they can be accessed programmatically. If you use our recommendation
     to integrate the AI interviewer into a Qualtrics survey, you can use the HTML and JavaScript code
@@ -55,6 +121,9 @@ def handler(event, context):
     NEXT:
         This route returns the next question in the interview if the interview has already started.
         To start an interview, make a request to this route with an empty user message to receive the first question for the interviewee.
+        An optional "request_id" identifies the answer: repeated requests with the same request_id (client retries, double
+        clicks) do not generate another question, but wait for and return the response of the first one, also when they
+        reach another container (the request and its reply are recorded in the session).
 
         Example request via Python's requests package:
             ```
@@ -63,7 +132,8 @@ def handler(event, context):
                 "payload": {
                     "session_id": "847918419",
                     "interview_id": "STOCK_MARKET",
-                    "user_message": "I don't like risky investments"
+                    "user_message": "I don't like risky investments",
+                    "request_id": "3f2b9c1e"
                 }
             }
             response = requests.post(https://u94z55rxvt.execute-api.eu-north-1.amazonaws.com/Prod/, json=body)
@@ -76,7 +146,8 @@ def handler(event, context):
                 payload: {
                     session_id: "847918419",
                     interview_id: "STOCK_MARKET",
-                    user_message: "I don't like risky investments"
+                    user_message: "I don't like risky investments",
+                    request_id: "3f2b9c1e"
                 }
             };
             fetch('https://u94z55rxvt.execute-api.eu-north-1.amazonaws.com/Prod/', {
@@ -116,8 +187,48 @@ def handler(event, context):
             });
             ```
 
+    WARM:
+        This route pre-warms a container before a survey wave without creating sessions or spending tokens.
+        It initialises the DynamoDB and OpenAI clients, opens their connections with a metadata call each and
+        returns timing diagnostics. Set "hold_s" (max. 10 seconds) to keep the container busy, so that parallel
+        warm requests are spread over distinct containers (see `aws_warm.py`).
+
+        Example request via Python's requests package:
+            ```
+            body = {
+                "route": "warm",
+                "payload": {"hold_s": 2}
+            }
+            response = requests.post(https://u94z55rxvt.execute-api.eu-north-1.amazonaws.com/Prod/, json=body)
+            # response.json() == {"cold_start": true, "container_age_s": 0.4, "invocations": 1,
+            #                     "timings_ms": {"db_init_ms": ..., "llm_init_ms": ..., "db_ping_ms": ..., "llm_ping_ms": ...},
+            #                     "errors": {}}
+            ```
+
+    TRANSCRIBE_NEXT:
+        This route combines TRANSCRIBE and NEXT for spoken answers: the audio is transcribed and the transcription
+        is processed as the user message in a single request. It returns both the transcription and the next question.
+        An optional "request_id" works as for NEXT.
+
+        Example request via Python's requests package:
+            ```
+            body = {
+                "route": "transcribe_next",
+                "payload": {
+                    "session_id": "847918419",
+                    "interview_id": "STOCK_MARKET",
+                    "audio": "base64_encoded_audio_string",
+                    "request_id": "3f2b9c1e"
+                }
+            }
+            response = requests.post(https://u94z55rxvt.execute-api.eu-north-1.amazonaws.com/Prod/, json=body)
+            # response.json() == {"session_id": "847918419", "transcription": "...", "message": "..."}
+            ```
+
     RETRIEVE:
         This route retrieves all stored interviews from the DynamoDB database.
+        Responses of at least COMPRESS_MIN_BYTES (default 1024) bytes are compressed with gzip (or brotli, if installed)
+        when the request accepts it ("Accept-Encoding"); browsers and the requests package decompress them transparently.
 
         Example request via Python's requests package:
             ```
@@ -141,33 +252,55 @@ def handler(event, context):
                 dataType: 'json'
             });
             ```
+
+    SUMMARISE:
+        Internal route that updates the running summary of a session (see core/summary.py). For interviews with
+        "summary" set, the function invokes itself asynchronously with this route after each NEXT and
+        TRANSCRIBE_NEXT request; the next of these waits for it at most SUMMARY_WAIT_S seconds, reading the
+        session. It is not reachable through the public endpoint.
     """
 
     try:
-        req = json.loads(event.get("body", "{}"))
+        body = event.get("body") or "{}"
+        if event.get("isBase64Encoded"):
+            # Request bodies are base64-encoded too, as all media types are binary
+            body = b64decode(body)
+        req = json.loads(body)
         route = req.get("route")
         payload = req.get("payload", {})
     except Exception:
         return _resp(400, {"error": "invalid_json"})
 
+    global _invocations
+    _invocations += 1
+
+    # Internal route, only for the function's own asynchronous invocations
+    if route == "summarise" and "requestContext" in event:
+        return _resp(404, {"error": "unknown_route"})
+
     routes = {
-        "transcribe": lambda p: transcribe(p["audio"], agent=agent),
-        "retrieve": lambda p: retrieve_sessions(db=db),
-        "next": lambda p: next_question(
-            session_id=p["session_id"],
-            interview_id=p["interview_id"],
-            user_message=p.get("user_message"),
-            db=db,
-            agent=agent,
-            interview_parameters=INTERVIEW_PARAMETERS,
-        ),
+        "summarise": _summarise,
+        "warm": _warm,
+        "transcribe": _transcribe,
+        "transcribe_next": _transcribe_next,
+        "retrieve": lambda p, timer: retrieve_sessions(db=get_db()),
+        "next": _next,
     }
 
     if route not in routes:
         return _resp(404, {"error": "unknown_route"})
     try:
-        result = routes[route](payload)
-        return _resp(200, result)
+        timer = StageTimer()
+        result = routes[route](payload, timer)
+        REGISTRY.observe_stages(timer, route=route)
+        if route in ("next", "transcribe_next"):
+            _schedule_summary(payload, context)
+        return _resp(
+            200,
+            result,
+            headers={"Server-Timing": timer.server_timing()},
+            accept_encoding=_header(event, "Accept-Encoding"),
+        )
     except KeyError as e:
         # missing field in payload
         return _resp(400, {"error": f"missing_field:{e}"})
@@ -176,18 +309,142 @@ def handler(event, context):
         return _resp(500, {"error": "internal_error"})
 
 
+def _header(event: dict, name: str) -> str:
+    """Value of a request header (names are case-insensitive), or None."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+# ------------ Routes -------------#
+
+
+def _next(p: dict, timer: StageTimer) -> dict:
+    from core.logic import next_question_once
+
+    return next_question_once(
+        session_id=p["session_id"],
+        interview_id=p["interview_id"],
+        user_message=p.get("user_message"),
+        request_id=p.get("request_id"),
+        db=get_db(),
+        agent=get_agent(),
+        interview_parameters=get_interview_parameters(),
+        timer=timer,
+    )
+
+
+def _transcribe(p: dict, timer: StageTimer) -> dict:
+    from core.logic import transcribe
+
+    return transcribe(p["audio"], agent=get_agent())
+
+
+def _transcribe_next(p: dict, timer: StageTimer) -> dict:
+    from core.logic import transcribe_and_next
+
+    return transcribe_and_next(
+        audio=p["audio"],
+        session_id=p["session_id"],
+        interview_id=p["interview_id"],
+        request_id=p.get("request_id"),
+        db=get_db(),
+        agent=get_agent(),
+        interview_parameters=get_interview_parameters(),
+        timer=timer,
+    )
+
+
+def _summarise(p: dict, timer: StageTimer) -> dict:
+    from core.logic import summarise_session
+
+    return summarise_session(
+        session_id=p["session_id"],
+        interview_id=p["interview_id"],
+        db=get_db(),
+        agent=get_agent(),
+        interview_parameters=get_interview_parameters(),
+    )
+
+
+def _schedule_summary(p: dict, context):
+    """
+    Update the running summary of the session (see core.summary) in an asynchronous
+    invocation of this function (route `summarise`), so that the response of this
+    one does not wait for it.
+    """
+    from core.summary import summary_enabled
+
+    if context is None:
+        return
+    if not summary_enabled(get_interview_parameters().get(p["interview_id"])):
+        return
+    global _lambda_client
+    try:
+        if _lambda_client is None:
+            from boto3 import client
+
+            _lambda_client = client("lambda")
+        body = {
+            "route": "summarise",
+            "payload": {
+                "session_id": p["session_id"],
+                "interview_id": p["interview_id"],
+            },
+        }
+        _lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps({"body": json.dumps(body)}),
+        )
+    except Exception as e:
+        # The next turn then uses the previous summary
+        logging.warning(f"Could not schedule the summary: {e!r}")
+
+
+def _warm(p: dict, timer: StageTimer) -> dict:
+    from core.logic import warm_up
+
+    cold_start = _db is None or _agent is None
+    timings = {}
+    start = time.perf_counter()
+    db = get_db()
+    timings["db_init_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    agent = get_agent()
+    timings["llm_init_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    result = warm_up(db=db, agent=agent, model=p.get("model", "gpt-4o-mini"))
+    result["timings_ms"] = {**timings, **result["timings_ms"]}
+
+    # Keep this container busy so that parallel warm requests reach distinct containers
+    hold_s = min(float(p.get("hold_s", 0)), 10.0)
+    if hold_s > 0:
+        time.sleep(hold_s)
+
+    return {
+        "cold_start": cold_start,
+        "container_age_s": round(time.time() - _container_started, 1),
+        "invocations": _invocations,
+        **result,
+    }
+
+
 # ------------ DB Helper Functions -------------#
 # TODO SHould be a new database protocol class (or removed entirely because these are just one-liners....)
 
 
-def load_interview_session(session_id: str) -> dict:
-    """Return interview session history to user."""
-    return db.load_remote_session(session_id)
+def load_interview_session(session_id: str) -> list:
+    """Return interview session history (one row per message) to user."""
+    from core.session import to_rows
+
+    return to_rows(get_db().load_remote_session(session_id))
 
 
 def delete_interview_session(session_id: str):
     """Delete existing interview saved to database."""
-    db.delete_remote_session(session_id)
+    get_db().delete_remote_session(session_id)
 
 
 def retrieve_sessions(db, sessions: list = None) -> dict:
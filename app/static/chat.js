@@ -0,0 +1,219 @@
+// Chat page of an interview session (app/templates/chat.html).
+// The landing route renders the transcript so far into the page and the session,
+// endpoints and state into the #bootstrap JSON, so no request is needed on load.
+
+var bootstrap = JSON.parse(document.getElementById("bootstrap").textContent);
+
+var chatArea = document.getElementById("chatArea");
+var submitButton = document.getElementById("submitButton");
+var recordButton = document.getElementById("recordButton"); // The record button
+var userInput = document.getElementById("inputBox");
+
+// POST a JSON payload and parse the JSON response; rejects on HTTP errors and timeouts
+function postJSON(url, payload, timeoutMs) {
+    var controller = new AbortController();
+    var timer = setTimeout(function () { controller.abort(); }, timeoutMs);
+    return fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload),
+        signal: controller.signal
+    }).then(function (response) {
+        if (!response.ok) {
+            throw new Error("HTTP " + response.status);
+        }
+        return response.json();
+    }).finally(function () {
+        clearTimeout(timer);
+    });
+}
+
+////////////////////////////////
+//// START AUDIO INPUT CODE ////
+////////////////////////////////
+let mediaRecorder;
+let audioChunks = [];
+let stream;
+
+recordButton.addEventListener("click", async () => {
+    if (recordButton.textContent === "Record response") {
+        // Start recording
+        try {
+            stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+            mediaRecorder = new MediaRecorder(stream);
+            audioChunks = []; // Reset the audio chunks
+            recordButton.textContent = "Stop recording";
+            submitButton.disabled = true;
+            mediaRecorder.start();
+            mediaRecorder.ondataavailable = (event) => {
+                audioChunks.push(event.data);
+            };
+        } catch (err) {
+            alert("Error accessing microphone: " + err.message);
+            submitButton.disabled = false;
+        }
+    } else if (recordButton.textContent === "Stop recording") {
+        // Stop recording
+        recordButton.textContent = "Transcribing audio...";
+        recordButton.disabled = true;
+        mediaRecorder.stop();
+        mediaRecorder.onstop = async () => {
+            // Create audio blob in base64 format
+            const audioBlob = new Blob(audioChunks, { type: "audio/webm" });
+            const reader = new FileReader();
+            reader.onloadend = async () => {
+                const audioBase64 = reader.result.split(",")[1]; // Remove the "data:..." prefix
+                // Send audio to the transcribe API endpoint
+                try {
+                    const data = await postJSON(bootstrap.urls.transcribe, { audio: audioBase64 }, 60000);
+                    userInput.value = data.transcription || "Transcription failed. Please try again.";
+                } catch (error) {
+                    console.error("Error:", error);
+                    alert("Something went wrong with the transcription. Please try again.");
+                } finally {
+                    // Clean up
+                    audioChunks = [];
+                    recordButton.textContent = "Record response";
+                    recordButton.disabled = false;
+                    submitButton.disabled = false;
+                }
+            };
+
+            reader.readAsDataURL(audioBlob); // Trigger the Base64 encoding
+            stream.getTracks().forEach(track => track.stop()); // Stop microphone access
+        };
+
+    }
+});
+////////////////////////////////
+/// END OF AUDIO INPUT CODE ////
+////////////////////////////////
+
+///////////////////////////////////////////
+/// ADD NEW MESSAGES WITH DANCING DOTS ////
+///////////////////////////////////////////
+function appendChatbotMessage(message, chatArea, status) {
+    // New message from the chatbot
+    var messageContent = document.createElement('div');
+    messageContent.className = "message-bot";
+
+    if (status === "waiting") {
+        // Dancing dots animation
+        messageContent.innerHTML = '<span class="dot"></span><span class="dot"></span><span class="dot"></span>';
+        messageContent.id = "dancingDots";
+    } else if (status === "response") {
+        var existingDots = document.getElementById("dancingDots");
+        if (existingDots) {
+            existingDots.textContent = message.trim();
+            existingDots.removeAttribute('id');
+            chatArea.scrollTop = chatArea.scrollHeight;
+            return; // Since the message is replaced, we don't need to append anything new
+        } else {
+            messageContent.textContent = message.trim();
+        }
+    }
+    chatArea.appendChild(messageContent);
+    chatArea.scrollTop = chatArea.scrollHeight;
+}
+
+function endInterview() {
+    submitButton.disabled = true;
+    submitButton.style.backgroundColor = '#ccc';
+    submitButton.innerText = "End of interview";
+    // Also disable the audio record button.
+    recordButton.disabled = true;
+}
+
+// The transcript so far is already in the page
+chatArea.scrollTop = chatArea.scrollHeight;
+if (bootstrap.ended) {
+    endInterview();
+}
+
+
+////////////////////////////////////////////////////////////
+// Prevent copy, cut, and paste in chatArea and userInput /
+////////////////////////////////////////////////////////////
+["copy", "cut", "paste"].forEach(eventType => {
+    [chatArea, userInput].forEach(element => {
+        element.addEventListener(eventType, event => {
+            event.preventDefault();
+        });
+    });
+});
+
+
+// Id of the answer being sent. Submitting the same answer again after an error reuses
+// it, so that the server returns the question it already generated for it (if any).
+var pendingAnswer = null;
+var pendingRequestId = null;
+function requestIdFor(message) {
+    if (message !== pendingAnswer) {
+        pendingAnswer = message;
+        pendingRequestId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+    return pendingRequestId;
+}
+
+////////////////////////////////////////////////////////////
+// GENERATE THE NEXT QUESTION ON SUBMIT BUTTON CLICK ///////
+////////////////////////////////////////////////////////////
+submitButton.addEventListener("click", function () {
+    var userMessage = userInput.value.trim();
+    // Take action only for non-empty messages.
+    if (userMessage) {
+        // Clear the input field
+        userInput.value = "";
+
+        // Make the submit button unclickable until the chatbot replies
+        submitButton.disabled = true;
+        submitButton.style.backgroundColor = '#ccc';
+        submitButton.innerText = "Waiting for reply...";
+        // Also disable the audio record button.
+        recordButton.disabled = true;
+
+        // Add user message to the chat area and scroll to the bottom
+        var messageContent = document.createElement('div');
+        messageContent.className = "message-user";
+        messageContent.textContent = userMessage;
+        chatArea.appendChild(messageContent);
+        chatArea.scrollTop = chatArea.scrollHeight;
+
+        // Add dancing dots
+        appendChatbotMessage("", chatArea, "waiting");
+
+        // API CALL: GENERATE THE NEXT QUESTION
+        postJSON(bootstrap.urls.next, {
+            user_message: userMessage,
+            request_id: requestIdFor(userMessage),
+            session_id: bootstrap.session_id,
+            interview_id: bootstrap.interview_id
+        }, 60000).then(function (data) {
+            pendingAnswer = null;
+            var next_question = data.message.trim();
+
+            // Check if this is the last message of the interview
+            if (next_question.indexOf("---END---") !== -1) {
+                next_question = next_question.replace("---END---", "").trim();
+                endInterview();
+            } else {
+                // Interview continues
+                submitButton.disabled = false;
+                submitButton.innerText = "Submit response";
+                submitButton.style.backgroundColor = '#007BFF';
+                // Re-enable audio record button.
+                recordButton.disabled = false;
+            }
+            appendChatbotMessage(next_question, chatArea, "response");
+        }).catch(function (error) {
+            // REQUEST UNSUCCESSFUL
+            console.error("Error:", error);
+            appendChatbotMessage("There was a technical error. Please try again.", chatArea, "response");
+            userInput.value = userMessage; // Submit again to retry
+            submitButton.disabled = false;
+            submitButton.style.backgroundColor = '#007BFF';
+            submitButton.innerText = "Submit response";
+            recordButton.disabled = false;
+        });
+    }
+});
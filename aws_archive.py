@@ -0,0 +1,185 @@
+from boto3 import resource
+from argparse import ArgumentParser
+from collections import defaultdict
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from app.core.session import from_document, has_ended, version_of
+from app.database.archive import SessionArchive
+from app.database.codec import decode_items
+
+# Sessions written per archive file at most
+SESSIONS_PER_FILE = 10_000
+
+
+def last_written_ms(item: dict) -> int:
+    """
+    Time of the last write of a table item (epoch ms): its `updated_at`, or, for items
+    written before that was recorded, the time of the session's last message (0 if
+    none has one).
+    """
+    if item.get("updated_at") is not None:
+        return int(item["updated_at"])
+    _, turns = from_document(item["session"])
+    return max((int(turn.time) * 1000 for turn in turns if turn.time), default=0)
+
+
+def _day(written_ms: int) -> str:
+    return datetime.fromtimestamp(written_ms / 1000, tz=timezone.utc).strftime(
+        "%Y-%m-%d"
+    )
+
+
+def archive_sessions(
+    table_name: str,
+    archive_path: str,
+    age_days: float = 30,
+    include_unfinished: bool = False,
+    dry_run: bool = False,
+    limit: Optional[int] = None,
+) -> int:
+    """
+    Move the sessions that ended more than `age_days` ago from the DynamoDB table to
+    the archive (see app/database/archive.py), so that scans of the table only read
+    the sessions of active studies.
+
+    Sessions are written to compressed files partitioned by the date of their last
+    write. Only once a file is stored, each of its sessions is replaced in the table by
+    a pointer item ({"session_id", "archive", "archived_at", "version"}), through
+    which the application still loads it. A session written to since it was read is
+    left in the table (and archived again by a later run). Items written before
+    `updated_at` was recorded are dated by their last message (see `last_written_ms`).
+
+    Arguments:
+    - table_name (str): Name of the DynamoDB table (interview-sessions).
+    - archive_path (str): Directory or S3 prefix (s3://bucket/prefix) of the archive;
+      the application must be deployed with the same ARCHIVE_PATH.
+    - age_days (float): Minimum number of days since the last write of a session.
+    - include_unfinished (bool): Also archive sessions that did not end but were not
+      written to for `age_days` (abandoned interviews).
+    - dry_run (bool): Only count the sessions that would be archived.
+    - limit (int): Maximum number of sessions to archive (for testing).
+
+    Returns the number of sessions archived.
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    table = resource("dynamodb").Table(table_name)
+    archive = SessionArchive(archive_path)
+    cutoff_ms = int((time.time() - age_days * 86400) * 1000)
+
+    # Stale sessions by the date of their last write:
+    # [(session_id, session, updated_at or None)]
+    by_day = defaultdict(list)
+    selected = 0
+    scan = {
+        "FilterExpression": (
+            Attr("updated_at").lt(cutoff_ms) | Attr("updated_at").not_exists()
+        )
+        & Attr("session").exists()
+    }
+    while limit is None or selected < limit:
+        resp = table.scan(**scan)
+        for item in decode_items(resp.get("Items", [])):
+            state, _ = from_document(item["session"])
+            if not (include_unfinished or has_ended(state)):
+                continue
+            written_ms = last_written_ms(item)
+            if written_ms >= cutoff_ms:
+                continue
+            by_day[_day(written_ms)].append(
+                (item["session_id"], item["session"], item.get("updated_at"))
+            )
+            selected += 1
+            if limit is not None and selected >= limit:
+                break
+        if not resp.get("LastEvaluatedKey"):
+            break
+        scan["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    logging.info(
+        f"{selected} sessions last written before the cutoff are to be archived"
+    )
+    if dry_run:
+        return 0
+
+    archived = 0
+    for day, sessions in sorted(by_day.items()):
+        for start in range(0, len(sessions), SESSIONS_PER_FILE):
+            batch = sessions[start : start + SESSIONS_PER_FILE]
+            key = archive.write(day, ((s_id, session) for s_id, session, _ in batch))
+            for session_id, session, updated_at in batch:
+                pointer = {
+                    "session_id": session_id,
+                    "archive": key,
+                    "archived_at": int(time.time() * 1000),
+                }
+                if version_of(session):
+                    # Writes that resume the session still check its version
+                    pointer["version"] = version_of(session)
+                if updated_at is None:
+                    # Any write of the application since records `updated_at`
+                    condition = {
+                        "ConditionExpression": "attribute_not_exists(updated_at)"
+                    }
+                else:
+                    condition = {
+                        "ConditionExpression": "updated_at = :read",
+                        "ExpressionAttributeValues": {":read": updated_at},
+                    }
+                try:
+                    table.put_item(Item=pointer, **condition)
+                except table.meta.client.exceptions.ConditionalCheckFailedException:
+                    logging.info(f"Session {session_id} changed; left in the table")
+                    continue
+                archived += 1
+            logging.info(f"Archived {len(batch)} sessions to '{key}'")
+
+    logging.info(f"Archived {archived} sessions from table '{table_name}'.")
+    return archived
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    parser = ArgumentParser(description="Archive ended sessions of the DynamoDB table")
+    parser.add_argument(
+        "--table_name", type=str, required=True, help="Name of the DynamoDB table"
+    )
+    parser.add_argument(
+        "--archive_path",
+        type=str,
+        required=True,
+        help="Directory or S3 prefix (s3://bucket/prefix) of the archive",
+    )
+    parser.add_argument(
+        "--age_days",
+        type=float,
+        default=30,
+        help="Archive sessions last written at least this many days ago",
+    )
+    parser.add_argument(
+        "--include_unfinished",
+        action="store_true",
+        help="Also archive sessions that did not end (abandoned interviews)",
+    )
+    parser.add_argument(
+        "--dry_run", action="store_true", help="Only count the sessions to archive"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Maximum number of sessions to archive (for testing)",
+    )
+    args = parser.parse_args()
+
+    archive_sessions(
+        table_name=args.table_name,
+        archive_path=args.archive_path,
+        age_days=args.age_days,
+        include_unfinished=args.include_unfinished,
+        dry_run=args.dry_run,
+        limit=args.limit,
+    )
@@ -1,54 +1,398 @@
 from boto3 import resource
 from argparse import ArgumentParser
-from csv import DictWriter
-from pydantic import validate_arguments
-import logging
-from typing import Optional
+from csv import DictWriter, reader
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Iterable, Iterator, List, Optional
+from app.core.session import to_rows
+from app.database.codec import decode_items
 
+# Rows buffered per Parquet write (one row group per partition and batch)
+PARQUET_BATCH_ROWS = 50_000
+# Index of sessions by time of their last write (see DynamoDB.update_remote_session)
+UPDATED_INDEX = "updated-index"
+# Writes up to this long before the watermark are queried again, as the index is
+# eventually consistent and writers' clocks may drift
+WATERMARK_OVERLAP_MS = 5 * 60 * 1000
+# Maximum number of keys of a BatchGetItem request
+BATCH_GET_KEYS = 100
 
-def retrieve_all_sessions(table_name: str, output_path: str, print_chats: bool = False):
-    """
-    Retrieve all stored AI interviews from your AWS DynamoDB database and export them as a CSV file.
-    The variables "session_id" and "order" uniquely identify each row.
-    Arguments:
-    - table_name (str): Name of the DynamoDB table from which to retrieve the interviews.
-    - output_path (str): Filepath to save the CSV file.
-    - print_chats (bool): Whether to print each interview session to console.
-    """
-    # Retrieve interview sessions from DynamoDB
-    table = resource("dynamodb").Table(table_name)
-    all_interview_chats = []
+
+def scan_pages(table) -> Iterator[list]:
+    """Yield the items of a DynamoDB table one scan page (max. 1 MB) at a time."""
     last_eval = None
     while True:
         # Handle multiple chunks with contiguous scan
         resp = table.scan(ExclusiveStartKey=last_eval) if last_eval else table.scan()
-        for item in resp.get("Items", []):
-            session_messages = item["session"]
-            # Add all messages in current interview session
-            all_interview_chats.extend(session_messages)
-            if print_chats:  # Print each session-message to console
-                for message in session_messages:
-                    print(message)
+        yield resp.get("Items", [])
         if not resp.get("LastEvaluatedKey"):
             break
         last_eval = resp["LastEvaluatedKey"]
 
-    print(f"{len(all_interview_chats)} interview sessions retrieved!")
-    if not all_interview_chats:
-        return
 
-    # Save to specified CSV output filepath
-    with open(output_path, "w") as csvfile:
-        writer = DictWriter(csvfile, fieldnames=all_interview_chats[300].keys())
-        writer.writeheader()
-        writer.writerows(all_interview_chats)
+def changed_session_ids(table, since_ms: int, until_ms: int) -> Iterator[str]:
+    """
+    Yield the ids of the sessions last written after `since_ms` (epoch ms), querying
+    the index one day (partition) at a time up to the day of `until_ms`.
+    """
+    from boto3.dynamodb.conditions import Key
+
+    day = datetime.fromtimestamp(since_ms / 1000, tz=timezone.utc).date()
+    last_day = datetime.fromtimestamp(until_ms / 1000, tz=timezone.utc).date()
+    while day <= last_day:
+        query = {
+            "IndexName": UPDATED_INDEX,
+            "KeyConditionExpression": Key("updated_day").eq(day.isoformat())
+            & Key("updated_at").gt(since_ms),
+        }
+        while True:
+            resp = table.query(**query)
+            for item in resp.get("Items", []):
+                yield item["session_id"]
+            if not resp.get("LastEvaluatedKey"):
+                break
+            query["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+        day += timedelta(days=1)
+
+
+def get_pages(dynamodb, table_name: str, session_ids: List[str]) -> Iterator[list]:
+    """Yield the items of the given sessions, fetched in batches of up to 100 keys."""
+    for start in range(0, len(session_ids), BATCH_GET_KEYS):
+        keys = [{"session_id": s} for s in session_ids[start : start + BATCH_GET_KEYS]]
+        request, attempt = {table_name: {"Keys": keys}}, 0
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            yield resp.get("Responses", {}).get(table_name, [])
+            request = resp.get("UnprocessedKeys")
+            if request:  # Throttled: back off before asking for the rest
+                attempt += 1
+                time.sleep(min(0.05 * 2**attempt, 5))
+
+
+def iter_rows(
+    pages: Iterable[list],
+    columns: Optional[List[str]] = None,
+    exported: Optional[dict] = None,
+) -> Iterator[dict]:
+    """
+    Yield one "long" row per message, page by page, restricted to `columns`.
+    With `exported` (session_id -> last exported order), messages that were already
+    exported are skipped and the dict is updated with the yielded ones.
+    """
+    for page in pages:
+        for item in decode_items(page):
+            for row in to_rows(item["session"]):
+                if exported is not None:
+                    session_id, order = row.get("session_id"), row.get("order") or 0
+                    if order <= exported.get(session_id, -1):
+                        continue
+                    exported[session_id] = order
+                if columns:
+                    row = {column: row.get(column) for column in columns}
+                yield row
+
+
+def load_checkpoint(path: str) -> dict:
+    """Checkpoint of the previous incremental export ({} if there is none)."""
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Replace the checkpoint atomically, so an interrupted run leaves the old one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class RowSpool(object):
+    """
+    Temporary JSON-lines file of rows that infers their union schema on the way, so
+    that a complete header can be written without keeping the rows in memory.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.columns = {}  # column -> set of Python type names (ordered by first use)
+        self.count = 0
+
+    def write(self, row: dict):
+        for column, value in row.items():
+            types = self.columns.setdefault(column, set())
+            if value is not None:
+                types.add(type(value).__name__)
+        self.file.write(json.dumps(row) + "\n")
+        self.count += 1
+
+    def __iter__(self) -> Iterator[dict]:
+        self.file.seek(0)
+        for line in self.file:
+            yield json.loads(line)
+
+    def close(self):
+        self.file.close()
+
+
+def _cell(value):
+    """Nested values (e.g. stage timings) are written as JSON strings."""
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def write_csv(
+    rows: Iterator[dict], output_path: str, columns: List[str], append: bool = False
+) -> int:
+    """Write rows as CSV; with `append`, add them under the header of an existing file."""
+    header = None
+    if append and os.path.isfile(output_path):
+        with open(output_path, newline="") as csvfile:
+            header = next(reader(csvfile), None)
+    if header:
+        skipped = [column for column in columns if column not in header]
+        if skipped:
+            print(f"Columns missing from the existing CSV are not exported: {skipped}")
+        columns = header
+    count = 0
+    with open(output_path, "a" if header else "w", newline="") as csvfile:
+        writer = DictWriter(csvfile, fieldnames=columns, extrasaction="ignore")
+        if not header:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({k: _cell(v) for k, v in row.items()})
+            count += 1
+    return count
+
+
+def _partition(row: dict) -> tuple:
+    """(interview_id, date) of a row; the date of its message time (UTC)."""
+    interview_id = str(row.get("interview_id") or "unknown")
+    value = row.get("time")
+    if isinstance(value, (int, float)):
+        date = datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%d")
+    elif isinstance(value, str) and re.match(r"\d{4}-\d{2}-\d{2}", value):
+        date = value[:10]  # older sessions stored the time as text
+    else:
+        date = "unknown"
+    return re.sub(r"[^\w.-]", "_", interview_id), date
+
+
+def _arrow_type(types: set) -> str:
+    """Name of the Arrow type of a column with values of `types` (Python type names)."""
+    if types and types <= {"bool"}:
+        return "bool"
+    if types and types <= {"int"}:
+        return "int64"
+    if types and types <= {"int", "float"}:
+        return "double"
+    return "string"
+
+
+# Python types whose values each Arrow type can hold (strings hold all, as text)
+_ARROW_VALUES = {"bool": {"bool"}, "int64": {"int"}, "double": {"int", "float"}}
+
+
+def parquet_schema(column_types: dict, stored: Optional[dict] = None) -> dict:
+    """
+    Arrow type names by column ({column: "int64", ...}) of an export of rows whose
+    columns have values of `column_types` (see RowSpool).
+
+    Incremental exports pass the schema of the previous parts (`stored`, from the
+    checkpoint): its columns keep their types, also those without values in this run,
+    and new columns are added after them, so that all parts read as one dataset.
+    Raises ValueError if a column now has values its stored type cannot hold.
+    """
+    schema = dict(stored or {})
+    for column, types in column_types.items():
+        if column not in schema:
+            schema[column] = _arrow_type(types)
+        elif (
+            schema[column] in _ARROW_VALUES
+            and not types <= _ARROW_VALUES[schema[column]]
+        ):
+            raise ValueError(
+                f"Column '{column}' was exported as {schema[column]} but now has "
+                f"{sorted(types)} values; export again without the checkpoint"
+            )
+    return schema
+
+
+def write_parquet(
+    rows: Iterator[dict],
+    output_dir: str,
+    schema_types: dict,
+    part_name: str = "part-0.parquet",
+) -> int:
+    """
+    Write rows as Parquet files partitioned as
+    `<output_dir>/interview_id=<id>/date=<YYYY-MM-DD>/<part_name>`, with the explicit
+    schema `schema_types` ({column: Arrow type name}, see `parquet_schema`).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Parquet export requires pyarrow: `pip install pyarrow`"
+        ) from e
+
+    schema = pa.schema(
+        [(column, pa.type_for_alias(name)) for column, name in schema_types.items()]
+    )
+    strings = [f.name for f in schema if f.type == pa.string()]
+    writers, batches, count = {}, {}, 0
+
+    def flush():
+        for partition, batch in batches.items():
+            if partition not in writers:
+                interview_id, date = partition
+                directory = os.path.join(
+                    output_dir, f"interview_id={interview_id}", f"date={date}"
+                )
+                os.makedirs(directory, exist_ok=True)
+                writers[partition] = pq.ParquetWriter(
+                    os.path.join(directory, part_name), schema
+                )
+            writers[partition].write_table(pa.Table.from_pylist(batch, schema=schema))
+        batches.clear()
+
+    try:
+        for row in rows:
+            for column in strings:
+                value = row.get(column)
+                if value is not None and not isinstance(value, str):
+                    row[column] = (
+                        _cell(value) if isinstance(value, (dict, list)) else str(value)
+                    )
+            batches.setdefault(_partition(row), []).append(row)
+            count += 1
+            if count % PARQUET_BATCH_ROWS == 0:
+                flush()
+        flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return count
+
+
+def retrieve_all_sessions(
+    table_name: str,
+    output_path: str,
+    print_chats: bool = False,
+    format: str = "csv",
+    columns: Optional[List[str]] = None,
+    incremental: bool = False,
+    checkpoint_path: Optional[str] = None,
+):
+    """
+    Retrieve all stored AI interviews from your AWS DynamoDB database and export them as a CSV file
+    or as Parquet files partitioned by interview and date.
+    The variables "session_id" and "order" uniquely identify each row.
+
+    The table is scanned page by page and the rows are spooled to a temporary file, so memory use
+    does not grow with the size of the table. The columns are the union of the fields of all
+    messages, unless a projection is given with `columns`.
+
+    With `incremental`, a checkpoint (time of the previous run and last exported message of each
+    session) is kept next to the export. Later runs fetch only the sessions written since the
+    previous run, through the 'updated-index' of the table instead of a scan, and append their new
+    messages to the export (rows of the existing CSV, or new `part-<time>.parquet` files). The
+    checkpoint also keeps the Parquet schema, with which every new part is written.
+    Without a checkpoint, the run exports the whole table and creates one.
+
+    Arguments:
+    - table_name (str): Name of the DynamoDB table from which to retrieve the interviews.
+    - output_path (str): Filepath to save the CSV file, or directory for the Parquet files.
+    - print_chats (bool): Whether to print each interview session to console.
+    - format (str): "csv" or "parquet" (requires pyarrow).
+    - columns (list): Optional subset of columns to export, e.g. ["session_id", "order", "content"].
+    - incremental (bool): Export only the messages added since the previous incremental run.
+    - checkpoint_path (str): Checkpoint file, by default `<output_path>.checkpoint.json`.
+    """
+    dynamodb = resource("dynamodb")
+    table = dynamodb.Table(table_name)
+    started_ms = int(time.time() * 1000)
+    checkpoint_path = checkpoint_path or f"{output_path.rstrip(os.sep)}.checkpoint.json"
+    checkpoint = load_checkpoint(checkpoint_path) if incremental else {}
+
+    if checkpoint:
+        since_ms = checkpoint["watermark"] - WATERMARK_OVERLAP_MS
+        session_ids = sorted(set(changed_session_ids(table, since_ms, started_ms)))
+        print(f"{len(session_ids)} interview sessions changed since the last export")
+        pages = get_pages(dynamodb, table_name, session_ids)
+    else:
+        pages = scan_pages(table)
+    exported = checkpoint.get("sessions", {}) if incremental else None
+    schema_types = checkpoint.get("schema")
+
+    spool = RowSpool()
+    try:
+        for row in iter_rows(pages, columns, exported):
+            spool.write(row)
+            if print_chats:  # Print each session-message to console
+                print(row)
+
+        print(f"{spool.count} interview messages retrieved!")
+        if spool.count and format == "parquet":
+            part_name = f"part-{started_ms}.parquet" if checkpoint else "part-0.parquet"
+            schema_types = parquet_schema(spool.columns, schema_types)
+            write_parquet(iter(spool), output_path, schema_types, part_name)
+        elif spool.count:
+            write_csv(
+                iter(spool),
+                output_path,
+                columns or list(spool.columns),
+                bool(checkpoint),
+            )
+    finally:
+        spool.close()
+
+    if incremental:
+        checkpoint = {"watermark": started_ms, "sessions": exported}
+        if schema_types:
+            checkpoint["schema"] = schema_types
+        save_checkpoint(checkpoint_path, checkpoint)
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--table_name", type=str, help="Name of DynamoDBTable")
     parser.add_argument(
-        "--output_path", type=str, default="chats.csv", help="Filepath to chats CSV"
+        "--output_path",
+        type=str,
+        default="chats.csv",
+        help="Filepath to chats CSV (directory for Parquet files)",
+    )
+    parser.add_argument("--format", type=str, choices=["csv", "parquet"], default="csv")
+    parser.add_argument(
+        "--columns", type=str, nargs="+", default=None, help="Columns to export"
+    )
+    parser.add_argument(
+        "--print_chats", action="store_true", help="Print every message to console"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append only the messages added since the previous incremental export",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Checkpoint of incremental exports (default: <output_path>.checkpoint.json)",
     )
     args = parser.parse_args()
-    retrieve_all_sessions(args.table_name, args.output_path)
+    retrieve_all_sessions(
+        args.table_name,
+        args.output_path,
+        args.print_chats,
+        args.format,
+        args.columns,
+        args.incremental,
+        args.checkpoint,
+    )
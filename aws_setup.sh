@@ -71,13 +71,54 @@ aws s3api put-bucket-lifecycle-configuration \
 # unless DYNAMO_TABLE is otherwise set as environment variable.
 TABLE_NAME=${DYNAMO_TABLE:-'interview-sessions'}
 echo; echo "Creating DynamoDB table '$TABLE_NAME' to store interview sessions"
+# The 'updated-index' (day and time of the last write of each session) lets
+# 'aws_retrieve.py --incremental' export only the sessions changed since its last run.
+UPDATED_INDEX='[{
+	"IndexName": "updated-index",
+	"KeySchema": [
+		{"AttributeName": "updated_day", "KeyType": "HASH"},
+		{"AttributeName": "updated_at", "KeyType": "RANGE"}
+	],
+	"Projection": {"ProjectionType": "KEYS_ONLY"}
+}]'
 aws dynamodb create-table \
 	--table-name $TABLE_NAME \
 	--attribute-definitions AttributeName=session_id,AttributeType=S \
+		AttributeName=updated_day,AttributeType=S \
+		AttributeName=updated_at,AttributeType=N \
 	--key-schema AttributeName=session_id,KeyType=HASH \
+	--global-secondary-indexes "$UPDATED_INDEX" \
 	--billing-mode PAY_PER_REQUEST \
 	--region $AWS_REGION
 
+# Tables created before the index existed ('ResourceInUseException' above) get it added
+if ! aws dynamodb describe-table --table-name $TABLE_NAME --region $AWS_REGION \
+	--query "Table.GlobalSecondaryIndexes[].IndexName" --output text | grep -q "updated-index"
+then
+	echo "Adding index 'updated-index' to existing table '$TABLE_NAME'"
+	aws dynamodb update-table \
+		--table-name $TABLE_NAME \
+		--attribute-definitions AttributeName=updated_day,AttributeType=S \
+			AttributeName=updated_at,AttributeType=N \
+		--global-secondary-index-updates '[{"Create": {
+			"IndexName": "updated-index",
+			"KeySchema": [
+				{"AttributeName": "updated_day", "KeyType": "HASH"},
+				{"AttributeName": "updated_at", "KeyType": "RANGE"}
+			],
+			"Projection": {"ProjectionType": "KEYS_ONLY"}
+		}}]' \
+		--region $AWS_REGION
+fi
+
+# With SESSION_TTL_DAYS set (default 0, never), sessions expire that many days after
+# their last write, through the 'expires_at' attribute. Without it no session is given
+# the attribute and none is deleted. Archive ended sessions before with 'aws_archive.py'.
+aws dynamodb update-time-to-live \
+	--table-name $TABLE_NAME \
+	--time-to-live-specification "Enabled=true, AttributeName=expires_at" \
+	--region $AWS_REGION
+
 echo
 echo "----------------------------------- IMPORTANT NOTES: --------------------------------------"
 echo "This file needs to be run just once as all future changes will be reflected in re-deployment."
@@ -0,0 +1,71 @@
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+import json
+import logging
+import time
+
+
+def warm_request(endpoint: str, hold_s: float, timeout: float = 30) -> dict:
+    """Send one `warm` request to the Lambda endpoint and return its diagnostics."""
+    body = json.dumps({"route": "warm", "payload": {"hold_s": hold_s}}).encode()
+    request = Request(endpoint, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read())
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result["round_trip_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def warm_containers(endpoint: str, containers: int, hold_s: float = 2.0) -> list:
+    """
+    Pre-warm `containers` Lambda containers before a survey wave.
+
+    The requests are sent in parallel and each keeps its container busy for `hold_s`
+    seconds, so that API Gateway has to route them to distinct containers. The warm
+    route does not create sessions or generate text, so no tokens are spent.
+
+    Arguments:
+    - endpoint (str): Public endpoint of the Lambda function (see aws_deploy.sh output).
+    - containers (int): Number of containers to warm.
+    - hold_s (float): Seconds each request keeps its container busy (max. 10).
+    """
+    with ThreadPoolExecutor(max_workers=containers) as pool:
+        results = list(
+            pool.map(lambda _: warm_request(endpoint, hold_s), range(containers))
+        )
+
+    failed = [r for r in results if "error" in r or r.get("errors")]
+    cold = sum(1 for r in results if r.get("cold_start"))
+    logging.info(
+        f"Warmed {len(results) - len(failed)}/{containers} containers "
+        f"({cold} cold starts, {len(failed)} with errors)."
+    )
+    for r in failed:
+        logging.warning(f"Warm-up problem: {r.get('error') or r.get('errors')}")
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    parser = ArgumentParser(description="Pre-warm Lambda containers before a survey")
+    parser.add_argument(
+        "--endpoint", type=str, required=True, help="Public Lambda API endpoint"
+    )
+    parser.add_argument(
+        "--containers", type=int, default=10, help="Number of containers to warm"
+    )
+    parser.add_argument(
+        "--hold_s",
+        type=float,
+        default=2.0,
+        help="Seconds each request keeps its container busy (max. 10)",
+    )
+    args = parser.parse_args()
+
+    for result in warm_containers(args.endpoint, args.containers, args.hold_s):
+        print(json.dumps(result))
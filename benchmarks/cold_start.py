@@ -0,0 +1,192 @@
+"""
+Reproducible cold-start benchmark for the Lambda import graph.
+
+Every target module is imported in a fresh interpreter, as happens on a Lambda
+cold start, and this is repeated `--repeat` times. For each target we report the
+median import time, the resident memory (RSS) added by the import, the heavy
+third-party packages it ended up loading, and the packages that dominate its
+import time (from `python -X importtime`).
+
+Run from the repository root:
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --repeat 10 --output cold_start.json
+    python benchmarks/cold_start.py --modules lambda_handler openai boto3
+
+Note that the numbers depend on the machine: compare runs made on the same host
+(or inside the `public.ecr.aws/lambda/python:3.12` image for arm64 parity).
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+
+DEFAULT_MODULES = [
+    "lambda_handler",
+    "core.logic",
+    "core.agent",
+    "database.dynamo",
+    "openai",
+    "boto3",
+    "pydantic",
+    "flask",
+]
+
+# Packages that should never be imported by `lambda_handler` on its own
+HEAVY_PACKAGES = [
+    "openai",
+    "boto3",
+    "botocore",
+    "pydantic",
+    "httpx",
+    "flask",
+    "werkzeug",
+]
+
+PROBE = """
+import importlib, json, sys, time
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+before = rss_kb()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+after = rss_kb()
+print(json.dumps({
+    "import_s": elapsed,
+    "rss_before_kb": before,
+    "rss_delta_kb": after - before,
+    "loaded": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Sum `-X importtime` self-times (microseconds) by top-level package."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, _, name = line.split(":", 1)[1].split("|")
+        except ValueError:
+            continue
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+
+def probe_module(module: str) -> dict:
+    """Import `module` in a fresh interpreter and return its measurements."""
+    env = {**os.environ, "PYTHONPATH": str(APP_DIR)}
+    env.pop("LAMBDA_EAGER_INIT", None)
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            PROBE,
+            module,
+            json.dumps(HEAVY_PACKAGES),
+        ],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing '{module}' failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["packages_us"] = parse_importtime(proc.stderr)
+    return result
+
+
+def benchmark(modules: list, repeat: int, top: int) -> list:
+    """Return one summary per module with medians over `repeat` fresh imports."""
+    # Interpreter start-up imports show up in every run; subtract them as a baseline
+    startup = probe_module("os")["packages_us"]
+    summaries = []
+    for module in modules:
+        try:
+            runs = [probe_module(module) for _ in range(repeat)]
+        except RuntimeError as e:
+            summaries.append({"module": module, "error": str(e)})
+            continue
+        packages = {}
+        for run in runs:
+            for package, us in run["packages_us"].items():
+                packages.setdefault(package, []).append(us - startup.get(package, 0))
+        heaviest = sorted(
+            ((package, median(values) / 1000) for package, values in packages.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        heaviest = [(p, ms) for p, ms in heaviest if ms >= 0.1][:top]
+        summaries.append(
+            {
+                "module": module,
+                "import_ms": round(median(r["import_s"] for r in runs) * 1000, 1),
+                "import_ms_min": round(min(r["import_s"] for r in runs) * 1000, 1),
+                "rss_delta_mb": round(
+                    median(r["rss_delta_kb"] for r in runs) / 1024, 1
+                ),
+                "loaded": runs[0]["loaded"],
+                "heaviest_packages_ms": [(p, round(ms, 1)) for p, ms in heaviest],
+            }
+        )
+    return summaries
+
+
+def print_report(summaries: list):
+    print(
+        f"{'module':<20} {'import ms':>10} {'min ms':>8} {'RSS MB':>7}  heavy packages loaded"
+    )
+    for s in summaries:
+        if "error" in s:
+            print(f"{s['module']:<20} ERROR: {s['error'].splitlines()[-1]}")
+            continue
+        print(
+            f"{s['module']:<20} {s['import_ms']:>10} {s['import_ms_min']:>8} "
+            f"{s['rss_delta_mb']:>7}  {', '.join(s['loaded']) or '-'}"
+        )
+        heaviest = ", ".join(f"{p} {ms}ms" for p, ms in s["heaviest_packages_ms"])
+        print(f"{'':<20} top: {heaviest}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure cold-start import time and memory")
+    parser.add_argument(
+        "--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Fresh interpreters per module"
+    )
+    parser.add_argument("--top", type=int, default=5, help="Heaviest packages to list")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Optional JSON output path"
+    )
+    args = parser.parse_args()
+
+    summaries = benchmark(args.modules, args.repeat, args.top)
+    print_report(summaries)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
@@ -0,0 +1,137 @@
+"""
+Benchmark of the conversion of DynamoDB items (numbers as Decimal) to native values.
+
+Compares the per-message conversion that `DynamoDB.retrieve_sessions` used before
+`database/codec.py` (a `dict(map(lambda ...))` per message that turned every Decimal
+into an int) with the page-wise, schema-driven `decode_items`, on an export of
+`--messages` messages. Pages of items are generated once and converted repeatedly,
+so the numbers only reflect the conversion itself.
+
+    python benchmarks/decimal_conversion.py
+    python benchmarks/decimal_conversion.py --messages 100000 --format compact
+
+`--format legacy` uses items that store every message with the full state (as
+before storage format 2), `--format compact` uses documents of `core/session.py`.
+"""
+
+from argparse import ArgumentParser
+from decimal import Decimal
+from pathlib import Path
+import json
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from core.session import Turn, to_document, to_rows  # noqa: E402
+from database.codec import decode_items  # noqa: E402
+
+
+def legacy_convert(items: list) -> list:
+    """Conversion as done by DynamoDB.retrieve_sessions before the codec."""
+    rows = []
+    for item in items:
+        session_messages = [
+            dict(
+                map(
+                    lambda x: ((x[0], int(x[1])) if isinstance(x[1], Decimal) else x),
+                    message.items(),
+                )
+            )
+            for message in to_rows(item["session"])
+        ]
+        rows.extend(session_messages)
+    return rows
+
+
+def codec_convert(items: list) -> list:
+    rows = []
+    for item in decode_items(items):
+        rows.extend(to_rows(item["session"]))
+    return rows
+
+
+def make_page(sessions: int, messages_per_session: int, format: str) -> list:
+    """A scan page of items with numbers as DynamoDB returns them."""
+    items = []
+    for s in range(sessions):
+        session_id = f"MI-BENCH-{s}"
+        state = {
+            "session_id": session_id,
+            "topic_idx": Decimal("1"),
+            "question_idx": Decimal("1"),
+            "finish_idx": Decimal("1"),
+            "flagged_messages": Decimal("0"),
+            "terminated": False,
+            "summary": "",
+            "open_ai_time": Decimal("1.734"),
+            "question_name": "followup_past_negatives",
+        }
+        turns = [
+            Turn(
+                order=Decimal(i),
+                time=Decimal(1757408482 + 10 * i),
+                type="question" if i % 2 else "answer",
+                content="It sounds like meal-prepping helped you save in the past.",
+                question_name="followup_past_negatives",
+                open_ai_time=Decimal("1.734") if i % 2 else None,
+                stage_ms=(
+                    {"llm_primary": Decimal(1712), "db_write": Decimal(9)}
+                    if i % 2
+                    else None
+                ),
+            )
+            for i in range(1, messages_per_session + 1)
+        ]
+        document = to_document(state, turns)
+        session = to_rows(document) if format == "legacy" else document
+        items.append({"session_id": session_id, "session": session})
+    return items
+
+
+def run(convert, page: list, pages: int) -> float:
+    start = time.perf_counter()
+    for _ in range(pages):
+        convert(page)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Benchmark Decimal conversion of DynamoDB reads"
+    )
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--messages-per-session", type=int, default=40)
+    parser.add_argument("--sessions-per-page", type=int, default=25)
+    parser.add_argument("--format", choices=["legacy", "compact"], default="legacy")
+    parser.add_argument("--output", type=str, default=None, help="Save results as JSON")
+    args = parser.parse_args()
+
+    page = make_page(args.sessions_per_page, args.messages_per_session, args.format)
+    per_page = args.sessions_per_page * args.messages_per_session
+    pages = max(1, args.messages // per_page)
+    messages = pages * per_page
+
+    sample_old, sample_new = legacy_convert(page)[0], codec_convert(page)[0]
+    results = {"messages": messages, "format": args.format}
+    for name, convert in (
+        ("lambda_per_message", legacy_convert),
+        ("codec", codec_convert),
+    ):
+        seconds = run(convert, page, pages)
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "messages_per_s": round(messages / seconds),
+        }
+        print(f"{name:<20} {seconds:8.2f} s  {messages / seconds:>12,.0f} messages/s")
+    speedup = results["lambda_per_message"]["seconds"] / results["codec"]["seconds"]
+    results["speedup"] = round(speedup, 2)
+    print(f"Speed-up: {speedup:.2f}x on {messages:,} messages ({args.format} items)")
+    print(
+        f"open_ai_time of a question: {sample_old['open_ai_time']!r} (lambda) vs "
+        f"{sample_new['open_ai_time']!r} (codec)"
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,495 @@
+"""
+Offline load test with concurrent virtual respondents.
+
+Every virtual respondent starts an interview and replays the answers of a recorded
+transcript, waiting a think time before each answer, until the interview ends or
+the transcript runs out of answers. Respondents arrive according to an arrival
+curve and run concurrently, one thread each, against the Flask app (through its
+test client) or `lambda_handler.handler`.
+
+Nothing leaves the machine: sessions are kept in memory (`DATABASE=MEMORY`) and
+the LLM is replaced by the offline client of `core/offline.py`
+(`LLM_BACKEND=OFFLINE`) with a configurable latency. The interview plan is read
+from `app/parameters.py` as in production, so `--interview-id` must be one of its
+`INTERVIEW_PARAMETERS`. With `--llm-base-url` the real OpenAI client is used against
+that URL instead, typically `benchmarks/mock_llm_server.py`.
+
+Run from the repository root, e.g.:
+
+    python benchmarks/load_test.py --interview-id MI_SAVINGS
+    python benchmarks/load_test.py --interview-id MI_SAVINGS --target lambda \\
+        --arrival ramp:start=0.5,end=10 --duration 120 --think-scale 0.2
+
+Transcripts are JSON files in the format stored by the database: a list of messages
+(see `benchmarks/transcripts/sample.json`), a list of such lists, or the output of
+`retrieve_sessions`. By default think times are taken from the recorded message
+times; use e.g. `--think lognormal:median=8,sigma=0.6` instead.
+
+The report lists p50/p95/p99 latency and error rates per route, and the same per
+time window together with the number of active respondents. The first window that
+violates `--slo-ms` or `--max-error-rate` marks the saturation point.
+
+All respondents share one process (and one GIL): the numbers describe a single
+Flask worker, or the CPU share of many Lambda containers squeezed into one process.
+"""
+
+from argparse import ArgumentParser
+from base64 import b64encode
+from pathlib import Path
+from statistics import quantiles
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from core.offline import LatencyModel  # noqa: E402
+
+DEFAULT_TRANSCRIPT = Path(__file__).resolve().parent / "transcripts" / "sample.json"
+END_MARKER = "---END---"
+
+
+# ------------ Transcripts -------------#
+
+
+def load_transcripts(paths: list) -> list:
+    """Return a list of transcripts (lists of messages sorted by order)."""
+    transcripts = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = list(data.values())
+        if data and isinstance(data[0], dict):
+            # A single session, or "long" rows of several sessions
+            sessions = {}
+            for message in data:
+                sessions.setdefault(message.get("session_id"), []).append(message)
+            data = list(sessions.values())
+        for messages in data:
+            transcripts.append(sorted(messages, key=lambda m: int(m.get("order", 0))))
+    return [t for t in transcripts if any(m.get("type") == "answer" for m in t)]
+
+
+def replay_script(transcript: list) -> list:
+    """
+    Return [(answer, recorded think time in seconds or None)] of a transcript.
+    The think time is the gap between an answer and the preceding question.
+    """
+    script, asked_at = [], None
+    for message in transcript:
+        if message.get("type") == "question":
+            asked_at = message.get("time")
+        elif message.get("type") == "answer":
+            think = None
+            if asked_at is not None and message.get("time") is not None:
+                think = max(0.0, float(message["time"]) - float(asked_at))
+            script.append((message.get("content", ""), think))
+    return script
+
+
+# ------------ Arrival curves -------------#
+
+
+class ArrivalCurve(object):
+    """
+    Arrival rate (respondents per second) over the test duration:
+
+        constant:rate=2
+        ramp:start=0.5,end=5
+        step:rate=1,increment=1,every=30
+    """
+
+    DEFAULTS = {
+        "constant": {"rate": 1.0},
+        "ramp": {"start": 0.1, "end": 2.0},
+        "step": {"rate": 0.5, "increment": 0.5, "every": 30.0},
+    }
+
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        if kind not in self.DEFAULTS:
+            raise ValueError(
+                f"Unknown arrival curve '{kind}', use one of {list(self.DEFAULTS)}"
+            )
+        params = dict(self.DEFAULTS[kind])
+        for pair in filter(None, args.split(",")):
+            key, _, value = pair.partition("=")
+            if key not in params:
+                raise ValueError(f"Unknown parameter '{key}' for '{kind}'")
+            params[key] = float(value)
+        self.kind, self.params = kind, params
+
+    def rate(self, t: float, duration: float) -> float:
+        p = self.params
+        if self.kind == "constant":
+            return p["rate"]
+        if self.kind == "ramp":
+            return p["start"] + (p["end"] - p["start"]) * min(t / duration, 1.0)
+        return p["rate"] + p["increment"] * int(t // p["every"])
+
+    def start_times(self, duration: float, rng: random.Random) -> list:
+        """Poisson arrival times in [0, duration) following the curve."""
+        times, t = [], 0.0
+        while True:
+            t += rng.expovariate(max(self.rate(t, duration), 1e-6))
+            if t >= duration:
+                return times
+            times.append(t)
+
+
+# ------------ Targets -------------#
+
+
+class FlaskTarget(object):
+    """
+    Calls the Flask app in-process through its test client. Responses are closed, as
+    by a server once they are sent, which runs their `call_on_close` callbacks (the
+    running summary, see core.summary).
+    """
+
+    def __init__(self):
+        from app import app
+
+        self.app = app
+        self.local = threading.local()
+
+    def call(self, route: str, payload: dict):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+        with self.local.client.post(f"/{route}", json=payload) as response:
+            return response.status_code, response.get_json(silent=True) or {}
+
+
+class LocalInvoker(object):
+    """
+    Stands in for the Lambda client of `lambda_handler`: asynchronous invocations of
+    the function (the running summary, see core.summary) run the handler in a
+    background thread of this process.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def invoke(self, FunctionName: str, InvocationType: str, Payload: str):
+        event = json.loads(Payload)
+        threading.Thread(target=self.handler, args=(event, None), daemon=True).start()
+        return {"StatusCode": 202}
+
+
+class LambdaContext(object):
+    """The attributes of the Lambda context object that the handler reads."""
+
+    invoked_function_arn = "arn:aws:lambda:local:000000000000:function:load-test"
+
+
+class LambdaTarget(object):
+    """Calls the Lambda handler in-process with API Gateway proxy events."""
+
+    def __init__(self):
+        import lambda_handler
+
+        lambda_handler._lambda_client = LocalInvoker(lambda_handler.handler)
+        self.handler = lambda_handler.handler
+        self.context = LambdaContext()
+
+    def call(self, route: str, payload: dict):
+        event = {"body": json.dumps({"route": route, "payload": payload})}
+        response = self.handler(event, self.context)
+        return response["statusCode"], json.loads(response["body"])
+
+
+TARGETS = {"flask": FlaskTarget, "lambda": LambdaTarget}
+
+
+# ------------ Load test -------------#
+
+
+class LoadTest(object):
+
+    def __init__(self, target, interview_id: str, transcripts: list, args):
+        self.target = target
+        self.interview_id = interview_id
+        self.scripts = [replay_script(t) for t in transcripts]
+        self.args = args
+        self.think = (
+            None if args.think == "recorded" else LatencyModel.parse(args.think)
+        )
+        self.fallback_think = LatencyModel.parse("lognormal:median=8,sigma=0.6")
+        self.audio = b64encode(os.urandom(16_000)).decode()  # ~1 s of compressed speech
+        self.lock = threading.Lock()
+        self.requests = []  # (start offset, route, seconds, error or None)
+        self.samples = []  # (offset, active respondents)
+        self.active = 0
+        self.finished = 0
+        self.abandoned = 0
+        self.dropped = 0
+
+    def request(self, route: str, payload: dict):
+        start = time.perf_counter()
+        try:
+            status, body = self.target.call(route, payload)
+            error = None if status == 200 else f"HTTP {status}"
+        except Exception as e:
+            body, error = {}, type(e).__name__
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.requests.append((start - self.started, route, elapsed, error))
+        return body, error
+
+    def respondent(self, index: int, rng: random.Random):
+        script = self.scripts[index % len(self.scripts)]
+        session_id = f"LOAD-{self.run_id}-{index}"
+        base = {"session_id": session_id, "interview_id": self.interview_id}
+        completed = False
+        try:
+            body, error = self.request("next", {**base, "user_message": None})
+            for answer, recorded_think in script:
+                if error:
+                    break
+                if END_MARKER in str(body.get("message", "")):
+                    completed = True
+                    break
+                if self.think is not None:
+                    think = self.think.sample(rng)
+                elif recorded_think is not None:
+                    think = recorded_think
+                else:
+                    think = self.fallback_think.sample(rng)
+                time.sleep(think * self.args.think_scale)
+                if rng.random() < self.args.voice_share:
+                    body, error = self.request(
+                        "transcribe_next", {**base, "audio": self.audio}
+                    )
+                else:
+                    body, error = self.request("next", {**base, "user_message": answer})
+            else:
+                completed = not error
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.finished += completed
+                self.abandoned += not completed
+
+    def sampler(self, stop: threading.Event):
+        while not stop.wait(0.25):
+            with self.lock:
+                self.samples.append((time.perf_counter() - self.started, self.active))
+
+    def run(self) -> dict:
+        args = self.args
+        rng = random.Random(args.seed)
+        arrivals = ArrivalCurve(args.arrival).start_times(args.duration, rng)
+        self.run_id = f"{int(time.time())}"
+        self.started = time.perf_counter()
+        stop = threading.Event()
+        threading.Thread(target=self.sampler, args=(stop,), daemon=True).start()
+
+        threads = []
+        for index, offset in enumerate(arrivals):
+            delay = offset - (time.perf_counter() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+            with self.lock:
+                if self.active >= args.max_active:
+                    self.dropped += 1
+                    continue
+                self.active += 1
+            thread = threading.Thread(
+                target=self.respondent,
+                args=(index, random.Random(rng.random())),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        # Let the respondents that already started finish their interviews
+        deadline = time.perf_counter() + args.drain
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.perf_counter()))
+        stop.set()
+        return self.report(arrivals)
+
+    def report(self, arrivals: list) -> dict:
+        args = self.args
+        with self.lock:
+            requests = list(self.requests)
+            samples = list(self.samples)
+
+        routes = {}
+        for _, route, seconds, error in requests:
+            routes.setdefault(route, []).append((seconds, error))
+        per_route = {route: summarise(values) for route, values in routes.items()}
+
+        windows, saturation = [], None
+        n_windows = (
+            int(max([args.duration] + [r[0] for r in requests]) // args.window) + 1
+        )
+        for w in range(n_windows):
+            lo, hi = w * args.window, (w + 1) * args.window
+            values = [(s, e) for start, _, s, e in requests if lo <= start < hi]
+            active = [a for t, a in samples if lo <= t < hi]
+            window = {
+                "start_s": lo,
+                "arrivals_per_s": round(
+                    sum(1 for t in arrivals if lo <= t < hi) / args.window, 2
+                ),
+                "active_respondents": max(active, default=0),
+                "requests_per_s": round(len(values) / args.window, 2),
+                **summarise(values),
+            }
+            windows.append(window)
+            violated = window["count"] and (
+                window["p95_ms"] > args.slo_ms
+                or window["error_rate"] > args.max_error_rate
+            )
+            if violated and saturation is None:
+                saturation = window
+
+        return {
+            "config": {
+                k: v
+                for k, v in vars(args).items()
+                if k not in ("output", "transcripts")
+            },
+            "respondents": {
+                "arrived": len(arrivals),
+                "completed": self.finished,
+                "abandoned": self.abandoned,
+                "dropped": self.dropped,
+                "still_active": self.active,
+            },
+            "routes": per_route,
+            "windows": windows,
+            "saturation": saturation,
+        }
+
+
+def summarise(values: list) -> dict:
+    """Count, error rate and latency percentiles (ms) of [(seconds, error)]."""
+    if not values:
+        return {"count": 0, "errors": 0, "error_rate": 0.0}
+    ms = sorted(s * 1000 for s, _ in values)
+    errors = sum(1 for _, e in values if e)
+    q = quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "count": len(values),
+        "errors": errors,
+        "error_rate": round(errors / len(values), 4),
+        "p50_ms": round(q[49], 1),
+        "p95_ms": round(q[94], 1),
+        "p99_ms": round(q[98], 1),
+        "max_ms": round(ms[-1], 1),
+    }
+
+
+def print_report(report: dict):
+    r = report["respondents"]
+    print(
+        f"Respondents: {r['arrived']} arrived, {r['completed']} completed, "
+        f"{r['abandoned']} abandoned, {r['dropped']} dropped (max. active reached)"
+    )
+    print(
+        f"\n{'route':<16} {'count':>6} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for route, s in sorted(report["routes"].items()):
+        print(
+            f"{route:<16} {s['count']:>6} {s['error_rate']:>7.1%} {s['p50_ms']:>9} "
+            f"{s['p95_ms']:>9} {s['p99_ms']:>9}"
+        )
+    print(
+        f"\n{'window s':>8} {'arrive/s':>9} {'active':>7} {'req/s':>7} "
+        f"{'errors':>7} {'p95 ms':>9}"
+    )
+    for w in report["windows"]:
+        print(
+            f"{w['start_s']:>8g} {w['arrivals_per_s']:>9} {w['active_respondents']:>7} "
+            f"{w['requests_per_s']:>7} {w['error_rate']:>7.1%} {w.get('p95_ms', '-'):>9}"
+        )
+    s = report["saturation"]
+    if s:
+        print(
+            f"\nSaturated from {s['start_s']:g} s: {s['active_respondents']} active "
+            f"respondents, {s['requests_per_s']} requests/s "
+            f"(p95 {s['p95_ms']} ms, {s['error_rate']:.1%} errors)"
+        )
+    else:
+        peak = max((w["active_respondents"] for w in report["windows"]), default=0)
+        print(f"\nNo saturation up to {peak} active respondents")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Offline load test with virtual respondents")
+    parser.add_argument("--interview-id", type=str, required=True)
+    parser.add_argument("--target", choices=list(TARGETS), default="flask")
+    parser.add_argument(
+        "--transcripts", nargs="+", default=[str(DEFAULT_TRANSCRIPT)], help="JSON files"
+    )
+    parser.add_argument("--duration", type=float, default=60, help="Arrival period (s)")
+    parser.add_argument(
+        "--arrival",
+        type=str,
+        default="ramp:start=0.2,end=2",
+        help="constant:rate=R, ramp:start=R0,end=R1 or step:rate=R,increment=I,every=S",
+    )
+    parser.add_argument(
+        "--think",
+        type=str,
+        default="recorded",
+        help="'recorded' (from message times) or a distribution, e.g. constant:seconds=5",
+    )
+    parser.add_argument("--think-scale", type=float, default=1.0)
+    parser.add_argument(
+        "--voice-share",
+        type=float,
+        default=0.0,
+        help="Share of answers sent as audio to transcribe_next",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=str,
+        default="lognormal:median=0.8,sigma=0.4",
+        help="Latency of the offline LLM",
+    )
+    parser.add_argument(
+        "--llm-base-url",
+        type=str,
+        default=None,
+        help="Use the OpenAI client against this URL (e.g. mock_llm_server.py) "
+        "instead of the in-process offline client",
+    )
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p95 latency SLO")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--window", type=float, default=10, help="Report window (s)")
+    parser.add_argument("--max-active", type=int, default=1000)
+    parser.add_argument(
+        "--drain", type=float, default=600, help="Max. seconds to wait for respondents"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Save report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.llm_base_url:
+        os.environ["OPENAI_BASE_URL"] = args.llm_base_url
+    else:
+        os.environ["LLM_BACKEND"] = "OFFLINE"
+        os.environ["OFFLINE_LLM_LATENCY"] = args.llm_latency
+    os.environ.setdefault("DATABASE", "MEMORY")
+
+    load_test = LoadTest(
+        target=TARGETS[args.target](),
+        interview_id=args.interview_id,
+        transcripts=load_transcripts(args.transcripts),
+        args=args,
+    )
+    report = load_test.run()
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
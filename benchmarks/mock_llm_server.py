@@ -0,0 +1,386 @@
+"""
+Local stand-in for the OpenAI API with programmable latency, errors and timeouts.
+
+Implements the endpoints used by the application:
+
+    POST /v1/responses                (also with "stream": true, as server-sent events)
+    POST /v1/moderations              (flags inputs matching --flag-pattern)
+    POST /v1/audio/transcriptions
+    GET  /v1/models/{model}
+    GET  /stats                       (request counts of this server)
+
+Point the application at it with the `OPENAI_BASE_URL` environment variable, e.g.
+
+    python benchmarks/mock_llm_server.py --port 8010 \\
+        --latency "*=lognormal:median=0.8,sigma=0.4" \\
+        --latency "gpt-4o-mini=bimodal:fast=0.5,slow=6,p_slow=0.1" \\
+        --error-rate 0.02 --timeout-rate 0.01
+
+    OPENAI_BASE_URL=http://127.0.0.1:8010/v1 python app/app.py
+
+Latencies are given per model as `<model>=<distribution>` (see
+`core.offline.LatencyModel`); `*` applies to models without an entry. The latency is
+the time to the first token: a streamed response then emits one token every
+`--token-interval-ms`. Injected errors answer with one of `--error-status` in the
+OpenAI error format (the SDK retries 429 and 5xx). Injected timeouts hold the
+request for `--hang-s` seconds, so that client-side timeouts and hedging kick in.
+"""
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from core.offline import LatencyModel  # noqa: E402
+from core.usage import estimate_tokens  # noqa: E402
+
+
+class MockBehaviour(object):
+    """Latency, failure and content settings shared by all request handlers."""
+
+    def __init__(
+        self,
+        latency: dict,
+        error_rate: float = 0.0,
+        error_status: tuple = (500,),
+        timeout_rate: float = 0.0,
+        hang_s: float = 120.0,
+        token_interval_s: float = 0.02,
+        reply: str = "Thank you for sharing. Could you tell me a bit more about that?",
+        transcription: str = "I try to put some money aside every month.",
+        flag_pattern: str = r"\[flag\]",
+        seed: int = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.token_interval_s = token_interval_s
+        self.reply = reply
+        self.transcription = transcription
+        self.flag_pattern = flag_pattern
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def draw(self, model: str):
+        """Return (outcome, latency) with outcome "ok", "error" or "timeout"."""
+        latency = self.latency.get(model) or self.latency.get("*") or LatencyModel()
+        with self.lock:
+            u = self.rng.random()
+            seconds = latency.sample(self.rng)
+        if u < self.timeout_rate:
+            return "timeout", self.hang_s
+        if u < self.timeout_rate + self.error_rate:
+            return "error", seconds
+        return "ok", seconds
+
+    def error_code(self) -> int:
+        with self.lock:
+            return self.rng.choice(self.error_status)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    behaviour: MockBehaviour = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    # ------------ Plumbing -------------#
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. the losing call of a hedged request
+            self.behaviour.count("client_disconnects")
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status: int, message: str):
+        self.send_json(
+            status,
+            {
+                "error": {
+                    "message": message,
+                    "type": "rate_limit_error" if status == 429 else "server_error",
+                    "param": None,
+                    "code": None,
+                }
+            },
+            headers={"Retry-After": "0"} if status == 429 else None,
+        )
+
+    def simulate(self, model: str, route: str) -> bool:
+        """Wait and possibly fail as configured. Returns False if already answered."""
+        outcome, seconds = self.behaviour.draw(model)
+        self.behaviour.count(f"{route}:{outcome}")
+        time.sleep(seconds)
+        if outcome == "timeout":
+            self.send_error_json(504, "Injected timeout")
+            return False
+        if outcome == "error":
+            status = self.behaviour.error_code()
+            self.send_error_json(status, f"Injected error {status}")
+            return False
+        return True
+
+    # ------------ Routes -------------#
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/models/(.+)", self.path)
+        if match:
+            self.behaviour.count("models")
+            return self.send_json(
+                200,
+                {
+                    "id": match.group(1),
+                    "object": "model",
+                    "created": 0,
+                    "owned_by": "mock",
+                },
+            )
+        if self.path == "/stats":
+            with self.behaviour.lock:
+                return self.send_json(200, dict(self.behaviour.stats))
+        self.send_error_json(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        if self.path == "/v1/responses":
+            return self.create_response()
+        if self.path == "/v1/moderations":
+            return self.create_moderation()
+        if self.path == "/v1/audio/transcriptions":
+            return self.create_transcription()
+        self.read_body()
+        self.send_error_json(404, f"Unknown path {self.path}")
+
+    def create_response(self):
+        request = json.loads(self.read_body() or b"{}")
+        model = request.get("model", "")
+        prompt = request.get("input", "")
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt)
+        stream = request.get("stream", False)
+        route = "responses_stream" if stream else "responses"
+        if not self.simulate(model, route):
+            return
+
+        words = self.behaviour.reply.split(" ")
+        words = words[: request.get("max_output_tokens") or len(words)]
+        text = " ".join(words)
+        response = response_object(model, prompt, text)
+        if not stream:
+            return self.send_json(200, response)
+
+        # Server-sent events, one word per output_text delta
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        item_id = response["output"][0]["id"]
+        sequence = iter(range(10**9))
+        in_progress = {**response, "status": "in_progress", "output": [], "usage": None}
+        self.send_event("response.created", {"response": in_progress}, sequence)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.behaviour.token_interval_s)
+            self.send_event(
+                "response.output_text.delta",
+                {
+                    "item_id": item_id,
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": word if i == 0 else f" {word}",
+                    "logprobs": [],
+                },
+                sequence,
+            )
+        self.send_event(
+            "response.output_text.done",
+            {
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "text": text,
+                "logprobs": [],
+            },
+            sequence,
+        )
+        self.send_event("response.completed", {"response": response}, sequence)
+
+    def send_event(self, kind: str, data: dict, sequence):
+        data = {"type": kind, "sequence_number": next(sequence), **data}
+        self.wfile.write(f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def create_moderation(self):
+        request = json.loads(self.read_body() or b"{}")
+        model = request.get("model", "omni-moderation-latest")
+        text = request.get("input", "")
+        if not isinstance(text, str):
+            text = json.dumps(text)
+        if not self.simulate(model, "moderations"):
+            return
+        flagged = bool(
+            self.behaviour.flag_pattern and re.search(self.behaviour.flag_pattern, text)
+        )
+        self.send_json(
+            200,
+            {
+                "id": f"modr-{uuid.uuid4().hex}",
+                "model": model,
+                "results": [
+                    {
+                        "flagged": flagged,
+                        "categories": {"harassment": flagged, "violence": False},
+                        "category_scores": {
+                            "harassment": 0.9 if flagged else 0.01,
+                            "violence": 0.01,
+                        },
+                    }
+                ],
+            },
+        )
+
+    def create_transcription(self):
+        body = self.read_body()
+        # Multipart form: only the model field is of interest here
+        match = re.search(rb'name="model"\r\n\r\n([^\r]*)\r\n', body)
+        model = match.group(1).decode() if match else "whisper-1"
+        if self.simulate(model, "transcriptions"):
+            self.send_json(200, {"text": self.behaviour.transcription})
+
+
+def response_object(model: str, prompt: str, text: str) -> dict:
+    """Minimal Responses API object that the OpenAI SDK can parse."""
+    input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+    return {
+        "id": f"resp_mock_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_mock_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def parse_latencies(specs: list) -> dict:
+    """Parse ["<model>=<distribution>", ...] into {model: LatencyModel}."""
+    latency = {}
+    for spec in specs:
+        model, _, distribution = spec.partition("=")
+        if not distribution:
+            model, distribution = "*", spec
+        latency[model] = LatencyModel.parse(distribution)
+    return latency
+
+
+def serve(behaviour: MockBehaviour, host: str = "127.0.0.1", port: int = 8010):
+    """Create (but do not start) the mock server; call `serve_forever()` on it."""
+    handler = type("Handler", (MockHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Mock OpenAI API for offline performance work")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        help="<model>=<distribution>, repeatable; '*' for all other models",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--error-status",
+        type=str,
+        default="500,429,503",
+        help="Comma-separated HTTP status codes of injected errors",
+    )
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--hang-s", type=float, default=120, help="Duration of injected timeouts"
+    )
+    parser.add_argument("--token-interval-ms", type=float, default=20)
+    parser.add_argument("--reply", type=str, default=None)
+    parser.add_argument(
+        "--flag-pattern",
+        type=str,
+        default=r"\[flag\]",
+        help="Regex of the inputs that moderation flags",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    behaviour = MockBehaviour(
+        latency=parse_latencies(args.latency or ["*=lognormal:median=0.8,sigma=0.4"]),
+        error_rate=args.error_rate,
+        error_status=tuple(int(s) for s in args.error_status.split(",")),
+        timeout_rate=args.timeout_rate,
+        hang_s=args.hang_s,
+        token_interval_s=args.token_interval_ms / 1000,
+        flag_pattern=args.flag_pattern,
+        seed=args.seed,
+        **({"reply": args.reply} if args.reply else {}),
+    )
+    server = serve(behaviour, args.host, args.port)
+    logging.info(
+        f"Mock OpenAI API on http://{args.host}:{args.port}/v1 "
+        f"(latency {behaviour.latency}, errors {args.error_rate:.1%}, "
+        f"timeouts {args.timeout_rate:.1%})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
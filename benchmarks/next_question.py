@@ -0,0 +1,264 @@
+"""
+End-to-end benchmark of `logic.next_question`, the hot path of every interview turn.
+
+Drives full turns (session load, prompt build, LLM call, fallback check, writes)
+against offline stand-ins: an in-memory or file database and a fake AsyncOpenAI
+client with configurable latency. For every storage backend and history length it
+reports throughput, latency percentiles, per-stage medians and the peak memory
+allocated per turn (tracemalloc).
+
+Results can be saved as a JSON baseline and compared against a previous baseline,
+so that regressions in prompt building or persistence show up as numbers:
+
+    python benchmarks/next_question.py --output bench.json
+    python benchmarks/next_question.py --baseline bench.json --tolerance 0.2
+
+The default LLM latency is zero so that only the application's own overhead is
+measured; use e.g. `--latency lognormal:median=0.8,sigma=0.4` for realistic turns.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median, quantiles
+import copy
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+# FileWriter reads its directory at import time
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-sessions-"))
+
+from core import logic  # noqa: E402
+from core.agent import LLMAgent  # noqa: E402
+from core.manager import InterviewManager  # noqa: E402
+from core.metrics import StageTimer  # noqa: E402
+from core.offline import FakeAsyncOpenAI  # noqa: E402
+from database.file import FileWriter  # noqa: E402
+from database.memory import InMemoryDB  # noqa: E402
+
+INTERVIEW_ID = "BENCHMARK"
+SESSION_ID = "BENCHMARK-SESSION"
+
+QUESTION = (
+    "It sounds like meal-prepping helped you save in the past. Thinking about times "
+    "when saving didn't happen, what negative experiences or obstacles tended to block "
+    "your saving efforts?"
+)
+ANSWER = (
+    "When I get stressed, I just consume more to make me happy. Also, my past employer "
+    "had an automatic retirement savings plan, which my current employer does not have."
+)
+
+BACKENDS = {"memory": InMemoryDB, "file": FileWriter}
+
+
+def benchmark_parameters() -> dict:
+    """One-step interview plan that loops forever, so sessions never end."""
+    return {
+        INTERVIEW_ID: {
+            "first_question": QUESTION,
+            "first_ai_question_name": "loop",
+            "global_mi_system_prompt": "You are a motivational interviewing counselor.",
+            "interview_plan": [
+                {
+                    "question_name": "loop",
+                    "system": "Reflect on the answer and ask one follow-up question.",
+                    "next_question": "loop",
+                    "fallback_regex": r"(?i)as an ai",
+                    "fallback_phrase": "Could you tell me more about that?",
+                    "hedge_delay_s": 2.0,
+                }
+            ],
+        }
+    }
+
+
+def seed_session(db, parameters: dict, history_length: int):
+    """Write a session with `history_length` messages and return it as stored."""
+    if db.load_remote_session(SESSION_ID):  # Left by a previous configuration
+        db.delete_remote_session(SESSION_ID)
+    manager = InterviewManager(db=db, session_id=SESSION_ID)
+    manager.begin_session(parameters=parameters)
+    manager.add_chat_to_session(QUESTION, type="question")
+    for i in range(1, history_length):
+        manager.add_chat_to_session(
+            ANSWER if i % 2 else QUESTION, type="answer" if i % 2 else "question"
+        )
+    # Sessions always end on a question before the respondent answers
+    if manager.history[-1].type != "question":
+        manager.add_chat_to_session(QUESTION, type="question")
+    seeded = db.load_remote_session(SESSION_ID)
+    # Restored with unconditional writes (over whatever version the turns wrote)
+    seeded.pop("version", None)
+    return seeded
+
+
+def run_turn(db, agent, parameters: dict) -> StageTimer:
+    timer = StageTimer()
+    logic.next_question(
+        session_id=SESSION_ID,
+        interview_id=INTERVIEW_ID,
+        db=db,
+        agent=agent,
+        interview_parameters=parameters,
+        user_message=ANSWER,
+        timer=timer,
+    )
+    return timer
+
+
+def percentile(values: list, q: int) -> float:
+    """q-th percentile (1..99) of `values`."""
+    if len(values) < 2:
+        return values[0]
+    return quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def bench_config(backend: str, history_length: int, turns: int, latency: str) -> dict:
+    db = BACKENDS[backend]()
+    agent = LLMAgent(openai_client=FakeAsyncOpenAI(latency=latency, seed=0))
+    parameters = benchmark_parameters()
+    seeded = seed_session(db, parameters[INTERVIEW_ID], history_length)
+
+    def restore():
+        db.update_remote_session(SESSION_ID, copy.deepcopy(seeded))
+
+    # Warm-up turn (imports, regex compilation, first event loop)
+    restore()
+    run_turn(db, agent, parameters)
+
+    durations, stages = [], {}
+    for _ in range(turns):
+        restore()
+        timer = run_turn(db, agent, parameters)
+        durations.append(timer.total())
+        for name, seconds in timer.stages:
+            stages.setdefault(name, []).append(seconds)
+
+    # Separate pass for allocations, tracemalloc slows everything down
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(turns, 20)):
+        restore()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        run_turn(db, agent, parameters)
+        peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    tracemalloc.stop()
+
+    ms = [d * 1000 for d in durations]
+    return {
+        "backend": backend,
+        "history_length": history_length,
+        "turns": turns,
+        "throughput_per_s": round(turns / sum(durations), 1),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "peak_alloc_kib_per_turn": round(median(peaks) / 1024, 1),
+        "stages_p50_ms": {
+            name: round(median(values) * 1000, 3) for name, values in stages.items()
+        },
+    }
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions of p50 latency and allocations."""
+    previous = {
+        (r["backend"], r["history_length"]): r for r in baseline.get("results", [])
+    }
+    regressions = []
+    for r in results:
+        before = previous.get((r["backend"], r["history_length"]))
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_alloc_kib_per_turn"):
+            if before[metric] and r[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{r['backend']}/{r['history_length']}: {metric} "
+                    f"{before[metric]} -> {r[metric]} "
+                    f"(+{(r[metric] / before[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def print_report(results: list):
+    print(
+        f"{'backend':<8} {'history':>7} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'alloc KiB':>10}  slowest stages (p50 ms)"
+    )
+    for r in results:
+        slowest = sorted(r["stages_p50_ms"].items(), key=lambda x: -x[1])[:3]
+        print(
+            f"{r['backend']:<8} {r['history_length']:>7} {r['throughput_per_s']:>9} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+            f"{r['peak_alloc_kib_per_turn']:>10}  "
+            + ", ".join(f"{name} {ms}" for name, ms in slowest)
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Benchmark next_question with offline stand-ins"
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        nargs="+",
+        default=[1, 10, 50, 100, 200],
+        help="Number of messages already in the session",
+    )
+    parser.add_argument(
+        "--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS)
+    )
+    parser.add_argument(
+        "--turns", type=int, default=50, help="Measured turns per config"
+    )
+    parser.add_argument(
+        "--latency",
+        type=str,
+        default="constant:seconds=0",
+        help="Fake LLM latency, e.g. lognormal:median=0.8,sigma=0.4",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Save results as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON to compare to")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed relative slowdown"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends:
+        for history_length in args.history:
+            results.append(
+                bench_config(backend, history_length, args.turns, args.latency)
+            )
+    print_report(results)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "turns": args.turns,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
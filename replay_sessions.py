@@ -0,0 +1,304 @@
+"""
+Replay recorded interview sessions against a new interview plan.
+
+The answers of every recorded session are fed, in their original order, through the
+interview logic of the app with the new parameters: each turn builds the prompt with
+`fill_prompt_with_interview_v002` and generates the next question with the same LLM
+call as `/next` (hedged, or first-valid for steps with `candidates`). Sessions are
+replayed concurrently, at most `--concurrency` at a time.
+
+Recorded sessions are read from `FileWriter` files (one session file or a directory
+such as `app/data`) or from an export of `aws_retrieve.py` or `/retrieve` (see
+`analyze_sessions.load_rows`). Sessions whose interview has no plan in the new
+parameters are skipped.
+
+    python replay_sessions.py app/data --parameters new_parameters.py --output replay.json
+    LLM_BACKEND=OFFLINE python replay_sessions.py chats.csv --parameters new_parameters.py
+
+The output holds the new transcripts next to the original ones (`--transcripts`,
+one JSON line per session) and per step the latency percentiles, output tokens and
+fallback rates of the original and replayed questions, with their deltas (replay minus
+original). The token usage of the replayed questions is the usage record of their turn
+(see `core.usage`), and each transcript holds the `usage_total` of its replay. The
+output tokens of the original questions are estimated from their length (~4
+characters per token), and their prompt tokens are unknown.
+As in `/next`, a flagged answer repeats its step. A replayed session ends when its
+recorded answers run out, its new plan reaches `last_question` or it is terminated,
+whichever comes first.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from glob import glob
+import json
+import os
+from pathlib import Path
+import sys
+
+import pandas as pd
+
+# Modules of the app import each other as top-level packages (`core`, `database`)
+sys.path.append(str(Path(__file__).resolve().parent / "app"))
+
+from analyze_sessions import (  # noqa: E402
+    COLUMNS,
+    fallback_rates,
+    load_parameters,
+    load_rows,
+    prepare,
+)
+from core.agent import connect_to_llm  # noqa: E402
+from core.manager import InterviewManager  # noqa: E402
+from core.metrics import StageTimer  # noqa: E402
+from core.session import to_document, to_rows  # noqa: E402
+from core.usage import estimate_tokens  # noqa: E402
+from database.memory import InMemoryDB  # noqa: E402
+
+# Step at which the app ends an interview (see core.logic.next_question)
+LAST_STEP = "last_question"
+# Metrics compared per step (columns of `step_summary`)
+METRICS = ["latency_p50_s", "latency_p95_s", "output_tokens", "fallback_rate"]
+
+
+def load_sessions(path: str) -> pd.DataFrame:
+    """Rows of recorded sessions: FileWriter file(s) or an export (CSV, Parquet, JSON)."""
+    if os.path.isdir(path):
+        files = sorted(glob(os.path.join(path, "*.json")))
+    else:
+        files = [path] if path.endswith(".json") else []
+    if not files:
+        return load_rows(path)
+
+    rows = []
+    for file in files:
+        with open(file) as f:
+            # A session document, a legacy session or a list of exported rows
+            rows.extend(to_rows(json.load(f)))
+    df = pd.DataFrame(rows)
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    return df[COLUMNS]
+
+
+async def replay_session(
+    agent, parameters: dict, session: pd.DataFrame, semaphore: asyncio.Semaphore
+) -> dict:
+    """
+    Replay the answers of one recorded session (prepared rows, see
+    `analyze_sessions.prepare`) with the interview plan `parameters`. Errors are
+    recorded, not raised.
+    """
+    session_id = session["session_id"].iloc[0]
+    interview_id = session["interview_id"].iloc[0]
+    answers = session.loc[session["type"] == "answer", "content"].fillna("").tolist()
+    usage, error = {}, None
+
+    async with semaphore:
+        manager = InterviewManager(db=InMemoryDB(), session_id=session_id)
+        manager.begin_session(parameters=parameters, interview_id=interview_id)
+        manager.add_chat_to_session(parameters["first_question"], type="question")
+        for answer in answers:
+            step = manager.current_state["question_name"]
+            if not step or step == LAST_STEP or manager.current_state["terminated"]:
+                break
+            manager.timer = StageTimer()
+            manager.flagged = False
+            manager.add_chat_to_session(message=answer, type="answer")
+            try:
+                question = await agent.execute_query_v002_async(manager)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            manager.add_chat_to_session(message=question, type="question")
+            manager.set_stage_timings(manager.timer.as_ms())
+            # As in /next, a flagged answer repeats the step
+            if not manager.flagged:
+                manager.update_parameters_after_question(question_name=step)
+            # Usage record of the turn (see core.usage.TurnUsage), stored on the question
+            record = manager.history[-1].usage or {}
+            usage[manager.history[-1].order] = {
+                "prompt_tokens": record.get("input_tokens"),
+                "output_tokens": record.get("output_tokens"),
+            }
+
+    rows = to_rows(to_document(manager.current_state, manager.history))
+    for row in rows:
+        row.update(usage.get(row["order"], {}))
+    return {
+        "session_id": session_id,
+        "error": error,
+        "rows": rows,
+        "usage_total": manager.current_state.get("usage_total"),
+    }
+
+
+async def replay_all(
+    agent, parameters: dict, original: pd.DataFrame, concurrency: int = 10
+) -> list:
+    """Replay every session of the prepared rows `original` that has a new plan."""
+    semaphore = asyncio.Semaphore(concurrency)
+    sessions = [
+        session
+        for _, session in original.groupby("session_id", sort=False)
+        if session["interview_id"].iloc[0] in parameters
+    ]
+    return await asyncio.gather(
+        *(
+            replay_session(agent, parameters[s["interview_id"].iloc[0]], s, semaphore)
+            for s in sessions
+        )
+    )
+
+
+def step_summary(df: pd.DataFrame, parameters: dict) -> pd.DataFrame:
+    """Latency, output tokens and fallback rate of the generated questions per step."""
+    questions = df[df["generated"]]
+    grouped = questions.groupby(["interview_id", "step"])
+    table = pd.DataFrame(
+        {
+            "questions": grouped.size(),
+            "latency_p50_s": grouped["latency_s"].median(),
+            "latency_p95_s": grouped["latency_s"].quantile(0.95),
+            "output_tokens": grouped["output_tokens"].mean(),
+            "prompt_tokens": grouped["prompt_tokens"].mean(),
+        }
+    )
+    table["fallback_rate"] = fallback_rates(df, parameters)["rate"]
+    return table
+
+
+def compare(original: pd.DataFrame, replay: pd.DataFrame) -> pd.DataFrame:
+    """Step summaries side by side, with the delta (replay - original) per metric."""
+    table = original.join(replay, how="outer", lsuffix="_original", rsuffix="_replay")
+    for metric in METRICS:
+        table[f"{metric}_delta"] = (
+            table[f"{metric}_replay"] - table[f"{metric}_original"]
+        )
+    return table
+
+
+def side_by_side(original: pd.DataFrame, replay: pd.DataFrame) -> list:
+    """Per recorded answer, the question that followed it originally and in the replay."""
+    turns = {}
+    for name, df in (("original", original), ("replay", replay)):
+        questions = df[df["generated"]]
+        answers = df.loc[df["type"] == "answer", "content"].tolist()
+        for i, (_, question) in enumerate(questions.iterrows()):
+            turn = turns.setdefault(
+                i, {"answer": answers[i] if i < len(answers) else None}
+            )
+            turn[name] = {
+                "step": question["step"],
+                "question": question["content"],
+                "latency_s": (
+                    None if pd.isna(question["latency_s"]) else question["latency_s"]
+                ),
+            }
+    return [turns[i] for i in sorted(turns)]
+
+
+def run(
+    original: pd.DataFrame,
+    parameters: dict,
+    baseline_parameters: dict = None,
+    agent=None,
+    concurrency: int = 10,
+) -> tuple:
+    """
+    Replay prepared rows with the plans `parameters`; return (transcripts, comparison).
+    Fallbacks of the original questions are detected with `baseline_parameters` (the
+    plans the sessions were recorded with), or else with the new plans.
+    """
+    if agent is None:
+        agent = connect_to_llm()
+    results = asyncio.run(replay_all(agent, parameters, original, concurrency))
+
+    rows = [row for result in results for row in result["rows"]]
+    replay = prepare(
+        pd.DataFrame(rows, columns=COLUMNS + ["output_tokens", "prompt_tokens"])
+    )
+    replayed = original[original["session_id"].isin(replay["session_id"])].copy()
+    replayed["output_tokens"] = replayed["content"].fillna("").map(estimate_tokens)
+    replayed["prompt_tokens"] = float("nan")  # not known for recorded questions
+
+    transcripts = []
+    for result in results:
+        session_id = result["session_id"]
+        transcripts.append(
+            {
+                "session_id": session_id,
+                "interview_id": replayed.loc[
+                    replayed["session_id"] == session_id, "interview_id"
+                ].iloc[0],
+                "error": result["error"],
+                "usage_total": result["usage_total"],
+                "turns": side_by_side(
+                    replayed[replayed["session_id"] == session_id],
+                    replay[replay["session_id"] == session_id],
+                ),
+            }
+        )
+    comparison = compare(
+        step_summary(replayed, baseline_parameters or parameters),
+        step_summary(replay, parameters),
+    )
+    return transcripts, comparison
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replay recorded sessions with a new plan")
+    parser.add_argument("path", help="Session file(s) of FileWriter or an export")
+    parser.add_argument(
+        "--parameters",
+        type=str,
+        required=True,
+        help="New interview parameters (e.g. app/parameters.py or JSON)",
+    )
+    parameters_help = "Parameters the sessions were recorded with (fallback phrases)"
+    parser.add_argument(
+        "--baseline-parameters", type=str, default=None, help=parameters_help
+    )
+    parser.add_argument(
+        "--interview_id",
+        type=str,
+        default=None,
+        help="Interview of rows exported without an interview_id",
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=None, help="Replay N sessions")
+    parser.add_argument("--output", type=str, default=None, help="Save deltas as JSON")
+    parser.add_argument(
+        "--transcripts", type=str, default=None, help="Save transcripts as JSON lines"
+    )
+    args = parser.parse_args()
+
+    original = prepare(load_sessions(args.path), args.interview_id)
+    if args.limit:
+        keep = original["session_id"].drop_duplicates().head(args.limit)
+        original = original[original["session_id"].isin(keep)]
+    baseline = args.baseline_parameters
+    transcripts, comparison = run(
+        original,
+        load_parameters(args.parameters),
+        load_parameters(baseline) if baseline else None,
+        concurrency=args.concurrency,
+    )
+
+    errors = sum(1 for t in transcripts if t["error"])
+    print(f"Replayed {len(transcripts)} sessions ({errors} failed)")
+    # Deltas only; the full comparison is saved with --output
+    columns = ["questions_original", "questions_replay"]
+    columns += [f"{metric}_delta" for metric in METRICS]
+    print(comparison[columns].to_string(float_format=lambda x: f"{x:.3f}"))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                json.loads(comparison.reset_index().to_json(orient="records")),
+                f,
+                indent=2,
+            )
+    if args.transcripts:
+        with open(args.transcripts, "w") as f:
+            for transcript in transcripts:
+                f.write(json.dumps(transcript, ensure_ascii=False, default=str) + "\n")
@@ -1,8 +1,15 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+import asyncio
 import re
-from typing import Optional, Tuple, Dict, Any, Callable, List
+import time
+from typing import Awaitable, Optional, Tuple, Dict, Any, Callable, List
 from agent.helper import _extract_content, _render
 
+OPENING_QUESTION = (
+    "I’m interested in your experiences with saving money. "
+    "Could you tell me about your current savings habits?"
+)
+
 
 # ---- tiny engine (no validators, no LLM) ----
 
@@ -18,10 +25,7 @@ def run_flow(
     ctx.setdefault("history", [])
 
     # --- Step 1: hardcoded opening ---
-    q1 = (
-        "I’m interested in your experiences with saving money. "
-        "Could you tell me about your current savings habits?"
-    )
+    q1 = OPENING_QUESTION
     print(f"\nASSISTANT: {q1}")
     ctx["history"].append({"role": "assistant", "content": q1})
     u1 = get_user_reply(q1)
@@ -54,6 +58,54 @@ def run_flow(
     return ctx
 
 
+# ---- async engine (simulations, see simulate.py) ----
+
+
+async def run_flow_async(
+    *,
+    client: AsyncOpenAI,
+    steps: List[Dict[str, Any]],
+    get_user_reply: Callable[[str], Awaitable[str]],
+    ctx: Optional[Dict[str, Any]] = None,
+    max_turns: int = 50,
+) -> Dict[str, Any]:
+    """
+    Async twin of `run_flow` without console output, so that many interviews can run
+    concurrently. `max_turns` guards against guides whose steps loop forever.
+    """
+    ctx = {} if ctx is None else ctx  # Kept by the caller, e.g. after a timeout
+    ctx.setdefault("history", [])
+
+    ctx["history"].append({"role": "assistant", "content": OPENING_QUESTION})
+    u1 = await get_user_reply(OPENING_QUESTION)
+    ctx["history"].append({"role": "user", "content": u1})
+    ctx["savings_habits"] = u1
+
+    names = [s["name"] for s in steps]
+    idx, turns = 0, 0
+    while idx is not None and turns < max_turns:
+        step = steps[idx]
+        assistant_text = await llm_step_async(
+            client=client,
+            model=step.get("model", "gpt-5-nano-2025-08-07"),
+            step=step,
+            ctx=ctx,
+        )
+        ctx["history"].append({"role": "assistant", "content": assistant_text})
+
+        user_text = await get_user_reply(assistant_text)
+        ctx["history"].append({"role": "user", "content": user_text})
+
+        if "on_user_reply" in step and step["on_user_reply"]:
+            step["on_user_reply"](user_text, ctx)
+
+        nxt = step.get("next", lambda _ctx: None)(ctx)
+        idx = names.index(nxt) if nxt else None
+        turns += 1
+
+    return ctx
+
+
 # ---- demo I/O ----
 def get_user_reply_cli(_prompt_to_user: str) -> str:
     return input("YOU: ")
@@ -74,19 +126,7 @@ def llm_step(
     Reusable function: builds messages from the step spec (system+developer) + history,
     calls the old chat.completions API, and returns the assistant's text.
     """
-    system_txt = _render(step.get("system", ""), ctx)
-    dev_txt = _render(step.get("developer", ""), ctx)
-
-    messages = [
-        {
-            "role": "system",
-            "content": f"Past Interview History: \n {ctx.get('history', '')} \n------------------------------",
-        }
-    ]
-    if system_txt:
-        messages.append({"role": "system", "content": system_txt})
-    if dev_txt:
-        messages.append({"role": "developer", "content": dev_txt})
+    messages = _step_messages(step, ctx)
 
     if verbose:
         print("\n--- OpenAI Request ---")
@@ -105,7 +145,89 @@ def llm_step(
     print("\n--- OpenAI Response ---")
     print(resp)
 
-    # Validate Question if validator present
+    return _validate(draft, step, ctx)
+
+
+async def llm_step_async(
+    *,
+    client: AsyncOpenAI,
+    model: str,
+    step: Dict[str, Any],
+    ctx: Dict[str, Any],
+) -> str:
+    """
+    Async twin of `llm_step` without console output. Appends the latency and token
+    usage of the call to ctx["stats"].
+
+    Steps with a validator may ask for several drafts in one request (`candidates`,
+    capped by `candidate_token_budget` completion tokens) and use the first that
+    passes; the fallback is only used if none does, or if no answer arrives within
+    `candidate_budget_s` seconds.
+    """
+    max_tokens = step.get("max_completion_tokens", 300)
+    n = _candidate_count(step, max_tokens) if callable(step.get("validator")) else 1
+    start = time.perf_counter()
+    try:
+        resp = await asyncio.wait_for(
+            client.chat.completions.create(
+                model=model,
+                messages=_step_messages(step, ctx),
+                reasoning_effort="none",
+                max_completion_tokens=max_tokens,
+                **({"n": n} if n > 1 else {}),
+            ),
+            timeout=step.get("candidate_budget_s") if n > 1 else None,
+        )
+    except asyncio.TimeoutError:
+        resp = None
+    usage = getattr(resp, "usage", None)
+    ctx.setdefault("stats", []).append(
+        {
+            "step": step["name"],
+            "latency_s": time.perf_counter() - start,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "candidates": n,
+        }
+    )
+    if resp is None:
+        return _validate("", step, ctx)
+
+    drafts = [(choice.message.content or "") for choice in resp.choices]
+    validator = step.get("validator")
+    valid = [d for d in drafts if not callable(validator) or validator(d)]
+    return _validate((valid or drafts or [""])[0], step, ctx)
+
+
+def _candidate_count(step: Dict[str, Any], max_tokens: int) -> int:
+    """`candidates` of a step, capped by its `candidate_token_budget` (if any)."""
+    n = int(step.get("candidates", 1))
+    budget = step.get("candidate_token_budget")
+    if budget:
+        n = min(n, max(1, int(budget) // max_tokens))
+    return max(1, n)
+
+
+def _step_messages(step: Dict[str, Any], ctx: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Messages of a step: the history so far, then its system and developer text."""
+    system_txt = _render(step.get("system", ""), ctx)
+    dev_txt = _render(step.get("developer", ""), ctx)
+
+    messages = [
+        {
+            "role": "system",
+            "content": f"Past Interview History: \n {ctx.get('history', '')} \n------------------------------",
+        }
+    ]
+    if system_txt:
+        messages.append({"role": "system", "content": system_txt})
+    if dev_txt:
+        messages.append({"role": "developer", "content": dev_txt})
+    return messages
+
+
+def _validate(draft: str, step: Dict[str, Any], ctx: Dict[str, Any]) -> str:
+    """Return the draft, or the step's fallback if its validator rejects the draft."""
     validator = step.get("validator")
     if callable(validator) and not validator(draft):
         fallback = step.get("fallback") or ""
@@ -0,0 +1,277 @@
+"""
+Simulate interviews of a guide (`STEPS`) with LLM-driven synthetic respondents.
+
+Each interview runs `run_flow_async` with a persona, played by a second LLM, in place
+of `get_user_reply_cli`. Interviews run concurrently (at most `--concurrency` at a
+time) through one async client. Transcripts are saved to `--out-dir` (one JSON file
+per interview). Latency, token and fallback totals per step are printed and saved
+as `report.json`.
+
+    python simulate.py --interviews 200 --concurrency 25
+    python simulate.py --guide interview_guide_simple --personas personas.json
+
+`--personas` is a JSON list of {"name": ..., "description": ...}; interviews cycle
+through the personas.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+import importlib
+import json
+import os
+from pathlib import Path
+from statistics import quantiles
+import sys
+import time
+from typing import Any, Dict, List
+
+# Guides import their helpers as top-level modules (as for main.py), llm.py as `agent.*`
+HERE = Path(__file__).resolve().parent
+sys.path[:0] = [str(HERE), str(HERE.parent)]
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from helper import _extract_content  # noqa: E402
+from llm import run_flow_async  # noqa: E402
+
+PERSONA_PROMPT = (
+    "You are taking part in a research interview about saving money.\n"
+    "Stay in character as the following person: {description}\n"
+    "Answer the interviewer's last question in one to three sentences, in plain "
+    "spoken language. Do not ask questions back and never mention that you are an AI."
+)
+
+PERSONAS = [
+    {
+        "name": "steady_saver",
+        "description": "A 45-year-old nurse who saves a fixed share of every paycheck "
+        "and is proud of it.",
+    },
+    {
+        "name": "struggling_parent",
+        "description": "A single parent of two with an irregular income who rarely "
+        "has money left at the end of the month.",
+    },
+    {
+        "name": "impulsive_spender",
+        "description": "A 24-year-old who enjoys going out, spends on impulse and "
+        "feels a bit guilty about it.",
+    },
+    {
+        "name": "skeptic",
+        "description": "A retired engineer who finds the questions intrusive and "
+        "answers briefly and somewhat dismissively.",
+    },
+    {
+        "name": "student",
+        "description": "A university student living on a small loan who would like "
+        "to save but does not know where to start.",
+    },
+]
+
+
+class Persona(object):
+    """Synthetic respondent: answers the interviewer's questions in character."""
+
+    def __init__(
+        self, client: AsyncOpenAI, model: str, description: str, max_tokens: int = 150
+    ):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.messages = [
+            {
+                "role": "system",
+                "content": PERSONA_PROMPT.format(description=description),
+            }
+        ]
+        self.stats = {
+            "calls": 0,
+            "latency_s": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    async def __call__(self, question: str) -> str:
+        """Reply to `question`; replaces `get_user_reply` of the flow."""
+        self.messages.append({"role": "user", "content": question})
+        start = time.perf_counter()
+        resp = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self.messages,
+            max_completion_tokens=self.max_tokens,
+        )
+        usage = getattr(resp, "usage", None)
+        self.stats["calls"] += 1
+        self.stats["latency_s"] += time.perf_counter() - start
+        self.stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        self.stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+        reply = (_extract_content(resp) or "").strip()
+        self.messages.append({"role": "assistant", "content": reply})
+        return reply
+
+
+async def simulate_interview(
+    index: int,
+    persona: Dict[str, str],
+    client: AsyncOpenAI,
+    steps: List[Dict[str, Any]],
+    semaphore: asyncio.Semaphore,
+    args,
+) -> Dict[str, Any]:
+    """Run one interview and save its transcript; errors are recorded, not raised."""
+    async with semaphore:
+        respondent = Persona(client, args.persona_model, persona["description"])
+        ctx, error = {}, None
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                run_flow_async(
+                    client=client, steps=steps, get_user_reply=respondent, ctx=ctx
+                ),
+                timeout=args.timeout,
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        duration = time.perf_counter() - start
+
+    record = {
+        "interview": index,
+        "persona": persona["name"],
+        "duration_s": round(duration, 3),
+        "error": error,
+        "history": ctx.get("history", []),
+        "flags": ctx.get("flags", {}),
+        "stats": ctx.get("stats", []),
+        "persona_stats": respondent.stats,
+    }
+    with open(os.path.join(args.out_dir, f"interview-{index:04d}.json"), "w") as f:
+        json.dump(record, f, indent=2, ensure_ascii=False)
+    return record
+
+
+def _percentile(values: list, q: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def summarise(records: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    """Per-step latency, tokens and fallbacks, and totals of all interviews."""
+    steps = {}
+    for record in records:
+        for call in record["stats"]:
+            step = steps.setdefault(
+                call["step"],
+                {"latencies": [], "prompt_tokens": 0, "completion_tokens": 0},
+            )
+            step["latencies"].append(call["latency_s"])
+            step["prompt_tokens"] += call["prompt_tokens"]
+            step["completion_tokens"] += call["completion_tokens"]
+        for flag, used in record["flags"].items():
+            if used and flag.endswith("_fallback_used"):
+                name = flag[: -len("_fallback_used")]
+                steps.setdefault(name, {"latencies": []})
+                steps[name]["fallbacks"] = steps[name].get("fallbacks", 0) + 1
+
+    per_step = {}
+    for name, step in steps.items():
+        latencies = step.pop("latencies")
+        per_step[name] = {
+            "calls": len(latencies),
+            "p50_s": round(_percentile(latencies, 50), 3) if latencies else None,
+            "p95_s": round(_percentile(latencies, 95), 3) if latencies else None,
+            "max_s": round(max(latencies), 3) if latencies else None,
+            "prompt_tokens": step.get("prompt_tokens", 0),
+            "completion_tokens": step.get("completion_tokens", 0),
+            "fallbacks": step.get("fallbacks", 0),
+        }
+    completed = [r for r in records if not r["error"]]
+    durations = [r["duration_s"] for r in completed]
+    return {
+        "interviews": len(records),
+        "errors": len(records) - len(completed),
+        "wall_s": round(wall_s, 2),
+        "interview_p50_s": round(_percentile(durations, 50), 2) if durations else None,
+        "interviewer_tokens": sum(
+            s["prompt_tokens"] + s["completion_tokens"] for s in per_step.values()
+        ),
+        "persona_tokens": sum(
+            r["persona_stats"]["prompt_tokens"]
+            + r["persona_stats"]["completion_tokens"]
+            for r in records
+        ),
+        "steps": per_step,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"{'step':<36} {'calls':>6} {'p50 s':>7} {'p95 s':>7} {'max s':>7} "
+        f"{'prompt tok':>11} {'compl. tok':>11} {'fallbacks':>9}"
+    )
+    for name, step in report["steps"].items():
+        print(
+            f"{name:<36} {step['calls']:>6} {step['p50_s'] or '-':>7} "
+            f"{step['p95_s'] or '-':>7} {step['max_s'] or '-':>7} "
+            f"{step['prompt_tokens']:>11} {step['completion_tokens']:>11} "
+            f"{step['fallbacks']:>9}"
+        )
+    print(
+        f"\n{report['interviews']} interviews ({report['errors']} failed) in "
+        f"{report['wall_s']} s; median interview {report['interview_p50_s']} s; "
+        f"tokens: {report['interviewer_tokens']} interviewer, "
+        f"{report['persona_tokens']} personas"
+    )
+
+
+async def main(args):
+    from config import OPENAI_API_KEY
+
+    steps = importlib.import_module(args.guide).STEPS
+    personas = PERSONAS
+    if args.personas:
+        with open(args.personas) as f:
+            personas = json.load(f)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY, base_url=args.base_url, max_retries=args.max_retries
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    start = time.perf_counter()
+    records = await asyncio.gather(
+        *(
+            simulate_interview(
+                i, personas[i % len(personas)], client, steps, semaphore, args
+            )
+            for i in range(args.interviews)
+        )
+    )
+    report = summarise(records, time.perf_counter() - start)
+    print_report(report)
+    with open(os.path.join(args.out_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Simulate interviews with synthetic respondents"
+    )
+    parser.add_argument("--interviews", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--guide", type=str, default="interview_guide", help="Module defining STEPS"
+    )
+    parser.add_argument("--personas", type=str, default=None, help="JSON personas")
+    parser.add_argument("--persona-model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--out-dir", type=str, default="simulations")
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="Seconds per interview"
+    )
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument(
+        "--base-url", type=str, default=None, help="OpenAI-compatible endpoint"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,215 @@
+"""
+Storage size and write-capacity report of the compressed session encodings.
+
+Reads the stored sessions of a DynamoDB table (`--table_name`) or of a directory of
+session files (`app/data`) and estimates, for the current encoding (DynamoDB map) and
+for each compressed encoding of `app/database/encoding.py` (`SESSION_ENCODING`):
+
+- the size of the item of every session, and how many come close to the 400 KB limit;
+- the write capacity units (WCU, one per started KB) that writing the session cost
+  over its life. Every turn rewrites the whole session, so this replays the writes:
+  one per question, of the session up to that question.
+
+    python storage_report.py --table_name interview-sessions --output storage.json
+    python storage_report.py app/data
+
+Item sizes follow DynamoDB's rules for attribute names and values; they are estimates
+within a few percent of what DynamoDB bills.
+"""
+
+from argparse import ArgumentParser
+import json
+import math
+import os
+import sys
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.database.codec import decode_session
+from app.database.encoding import CODECS, decode_payload, encode_payload, is_encoded
+
+# DynamoDB item size limit
+ITEM_LIMIT_BYTES = 400 * 1024
+# Items above this share of the limit are reported as close to it
+NEAR_LIMIT = 0.75
+# Attributes other than the session (see DynamoDB.update_remote_session)
+OTHER_ATTRIBUTES = {
+    "updated_at": 1_700_000_000_000,
+    "updated_day": "2025-01-01",
+    "expires_at": 1_700_000_000,
+    "version": 1,
+}
+PERCENTILES = [0.5, 0.95, 1.0]
+
+
+def value_size(value) -> int:
+    """Estimated size in bytes of a DynamoDB attribute value."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(Decimal(str(value)).normalize().as_tuple().digits)
+        return 1 + math.ceil(digits / 2)
+    if isinstance(value, dict):
+        return 3 + sum(
+            1 + len(str(k).encode("utf-8")) + value_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + value_size(v) for v in value)
+    return len(str(value).encode("utf-8"))
+
+
+def item_size(session_id: str, session_value) -> int:
+    """Estimated size of the table item of a session stored as `session_value`."""
+    item = {"session_id": session_id, "session": session_value, **OTHER_ATTRIBUTES}
+    return sum(len(name) + value_size(value) for name, value in item.items())
+
+
+def writes(session) -> Iterator:
+    """The session as written by every turn: up to each question (or message)."""
+    if isinstance(session, dict) and "turns" in session:
+        turns = session["turns"]
+        for i, turn in enumerate(turns):
+            if turn.get("type") == "question" or i == len(turns) - 1:
+                yield {**session, "turns": turns[: i + 1]}
+    else:
+        for i in range(len(session or [])):
+            yield session[: i + 1]
+
+
+def available_encodings() -> List[str]:
+    """ "map" (the current encoding) and the compressed encodings that can be used."""
+    encodings = ["map"]
+    for encoding in CODECS:
+        try:
+            encode_payload({}, encoding)
+        except ImportError:
+            print(f"Skipping {encoding}: package not installed", file=sys.stderr)
+            continue
+        encodings.append(encoding)
+    return encodings
+
+
+def session_sizes(
+    session_id: str, session, encodings: List[str]
+) -> Dict[str, Tuple[int, int]]:
+    """Per encoding, (size of the stored item, WCU of all writes of the session)."""
+    sizes = {}
+    for encoding in encodings:
+
+        def size(value):
+            stored = value if encoding == "map" else encode_payload(value, encoding)
+            return item_size(session_id, stored)
+
+        wcu = sum(math.ceil(size(written) / 1024) for written in writes(session))
+        sizes[encoding] = (size(session), wcu)
+    return sizes
+
+
+def _percentile(values: List[int], q: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0
+
+
+def build_report(sessions: Iterator[Tuple[str, object]], encodings: List[str]) -> dict:
+    """Size and WCU statistics per encoding, with the savings relative to "map"."""
+    sizes = {encoding: [] for encoding in encodings}
+    wcus = {encoding: 0 for encoding in encodings}
+    for session_id, session in sessions:
+        for encoding, (size, wcu) in session_sizes(
+            session_id, session, encodings
+        ).items():
+            sizes[encoding].append(size)
+            wcus[encoding] += wcu
+
+    report = {}
+    for encoding in encodings:
+        values = sizes[encoding]
+        report[encoding] = {
+            "sessions": len(values),
+            "total_kb": round(sum(values) / 1024, 1),
+            **{
+                f"item_kb_p{int(q * 100)}": round(_percentile(values, q) / 1024, 1)
+                for q in PERCENTILES
+            },
+            "near_limit": sum(v > NEAR_LIMIT * ITEM_LIMIT_BYTES for v in values),
+            "over_limit": sum(v > ITEM_LIMIT_BYTES for v in values),
+            "lifetime_wcu": wcus[encoding],
+        }
+    base = report["map"]
+    for encoding in encodings[1:]:
+        for key, saved in (("total_kb", "size_saving"), ("lifetime_wcu", "wcu_saving")):
+            report[encoding][saved] = (
+                round(1 - report[encoding][key] / base[key], 3) if base[key] else None
+            )
+    return report
+
+
+def table_sessions(
+    table_name: str, limit: Optional[int] = None
+) -> Iterator[Tuple[str, object]]:
+    """(session_id, session) of the items of a DynamoDB table, scanned page by page."""
+    from boto3 import resource
+
+    from aws_retrieve import scan_pages
+
+    count = 0
+    for page in scan_pages(resource("dynamodb").Table(table_name)):
+        for item in page:
+            if "session" not in item:
+                continue  # pointers of archived sessions
+            yield item["session_id"], decode_session(item["session"])
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def directory_sessions(
+    path: str, limit: Optional[int] = None
+) -> Iterator[Tuple[str, object]]:
+    """(session_id, session) of the session files of a directory (see FileWriter)."""
+    names = sorted(name for name in os.listdir(path) if name.endswith(".json"))
+    for name in names[:limit] if limit else names:
+        with open(os.path.join(path, name), "rb") as f:
+            data = f.read()
+        session = decode_payload(data) if is_encoded(data) else json.loads(data)
+        yield os.path.splitext(name)[0], session
+
+
+def to_text(report: dict) -> str:
+    keys = list(next(iter(report.values())))
+    for row in report.values():
+        keys += [key for key in row if key not in keys]
+    lines = [f"{'':<16}" + "".join(f"{encoding:>12}" for encoding in report)]
+    for key in keys:
+        cells = "".join(f"{str(row.get(key, '')):>12}" for row in report.values())
+        lines.append(f"{key:<16}{cells}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Size and WCU savings of compressed sessions")
+    parser.add_argument(
+        "path", nargs="?", default=None, help="Directory of session files (app/data)"
+    )
+    parser.add_argument("--table_name", type=str, default=None, help="DynamoDB table")
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Maximum number of sessions to read"
+    )
+    parser.add_argument("--output", type=str, default=None, help="Save as JSON")
+    args = parser.parse_args()
+    if not (args.path or args.table_name):
+        parser.error("give a directory of session files or --table_name")
+
+    sessions = (
+        table_sessions(args.table_name, args.limit)
+        if args.table_name
+        else directory_sessions(args.path, args.limit)
+    )
+    report = build_report(sessions, available_encodings())
+    print(to_text(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
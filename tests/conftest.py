@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The application imports its modules as `core.*` and `database.*`, from app/ (the
+# working directory of the Flask app and of the Lambda function). Tests import them
+# the same way, so that there is one copy of each module and of its state.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
@@ -0,0 +1,54 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from analyze_sessions import build_report, prepare
+
+
+# ------------Test report -------------#
+
+
+def test_report_attributes_questions_to_generating_step():
+    rows = [
+        # Every message stores the pointer to the next step when it was added
+        ("S1", 1, 100, "question", "How do you save?", "q1", 0),
+        ("S1", 2, 130, "answer", "I budget", "q1", 0),
+        ("S1", 3, 132, "question", "Tell me more?", "q2", 2.0),
+        ("S1", 4, 140, "answer", "Sure", "q2", 0),
+        ("S1", 5, 141, "question", "Why?", None, 1.0),
+    ]
+    df = pd.DataFrame(
+        rows,
+        columns=[
+            "session_id",
+            "order",
+            "time",
+            "type",
+            "content",
+            "question_name",
+            "open_ai_time",
+        ],
+    ).assign(interview_id="TEST", stage_ms=None)
+    parameters = {
+        "TEST": {
+            "interview_plan": [
+                {
+                    "question_name": "q1",
+                    "fallback_regex": "X",
+                    "fallback_phrase": "Tell me more?",
+                },
+                {"question_name": "q2", "fallback_regex": "X"},
+            ]
+        }
+    }
+
+    report = build_report(prepare(df), parameters)
+
+    latency = report["step_latency_s"]["p50"]
+    assert latency[("TEST", "q1")] == 2.0 and latency[("TEST", "q2")] == 1.0
+    assert report["fallback_rates"]["rate"].to_dict() == {
+        ("TEST", "q1"): 1.0,
+        ("TEST", "q2"): 0.0,
+    }
+    assert report["think_time_s"]["count"] == 2 and report["think_time_s"]["max"] == 30
+    assert report["duration_s"]["max"] == 41
@@ -0,0 +1,88 @@
+import gzip
+import json
+import time
+from types import SimpleNamespace
+
+from core.session import has_ended
+from database.archive import SessionArchive
+
+
+def _session(session_id, question_name="last_question"):
+    state = {"session_id": session_id, "question_name": question_name}
+    turns = [{"type": "question", "content": "How do you save?", "order": 0}]
+    return {"format": 2, "state": state, "turns": turns, "version": 3}
+
+
+# ------------Test the archive -------------#
+
+
+def test_archived_sessions_are_read_back(tmp_path):
+    archive = SessionArchive(str(tmp_path))
+    sessions = [("S1", _session("S1")), ("S2", _session("S2"))]
+
+    key = archive.write("2025-01-31", sessions)
+
+    assert key.startswith("date=2025-01-31/") and key.endswith(".jsonl.gz")
+    with gzip.open(tmp_path / key, "rt") as f:
+        assert [json.loads(line)["session_id"] for line in f] == ["S1", "S2"]
+    assert archive.load(key, "S2") == _session("S2")
+    assert archive.load(key, "S3") is None
+
+
+def test_only_ended_sessions_have_ended():
+    assert has_ended(_session("S1")["state"])
+    assert has_ended({"question_name": "q2", "terminated": True})
+    assert not has_ended(_session("S1", question_name="q2")["state"])
+
+
+# ------------Test archiving the table -------------#
+
+
+class FakeTable(object):
+    """The calls of aws_archive.archive_sessions on a DynamoDB table."""
+
+    class exceptions(object):
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+    def __init__(self, items):
+        self.items = {item["session_id"]: item for item in items}
+        self.meta = SimpleNamespace(client=SimpleNamespace(exceptions=self.exceptions))
+        self.conditions = {}
+
+    def scan(self, **_):
+        # The filter is left to archive_sessions, which checks every item again
+        return {"Items": list(self.items.values())}
+
+    def put_item(self, Item, ConditionExpression, **_):
+        self.conditions[Item["session_id"]] = ConditionExpression
+        self.items[Item["session_id"]] = Item
+
+
+def test_sessions_without_updated_at_are_archived(tmp_path, monkeypatch):
+    import aws_archive
+
+    old = _session("OLD")  # written before `updated_at` was recorded
+    old["turns"][0]["time"] = 1_600_000_000
+    recent = _session("NEW")
+    recent["turns"][0]["time"] = int(time.time())
+    stamped = {"session_id": "S1", "session": _session("S1"), "updated_at": 1}
+    table = FakeTable(
+        [
+            {"session_id": "OLD", "session": old},
+            {"session_id": "NEW", "session": recent},
+            {**stamped, "updated_day": "1970-01-01"},
+        ]
+    )
+    monkeypatch.setattr(
+        aws_archive, "resource", lambda _: SimpleNamespace(Table=lambda _: table)
+    )
+
+    assert aws_archive.archive_sessions("sessions", str(tmp_path)) == 2
+
+    assert "archive" in table.items["OLD"] and "session" in table.items["NEW"]
+    assert table.items["OLD"]["archive"].startswith("date=2020-09-13/")
+    assert table.conditions == {
+        "OLD": "attribute_not_exists(updated_at)",
+        "S1": "updated_at = :read",
+    }
@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.asynchronous_call import (
+    call_openai_moderation,
+    call_openai_responses_first_valid,
+    generate_unless_flagged,
+)
+from core.auxiliary import candidate_count, is_valid_answer
+
+STEP = {"fallback_regex": "(?i)as an ai", "fallback_phrase": "Could you say more?"}
+
+
+class ScriptedClient(object):
+    """Answers the n-th request with the n-th (delay, text) of the script."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.cancelled = 0
+        self.responses = SimpleNamespace(create=self.create)
+
+    async def create(self, **kwargs):
+        delay, text = self.script.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(output_text=text)
+
+
+def _first_valid(client, candidates=3, budget_s=1.0):
+    return asyncio.run(
+        call_openai_responses_first_valid(
+            client,
+            prompt="...",
+            is_valid=lambda text: is_valid_answer(text, STEP),
+            candidates=candidates,
+            budget_s=budget_s,
+        )
+    )
+
+
+# ------------Test first-valid candidates -------------#
+
+
+def test_first_valid_candidate_wins_and_cancels_the_rest():
+    client = ScriptedClient(
+        [(0.01, "As an AI, I cannot."), (0.05, "What helped you?"), (0.5, "Why?")]
+    )
+
+    text, _, _, _ = _first_valid(client)
+
+    assert text == "What helped you?"
+    assert client.cancelled == 1
+
+
+def test_invalid_candidates_and_latency_budget():
+    client = ScriptedClient([(0.01, "As an AI..."), (0.02, "as an AI model")])
+    assert _first_valid(client, candidates=2)[0] == "As an AI..."
+
+    with pytest.raises(asyncio.TimeoutError):
+        _first_valid(ScriptedClient([(0.5, "Why?")] * 2), candidates=2, budget_s=0.05)
+
+
+def test_candidate_count_is_capped_by_token_budget():
+    step = {"candidates": 4, "max_output_tokens": 200, "candidate_token_budget": 500}
+
+    assert candidate_count(step) == 2
+    assert candidate_count({}) == 1
+
+
+# ------------Test moderation -------------#
+
+
+def _moderated(client, message, generation_s=0.5):
+    async def generate():
+        return (await client.create(model="m", input=message)).output_text
+
+    client.script = [(generation_s, "Could you say more?")]
+    moderation = call_openai_moderation(client, message, timeout_s=1.0)
+    return asyncio.run(generate_unless_flagged(generate(), moderation))
+
+
+class ModeratedClient(ScriptedClient):
+    """Flags messages containing 'flag' after `moderation_s` seconds."""
+
+    def __init__(self, moderation_s=0.01, fail=False):
+        super().__init__([])
+        self.moderation_s, self.fail = moderation_s, fail
+        self.moderations = SimpleNamespace(create=self.moderate)
+
+    async def moderate(self, model, input):
+        await asyncio.sleep(self.moderation_s)
+        if self.fail:
+            raise RuntimeError("moderation unavailable")
+        flagged = "flag" in input
+        return SimpleNamespace(
+            results=[
+                SimpleNamespace(flagged=flagged, categories={"harassment": flagged})
+            ]
+        )
+
+
+def test_flagged_answer_cancels_the_generation():
+    client = ModeratedClient()
+
+    flagged, categories, result = _moderated(client, "flag this")
+
+    assert (flagged, categories, result) == (True, ["harassment"], None)
+    assert client.cancelled == 1
+
+
+def test_generation_is_kept_if_moderation_passes_or_fails():
+    assert _moderated(ModeratedClient(), "I save")[::2] == (
+        False,
+        "Could you say more?",
+    )
+    # Moderation failures do not stop the interview
+    failing = ModeratedClient(fail=True)
+    assert _moderated(failing, "flag this")[::2] == (False, "Could you say more?")
@@ -0,0 +1,40 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+from aws_retrieve import RowSpool, parquet_schema, write_parquet
+
+
+def _export(rows, output_dir, stored, part_name):
+    spool = RowSpool()
+    for row in rows:
+        spool.write(row)
+    schema_types = parquet_schema(spool.columns, stored)
+    write_parquet(iter(spool), output_dir, schema_types, part_name)
+    spool.close()
+    return schema_types
+
+
+# ------------Test incremental parts -------------#
+
+
+def test_incremental_parts_keep_the_stored_schema(tmp_path):
+    row = {"session_id": "S1", "interview_id": "TEST", "time": 1_700_000_000}
+    first = [
+        {**row, "order": 1, "open_ai_time": 1.5, "usage_total": {"cost_usd": 0.1}},
+    ]
+    # No question in this run: the columns of questions only have nulls
+    second = [{**row, "order": 2, "open_ai_time": None, "usage_total": None}]
+
+    stored = _export(first, str(tmp_path), None, "part-0.parquet")
+    assert _export(second, str(tmp_path), stored, "part-1.parquet") == stored
+
+    table = ds.dataset(str(tmp_path), format="parquet").to_table()
+    assert table.schema.field("open_ai_time").type == pa.float64()
+    assert sorted(table.column("order").to_pylist()) == [1, 2]
+
+
+def test_incompatible_values_raise():
+    with pytest.raises(ValueError):
+        parquet_schema({"order": {"float"}}, {"order": "int64"})
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from database.codec import decode_items, encode_session
+from database.encoding import encode_payload
+
+
+# ------------Test decoding -------------#
+
+
+def test_decode_items_follows_field_schema():
+    items = [
+        {
+            "session_id": "S1",
+            "session": {
+                "format": Decimal("2"),
+                "state": {"session_id": "S1", "open_ai_time": Decimal("2")},
+                "turns": [
+                    {
+                        "order": Decimal("3"),
+                        "type": "question",
+                        "open_ai_time": Decimal("1.734"),
+                        "stage_ms": {"llm_primary": Decimal("1712")},
+                    }
+                ],
+            },
+        }
+    ]
+
+    session = decode_items(items)[0]["session"]
+
+    assert session["format"] == 2 and type(session["format"]) is int
+    assert type(session["state"]["open_ai_time"]) is float
+    turn = session["turns"][0]
+    assert turn["order"] == 3 and type(turn["order"]) is int
+    assert turn["open_ai_time"] == 1.734
+    assert turn["stage_ms"] == {"llm_primary": 1712}
+
+
+# ------------Test encoding -------------#
+
+
+def test_encode_session_turns_floats_into_decimals():
+    session = {"state": {"open_ai_time": 0.25}, "turns": [{"order": 1, "time": 5}]}
+
+    encoded = encode_session(session)
+
+    assert encoded["state"]["open_ai_time"] == Decimal("0.25")
+    assert encoded["turns"] == [{"order": 1, "time": 5}]
+    assert session["state"]["open_ai_time"] == 0.25
+
+
+def test_compressed_sessions_are_decoded_transparently():
+    session = {
+        "format": 2,
+        "state": {"session_id": "S1", "open_ai_time": 0.25},
+        "turns": [
+            {"order": 1, "type": "question", "content": "How do you save? " * 50}
+        ],
+        "version": 4,
+    }
+
+    payload = encode_payload(session, "zlib")
+    items = [{"session_id": "S1", "session": payload}]
+
+    assert payload[:5] == b"MIS\x01\x01"
+    assert len(payload) < len(str(session)) / 4
+    assert decode_items(items)[0]["session"] == session
@@ -0,0 +1,57 @@
+import gzip
+import json
+
+from core import compression
+from core.compression import choose_encoding, encode_json, stream_json
+
+
+# ------------Test negotiation -------------#
+
+
+def test_encoding_follows_accept_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "_brotli", lambda: None)
+
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, *") is None
+    assert choose_encoding("*;q=0.5") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding(None) is None
+
+
+# ------------Test compressed bodies -------------#
+
+
+def test_only_bodies_above_the_threshold_are_compressed():
+    rows = [{"session_id": "S1", "order": i, "content": "I save."} for i in range(500)]
+
+    encoding, chunks = stream_json(rows, "gzip", min_bytes=1024)
+    body = b"".join(chunks)
+
+    assert encoding == "gzip"
+    assert json.loads(gzip.decompress(body)) == rows
+    assert len(body) < len(json.dumps(rows)) / 5
+    assert encode_json({"message": "Why?"}, "gzip", min_bytes=1024) == (
+        None,
+        b'{"message": "Why?"}',
+    )
+
+
+def test_threshold_counts_encoded_bytes(monkeypatch):
+    # Decided after min_bytes, not after a whole chunk
+    monkeypatch.setattr(compression, "CHUNK_BYTES", 1 << 30)
+    rows = ["Ersparnisse für später"] * 10
+
+    size = len(encode_json(rows, None)[1])  # bytes sent uncompressed
+    assert stream_json(rows, "gzip", min_bytes=size)[0] == "gzip"
+    assert stream_json(rows, "gzip", min_bytes=size + 1)[0] is None
+
+    parts = []
+
+    def counted(obj):
+        for part in compression.json.JSONEncoder().iterencode(obj):
+            parts.append(part)
+            yield part.encode("utf-8")
+
+    monkeypatch.setattr(compression, "_json_parts", counted)
+    stream_json(list(range(100_000)), "gzip", min_bytes=1024)
+    assert sum(len(p) for p in parts) < 2048
@@ -0,0 +1,96 @@
+import pytest
+
+from core.manager import InterviewManager
+from core.metrics import REGISTRY
+from database.errors import TurnConflictError
+from database.memory import InMemoryDB
+
+PARAMETERS = {"first_ai_question_name": "q1", "interview_plan": []}
+
+
+def _resumed(db, session_id):
+    manager = InterviewManager(db=db, session_id=session_id)
+    manager.resume_session(parameters=PARAMETERS)
+    return manager
+
+
+def _metric(name):
+    # As served by /metrics
+    for line in REGISTRY.render_prometheus().splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def _begun(db, session_id):
+    first = InterviewManager(db=db, session_id=session_id)
+    first.begin_session(parameters=PARAMETERS, interview_id="TEST")
+    first.add_chat_to_session("How do you save?", type="question")
+
+
+# ------------Test versioned writes -------------#
+
+
+def test_concurrent_state_writes_are_merged():
+    db = InMemoryDB()
+    _begun(db, "S1")
+
+    # Two requests read the same version of the session
+    one, two = _resumed(db, "S1"), _resumed(db, "S1")
+    one.add_chat_to_session("I budget.", type="answer")
+    one.set_usage(_usage(1.0))
+    one.update_session()
+    conflicts = _metric("session_write_conflicts_total")
+    # e.g. a background job that only changes the state
+    two.update_summary("Saves.")
+    two.set_usage(_usage(0.01))
+    two.current_state["flagged_messages"] += 1
+    two.update_session()
+
+    stored = db.load_remote_session("S1")
+    assert [(t["order"], t["content"]) for t in stored["turns"]] == [
+        (1, "How do you save?"),
+        (2, "I budget."),
+    ]
+    assert stored["state"]["summary"] == "Saves."
+    assert stored["state"]["flagged_messages"] == 1
+    assert stored["state"]["usage_total"]["cost_usd"] == pytest.approx(1.01)
+    assert stored["state"]["usage_total"]["turns"] == 2
+    assert _metric("session_write_conflicts_total") == conflicts + 1
+
+
+def test_concurrent_turns_keep_the_first():
+    db = InMemoryDB()
+    _begun(db, "S1")
+
+    one, two = _resumed(db, "S1"), _resumed(db, "S1")
+    one.add_chat_to_session("I budget.", type="answer")
+    one.add_chat_to_session("Why?", type="question")
+    turn_conflicts = _metric("session_turn_conflicts_total")
+    two.set_usage(_usage(0.5))
+    with pytest.raises(TurnConflictError):
+        two.add_chat_to_session("I don't.", type="answer")
+
+    stored = db.load_remote_session("S1")
+    # The answer of the second request is not interleaved with the first's turn
+    assert [t["content"] for t in stored["turns"]] == [
+        "How do you save?",
+        "I budget.",
+        "Why?",
+    ]
+    # but what it spent is counted
+    assert stored["state"]["usage_total"]["cost_usd"] == pytest.approx(0.5)
+    assert _metric("session_turn_conflicts_total") == turn_conflicts + 1
+
+
+def _usage(cost):
+    return {
+        "model": "gpt-4o-mini",
+        "input_tokens": 10,
+        "cached_tokens": 0,
+        "output_tokens": 5,
+        "cost_usd": cost,
+        "extra_cost_usd": 0.0,
+        "hedged": False,
+        "hedge_won": False,
+    }
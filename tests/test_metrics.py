@@ -0,0 +1,60 @@
+from core.metrics import StageTimer, MetricsRegistry
+
+
+# ------------Test StageTimer -------------#
+
+
+def test_stage_timer_as_ms_numbers_repeated_stages():
+    timer = StageTimer()
+    timer.record("session_load", 0.012)
+    timer.record("db_write", 0.0304)
+    timer.record("llm_primary", 1.5)
+    timer.record("db_write", 0.02)
+
+    assert timer.as_ms() == {
+        "session_load": 12,
+        "db_write": 30,
+        "llm_primary": 1500,
+        "db_write_2": 20,
+    }
+
+
+def test_stage_timer_server_timing_header():
+    timer = StageTimer()
+    timer.record("prompt_build", 0.0021)
+    timer.record("llm_hedge", 2.5)
+
+    header = timer.server_timing()
+
+    assert header.startswith("prompt_build;dur=2.1, llm_hedge;dur=2500.0, total;dur=")
+
+
+# ------------Test MetricsRegistry -------------#
+
+
+def test_render_prometheus_cumulative_buckets():
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.observe("stage_seconds", 0.05, stage="db_write")
+    registry.observe("stage_seconds", 0.1, stage="db_write")
+    registry.observe("stage_seconds", 3, stage="db_write")
+
+    expected = (
+        "# TYPE stage_seconds histogram\n"
+        'stage_seconds_bucket{stage="db_write",le="0.1"} 2\n'
+        'stage_seconds_bucket{stage="db_write",le="1.0"} 2\n'
+        'stage_seconds_bucket{stage="db_write",le="+Inf"} 3\n'
+        'stage_seconds_sum{stage="db_write"} 3.15\n'
+        'stage_seconds_count{stage="db_write"} 3\n'
+    )
+    assert registry.render_prometheus() == expected
+
+
+def test_render_prometheus_counters():
+    registry = MetricsRegistry()
+    registry.inc("session_write_conflicts_total")
+    registry.inc("session_write_conflicts_total", 2)
+
+    assert registry.render_prometheus() == (
+        "# TYPE session_write_conflicts_total counter\n"
+        "session_write_conflicts_total 3\n"
+    )
@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+from core.auxiliary import get_step_by_question_name
+from core.registry import ParameterRegistry, plans_for_session
+
+
+def _write(path, next_question="q2", regex="BAD", stamp=1_000_000_000):
+    plans = {
+        "TEST": {
+            "first_ai_question_name": "q1",
+            "interview_plan": [
+                {
+                    "question_name": "q1",
+                    "fallback_regex": regex,
+                    "next_question": next_question,
+                },
+                {"question_name": "q2", "next_question": "last_question"},
+                {"question_name": "last_question"},
+            ],
+        }
+    }
+    path.write_text(json.dumps(plans))
+    # Distinct modification times, as the registry compares them
+    os.utime(path, ns=(stamp, stamp))
+
+
+# ------------Test reloads -------------#
+
+
+def test_changed_file_replaces_the_current_version(tmp_path):
+    path = tmp_path / "parameters.json"
+    _write(path)
+    registry = ParameterRegistry(str(path), poll_s=0)
+    first = registry.version
+
+    assert registry["TEST"]["plan_version"] == first
+    assert get_step_by_question_name(registry["TEST"], "q1")["next_question"] == "q2"
+
+    _write(path, next_question="last_question", stamp=2_000_000_000)
+
+    assert (
+        get_step_by_question_name(registry["TEST"], "q1")["next_question"]
+        == "last_question"
+    )
+    assert registry.version != first
+    # Sessions begun with the first version continue with it
+    session = {"state": {"plan_version": first}}
+    assert plans_for_session(registry, "TEST", session)["plan_version"] == first
+    assert plans_for_session(registry, "TEST", {})["plan_version"] == registry.version
+
+
+def test_invalid_file_keeps_the_current_version(tmp_path):
+    path = tmp_path / "parameters.json"
+    _write(path)
+    registry = ParameterRegistry(str(path), poll_s=0)
+    first = registry.version
+
+    _write(path, regex="(unclosed", stamp=2_000_000_000)
+
+    assert registry["TEST"]["plan_version"] == first
+
+
+def test_invalid_first_version_raises(tmp_path):
+    path = tmp_path / "parameters.json"
+    _write(path, regex="(unclosed")
+
+    with pytest.raises(ValueError):
+        ParameterRegistry(str(path))
+
+
+# ------------Test saved versions -------------#
+
+
+def test_other_processes_load_a_version_they_do_not_hold(tmp_path):
+    path = tmp_path / "parameters.json"
+    _write(path)
+    first = ParameterRegistry(str(path), poll_s=0).version
+    _write(path, next_question="last_question", stamp=2_000_000_000)
+
+    # A new process (e.g. another Lambda container) only ever read the new version
+    registry = ParameterRegistry(str(path), poll_s=0)
+    assert registry.version != first
+
+    session = {"state": {"plan_version": first}}
+    plans = plans_for_session(registry, "TEST", session)
+    assert plans["plan_version"] == first
+    assert get_step_by_question_name(plans, "q1")["next_question"] == "q2"
+
+
+def test_unavailable_version_falls_back_loudly(tmp_path, caplog):
+    path = tmp_path / "parameters.json"
+    _write(path)
+    registry = ParameterRegistry(str(path), poll_s=0)
+
+    session = {"state": {"plan_version": "0123456789ab"}}
+    plans = plans_for_session(registry, "TEST", session)
+
+    assert plans["plan_version"] == registry.version
+    assert any(r.levelname == "ERROR" for r in caplog.records)
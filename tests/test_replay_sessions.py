@@ -0,0 +1,87 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from analyze_sessions import prepare
+from core.agent import LLMAgent
+from core.offline import FakeAsyncOpenAI
+from replay_sessions import run
+
+PARAMETERS = {
+    "TEST": {
+        "first_question": "How do you save?",
+        "first_ai_question_name": "q1",
+        "global_mi_system_prompt": "You are an interviewer.",
+        "interview_plan": [
+            {
+                "question_name": "q1",
+                "system": "Ask a follow-up.",
+                "next_question": "q2",
+                "fallback_regex": "(?i)as an ai",
+                "fallback_phrase": "Tell me more?",
+            },
+            {"question_name": "q2", "system": "Ask another.", "next_question": "q2"},
+        ],
+    }
+}
+
+
+# ------------Test replay -------------#
+
+
+def _original(rows):
+    return prepare(
+        pd.DataFrame(
+            rows,
+            columns=[
+                "session_id",
+                "order",
+                "type",
+                "content",
+                "question_name",
+                "open_ai_time",
+            ],
+        ).assign(interview_id="TEST", time=0, stage_ms=None)
+    )
+
+
+def test_replay_compares_new_questions_with_recorded_ones():
+    rows = [
+        ("S1", 1, "question", "How do you save?", "q1", 0),
+        ("S1", 2, "answer", "I budget", "q1", 0),
+        ("S1", 3, "question", "What helps?", "q2", 2.0),
+        ("S1", 4, "answer", "Lists", "q2", 0),
+        ("S1", 5, "question", "Why lists?", "q2", 4.0),
+    ]
+    original = _original(rows)
+    agent = LLMAgent(FakeAsyncOpenAI(latency="constant:seconds=0", reply="As an AI?"))
+
+    transcripts, comparison = run(original, PARAMETERS, agent=agent)
+
+    (transcript,) = transcripts
+    assert transcript["error"] is None
+    assert [turn["answer"] for turn in transcript["turns"]] == ["I budget", "Lists"]
+    assert transcript["turns"][0]["original"]["question"] == "What helps?"
+    assert transcript["turns"][0]["replay"]["question"] == "Tell me more?"
+    q1 = comparison.loc[("TEST", "q1")]
+    assert q1["fallback_rate_original"] == 0
+    assert q1["fallback_rate_delta"] == 1
+    assert q1["latency_p50_s_delta"] < 0
+    assert q1["prompt_tokens_replay"] > 0
+    assert transcript["usage_total"]["turns"] == 2
+
+
+def test_replay_repeats_the_step_of_a_flagged_answer():
+    rows = [
+        ("S1", 1, "question", "How do you save?", "q1", 0),
+        ("S1", 2, "answer", "[flag]", "q1", 0),
+        ("S1", 3, "question", "Please answer.", "q1", 1.0),
+        ("S1", 4, "answer", "I budget", "q1", 0),
+        ("S1", 5, "question", "What helps?", "q2", 2.0),
+    ]
+    agent = LLMAgent(FakeAsyncOpenAI(latency="constant:seconds=0"))
+
+    transcripts, _ = run(_original(rows), PARAMETERS, agent=agent)
+
+    steps = [turn["replay"]["step"] for turn in transcripts[0]["turns"]]
+    assert steps[0] == steps[1] == "q1"
@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+from core.session import Turn, from_document, to_document, to_rows
+
+
+# ------------Test Turn -------------#
+
+
+def test_turn_round_trip_leaves_out_unset_fields():
+    turn = Turn(order=2, time=1757408485, type="answer", content="Not really.")
+
+    assert turn.to_dict() == {
+        "order": 2,
+        "time": 1757408485,
+        "type": "answer",
+        "content": "Not really.",
+    }
+    assert Turn.from_dict(turn.to_dict()) == turn
+    assert turn.get("content") == "Not really."
+    assert turn.get("summary", "") == ""
+
+
+# ------------Test session documents -------------#
+
+
+def test_legacy_session_is_read_into_state_and_turns():
+    legacy = [
+        {
+            "session_id": "S1",
+            "summary": "",
+            "topic_idx": Decimal("1"),
+            "flagged_messages": Decimal("0"),
+            "terminated": False,
+            "question_name": "q1",
+            "open_ai_time": 0,
+            "order": Decimal("1"),
+            "time": Decimal("1757408482"),
+            "type": "question",
+            "content": "How do you save?",
+        }
+    ]
+
+    state, turns = from_document(legacy)
+
+    assert state == {
+        "session_id": "S1",
+        "summary": "",
+        "topic_idx": Decimal("1"),
+        "flagged_messages": Decimal("0"),
+        "terminated": False,
+        "question_name": "q1",
+    }
+    assert turns[0].order == 1 and turns[0].content == "How do you save?"
+    assert to_rows(legacy) == legacy
+
+
+def test_compact_session_emits_long_rows():
+    state = {"session_id": "S1", "summary": "", "question_name": "q2"}
+    turns = [
+        Turn(1, 100, "question", "How do you save?", "q1", open_ai_time=0),
+        Turn(2, 105, "answer", "I don't.", "q1"),
+    ]
+
+    rows = to_rows(to_document(state, turns))
+
+    assert rows == [
+        {
+            "session_id": "S1",
+            "summary": "",
+            "question_name": "q1",
+            "open_ai_time": 0,
+            "order": 1,
+            "time": 100,
+            "type": "question",
+            "content": "How do you save?",
+        },
+        {
+            "session_id": "S1",
+            "summary": "",
+            "question_name": "q1",
+            "open_ai_time": 0,
+            "order": 2,
+            "time": 105,
+            "type": "answer",
+            "content": "I don't.",
+        },
+    ]
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+from core import logic
+from core.logic import next_question, stored_reply
+from core.manager import InterviewManager
+from core.singleflight import SingleFlight
+from database.memory import InMemoryDB
+
+
+# ------------Test SingleFlight -------------#
+
+
+def test_concurrent_duplicates_share_one_call():
+    flights, calls, results = SingleFlight(ttl_s=30), [], []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"message": "Why?"}
+
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do(("S1", "r1"), slow)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"message": "Why?"} for result, _ in results)
+    # A late retry gets the kept result back
+    assert flights.do(("S1", "r1"), slow) == ({"message": "Why?"}, True)
+    assert len(calls) == 1
+
+
+def test_results_expire_and_errors_are_not_kept():
+    flights, calls = SingleFlight(ttl_s=0.05), []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("LLM down")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            flights.do("key", failing)
+    assert len(calls) == 2
+
+    flights.do("other", lambda: 1)
+    time.sleep(0.06)
+    assert flights.do("other", lambda: 2) == (2, False)
+    assert flights.do("uncached", lambda: 3, cache=False) == (3, False)
+    assert flights.do("uncached", lambda: 4, cache=False) == (4, False)
+
+
+# ------------Test replies stored in the session -------------#
+
+
+def _session(state):
+    return {"format": 2, "state": state, "turns": [], "version": 1}
+
+
+def test_stored_reply_of_a_handled_request():
+    last = {"request_id": "r1", "started_at": 0, "message": "Why?"}
+    session = _session({"question_name": "q2", "last_request": last})
+
+    assert stored_reply("S1", None, session, "r1") == {
+        "session_id": "S1",
+        "message": "Why?",
+    }
+    # Another answer adds its own turn
+    assert stored_reply("S1", None, session, "r2") is None
+
+
+def test_stored_reply_waits_for_a_turn_in_progress():
+    db = InMemoryDB()
+    last = {"request_id": "r1", "started_at": int(time.time() * 1000)}
+    db.update_remote_session("S1", _session({"last_request": last}))
+
+    def complete():
+        time.sleep(0.3)
+        state = {"last_request": {**last, "message": "Why?"}}
+        db.update_remote_session("S1", {**_session(state), "version": 2})
+
+    threading.Thread(target=complete).start()
+    reply = stored_reply("S1", db, db.load_remote_session("S1"), "r1")
+
+    assert reply["message"] == "Why?"
+
+
+def test_stored_reply_ignores_a_failed_request():
+    last = {"request_id": "r1", "started_at": 0, "message": None}
+
+    assert stored_reply("S1", None, _session({"last_request": last}), "r1") is None
+
+
+# ------------Test retries of failed requests -------------#
+
+PARAMETERS = {
+    "first_ai_question_name": "q1",
+    "interview_plan": [
+        {"question_name": "q1", "next_question": "q2"},
+        {"question_name": "q2", "next_question": "last_question"},
+    ],
+}
+
+
+class FlakyAgent(object):
+    """Agent whose first question generation fails."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute_query_v002_auto(self, interview_manager):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("LLM down")
+        return "Why?"
+
+
+def _next(db, agent, user_message, request_id):
+    return next_question(
+        session_id="S1",
+        interview_id="TEST",
+        db=db,
+        agent=agent,
+        interview_parameters={"TEST": PARAMETERS},
+        user_message=user_message,
+        request_id=request_id,
+    )
+
+
+def test_retry_of_a_failed_request_reuses_its_answer(monkeypatch):
+    # Retries must not wait for the reply of the failed request
+    monkeypatch.setattr(logic, "REPLY_WAIT_S", 30.0)
+    db, agent = InMemoryDB(), FlakyAgent()
+    manager = InterviewManager(db=db, session_id="S1")
+    manager.begin_session(parameters=PARAMETERS, interview_id="TEST")
+    manager.add_chat_to_session("How do you save?", type="question")
+
+    with pytest.raises(RuntimeError):
+        _next(db, agent, "I budget.", "r1")
+    last = db.load_remote_session("S1")["state"]["last_request"]
+    assert (last["message"], last["failed"]) == (None, True)
+
+    start = time.monotonic()
+    assert _next(db, agent, "I budget.", "r1")["message"] == "Why?"
+    assert time.monotonic() - start < 1.0
+
+    stored = db.load_remote_session("S1")
+    assert [(t["type"], t["content"]) for t in stored["turns"]] == [
+        ("question", "How do you save?"),
+        ("answer", "I budget."),
+        ("question", "Why?"),
+    ]
+    # A late retry gets the same reply back
+    assert _next(db, agent, "I budget.", "r1")["message"] == "Why?"
+    assert agent.calls == 2
+
+
+def test_repeated_start_asks_the_last_question_again():
+    db, agent = InMemoryDB(), FlakyAgent()
+    agent.calls = 1
+    manager = InterviewManager(db=db, session_id="S1")
+    manager.begin_session(parameters=PARAMETERS, interview_id="TEST")
+    manager.add_chat_to_session("How do you save?", type="question")
+    _next(db, agent, "I budget.", "r1")
+
+    # e.g. the page is reloaded mid-interview
+    assert _next(db, agent, None, "r2")["message"] == "Why?"
+    assert len(db.load_remote_session("S1")["turns"]) == 3
@@ -0,0 +1,122 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.agent import LLMAgent
+from core.manager import InterviewManager
+from core.offline import FakeAsyncOpenAI
+from core.summary import summary_pending, update_summary, wait_for_summary
+from database.memory import InMemoryDB
+
+PARAMETERS = {"first_ai_question_name": "q1", "interview_plan": [], "summary": True}
+
+
+def _agent(reply):
+    return LLMAgent(
+        openai_client=FakeAsyncOpenAI(reply=reply, latency="constant:seconds=0")
+    )
+
+
+def _session(db):
+    manager = InterviewManager(db=db, session_id="S1")
+    manager.begin_session(parameters=PARAMETERS, interview_id="TEST")
+    manager.add_chat_to_session("How do you save?", type="question")
+    manager.add_chat_to_session("I budget every month.", type="answer")
+    return manager
+
+
+# ------------Test running summaries -------------#
+
+
+def test_new_turns_are_folded_into_the_summary():
+    db = InMemoryDB()
+    _session(db)
+    agent = _agent("Budgets monthly.")
+
+    assert update_summary("S1", db, agent, PARAMETERS)
+    state = db.load_remote_session("S1")["state"]
+    assert (state["summary"], state["summary_order"]) == ("Budgets monthly.", 2)
+    assert state["usage_total"]["output_tokens"] > 0
+    # Nothing new to summarise
+    assert not update_summary("S1", db, agent, PARAMETERS)
+
+
+def test_failed_summary_keeps_the_previous_one():
+    db = InMemoryDB()
+    manager = _session(db)
+    manager.update_summary("Budgets.")
+    manager.update_session()
+
+    class FailingResponses(object):
+        async def create(self, **_):
+            raise RuntimeError("unavailable")
+
+    agent = LLMAgent(openai_client=SimpleNamespace(responses=FailingResponses()))
+
+    assert not update_summary("S1", db, agent, PARAMETERS)
+    assert db.load_remote_session("S1")["state"]["summary"] == "Budgets."
+
+
+def test_summary_keeps_what_the_next_turn_wrote_meanwhile():
+    db = InMemoryDB()
+    _session(db)
+    # The session as the job read it, before the next turn was written
+    read = db.load_remote_session("S1")
+    turn = InterviewManager(db=db, session_id="S1")
+    turn.resume_session(parameters=PARAMETERS)
+    turn.add_chat_to_session("Why?", type="question")
+    turn.set_usage(
+        {
+            "model": "gpt-4o-mini",
+            "input_tokens": 10,
+            "cached_tokens": 0,
+            "output_tokens": 5,
+            "cost_usd": 0.5,
+            "extra_cost_usd": 0.0,
+            "hedged": False,
+            "hedge_won": False,
+        }
+    )
+    turn.update_session()
+
+    assert update_summary("S1", db, _agent("Budgets."), PARAMETERS, read)
+    stored = db.load_remote_session("S1")
+    assert [t["content"] for t in stored["turns"]][-1] == "Why?"
+    # Summarised up to what the job read; the next job folds in the rest
+    assert stored["state"]["summary_order"] == 2
+    assert summary_pending(stored)
+    total = stored["state"]["usage_total"]
+    # The summary is not a turn
+    assert (total["turns"], total["summaries"]) == (1, 1)
+    assert total["cost_usd"] > 0.5
+
+
+def test_turn_waits_for_a_summary_written_by_another_process():
+    db = InMemoryDB()
+    _session(db)
+    session = db.load_remote_session("S1")
+    assert summary_pending(session)
+
+    # e.g. the asynchronous invocation of the Lambda function, in another container
+    job = threading.Timer(
+        0.05, update_summary, ("S1", db, _agent("Budgets."), PARAMETERS)
+    )
+    job.start()
+    session = wait_for_summary("S1", db, session, timeout_s=2.0)
+    job.join()
+
+    assert session["state"]["summary"] == "Budgets."
+    assert not summary_pending(session)
+
+
+@pytest.mark.parametrize("timeout_s", [0.0, 0.25])
+def test_wait_for_summary_gives_up(timeout_s):
+    db = InMemoryDB()
+    _session(db)
+
+    session = wait_for_summary(
+        "S1", db, db.load_remote_session("S1"), timeout_s=timeout_s
+    )
+
+    assert session["state"]["summary"] == ""
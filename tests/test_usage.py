@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.usage import TurnUsage, add_to_total, budget_step, over_budget, price_of
+
+
+def _response(input_tokens, output_tokens, cached_tokens=0):
+    return SimpleNamespace(
+        usage=SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            input_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        )
+    )
+
+
+# ------------Test usage records -------------#
+
+
+def test_dated_models_are_priced_by_longest_prefix():
+    assert price_of("gpt-5-nano-2025-08-07") == (0.05, 0.005, 0.4)
+    assert price_of("gpt-5.2-2025-12-11") == (1.75, 0.175, 14.0)
+    assert price_of("my-model", {"my": (1, 1, 1)}) == (1, 1, 1)
+    assert price_of("unknown-model") is None
+
+
+def test_cancelled_attempt_is_estimated_from_the_winner():
+    winner = _response(1000, 100, cached_tokens=400)
+    usage = TurnUsage()
+    usage.record("gpt-4o-mini", "llm_hedge", 1.0, winner)
+    usage.record("gpt-5.2", "llm_primary", 3.0)  # cancelled after 3 s
+
+    record = usage.to_record(winner=winner)
+
+    assert record["model"] == "gpt-4o-mini"
+    assert record["hedged"] and record["hedge_won"]
+    assert record["cost_usd"] == pytest.approx(
+        (600 * 0.15 + 400 * 0.075 + 100 * 0.6) / 1e6
+    )
+    # Same prompt, and at most as many output tokens as the answer that was used
+    assert record["extra_cost_usd"] == pytest.approx((1000 * 1.75 + 100 * 14.0) / 1e6)
+
+
+def test_sessions_over_budget_switch_to_the_budget_plan():
+    record = {
+        "input_tokens": 1000,
+        "cached_tokens": 0,
+        "output_tokens": 100,
+        "cost_usd": 0.03,
+        "extra_cost_usd": 0.02,
+        "hedged": True,
+        "hedge_won": False,
+    }
+    total = add_to_total(add_to_total(None, record), record)
+    parameters = {"session_budget_usd": 0.1, "budget_plan": {"model": "gpt-5-nano"}}
+
+    assert total["turns"] == 2 and total["hedges"] == 2
+    assert over_budget(parameters, total)
+    assert not over_budget({}, total)
+    step = budget_step({"question_name": "q1", "model": "gpt-5.2"}, parameters)
+    assert step == {
+        "question_name": "q1",
+        "model": "gpt-5-nano",
+        "hedge": False,
+        "candidates": 1,
+    }